@@ -0,0 +1,132 @@
+"""Asynchroner OpenAI-Zugriff über einen gemeinsamen httpx-Verbindungspool."""
+from __future__ import annotations
+
+import asyncio
+import os
+from typing import AsyncIterator, List, Optional, Protocol
+
+import httpx
+from openai import AsyncOpenAI
+
+from core.config import (
+    LLM_BACKEND,
+    LLM_BASE_URL,
+    LLM_CONNECT_TIMEOUT_S,
+    LLM_MAX_CONCURRENCY,
+    LLM_MAX_CONNECTIONS,
+    LLM_REQUEST_TIMEOUT_S,
+)
+from core.fake_llm import FakeLLMBackend
+from core.logger import get_logger
+from core.resilience import ResilientBackend
+
+_logger = get_logger(__name__)
+
+# Lokale Ersatzserver prüfen den Schlüssel nicht.
+_LOCAL_API_KEY = "local"
+
+
+class LLMBackend(Protocol):
+    """Schnittstelle, über die :class:`core.llm_client.LLMClient` Modelle aufruft."""
+
+    async def warm_up(self) -> None: ...
+
+    async def complete(
+        self, model: str, messages: List[dict], temperature: float, timeout: Optional[float] = None
+    ) -> str: ...
+
+    def stream(self, model: str, messages: List[dict], temperature: float) -> AsyncIterator[str]: ...
+
+    async def aclose(self) -> None: ...
+
+
+class AsyncLLMClient:
+    """Schlanker asynchroner Chat-Client.
+
+    Alle Anfragen teilen sich einen vorgewärmten Keep-Alive-Pool, laufen mit
+    festem Timeout und werden über ein Semaphor auf ``max_concurrency``
+    gleichzeitige Aufrufe begrenzt. Abgebrochene Tasks schließen ihre
+    Verbindung sofort, statt im Hintergrund weiterzulaufen.
+    """
+
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        *,
+        base_url: Optional[str] = LLM_BASE_URL,
+        max_concurrency: int = LLM_MAX_CONCURRENCY,
+        max_connections: int = LLM_MAX_CONNECTIONS,
+        timeout: float = LLM_REQUEST_TIMEOUT_S,
+    ) -> None:
+        key = api_key or os.getenv("OPENAI_API_KEY") or (_LOCAL_API_KEY if base_url else None)
+        if not key:
+            raise RuntimeError("OPENAI_API_KEY ist nicht gesetzt")
+        self._timeout = timeout
+        self._http = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+                keepalive_expiry=120,
+            ),
+            timeout=httpx.Timeout(timeout, connect=LLM_CONNECT_TIMEOUT_S),
+        )
+        # Wiederholungen übernimmt core.resilience, nicht das SDK.
+        self._client = AsyncOpenAI(api_key=key, base_url=base_url, http_client=self._http, max_retries=0)
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def warm_up(self) -> None:
+        """Baut vorab eine TLS-Verbindung zum API-Host im Pool auf."""
+        try:
+            await self._http.head(str(self._client.base_url), timeout=LLM_CONNECT_TIMEOUT_S)
+            _logger.info("Verbindung zu %s vorgewärmt", self._client.base_url)
+        except httpx.HTTPError as exc:
+            _logger.warning("Vorwärmen der API-Verbindung fehlgeschlagen: %s", exc)
+
+    async def complete(
+        self, model: str, messages: List[dict], temperature: float, timeout: Optional[float] = None
+    ) -> str:
+        async with self._semaphore:
+            response = await asyncio.wait_for(
+                self._client.chat.completions.create(
+                    model=model,
+                    messages=messages,
+                    temperature=temperature,
+                ),
+                timeout or self._timeout,
+            )
+        return response.choices[0].message.content or ""
+
+    async def stream(
+        self, model: str, messages: List[dict], temperature: float
+    ) -> AsyncIterator[str]:
+        async with self._semaphore:
+            stream = await asyncio.wait_for(
+                self._client.chat.completions.create(
+                    model=model,
+                    messages=messages,
+                    temperature=temperature,
+                    stream=True,
+                ),
+                self._timeout,
+            )
+            try:
+                async for chunk in stream:
+                    if not chunk.choices:
+                        continue
+                    delta = chunk.choices[0].delta.content
+                    if delta:
+                        yield delta
+            finally:
+                await stream.close()
+
+    async def aclose(self) -> None:
+        await self._client.close()
+
+
+def create_backend(api_key: Optional[str] = None, kind: str = LLM_BACKEND) -> LLMBackend:
+    """Erzeugt das per ``KI_KUMPEL_LLM_BACKEND`` gewählte Backend samt Resilienz-Schicht."""
+    if kind == "fake":
+        return ResilientBackend(FakeLLMBackend())
+    if kind != "openai":
+        raise ValueError(f"Unbekanntes LLM-Backend: {kind}")
+    return ResilientBackend(AsyncLLMClient(api_key))
@@ -0,0 +1,269 @@
+"""Adaptive automatische Screenshot-Aufnahme, gesteuert durch Bildänderungen."""
+from __future__ import annotations
+
+import ctypes
+import sys
+import threading
+from concurrent.futures import CancelledError, Future
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+import numpy as np
+
+from core.config import (
+    AUTO_CAPTURE_BLOCK,
+    AUTO_CAPTURE_MAX_INTERVAL_MS,
+    AUTO_CAPTURE_MIN_INTERVAL_MS,
+    AUTO_CAPTURE_MIN_TILES,
+    AUTO_CAPTURE_TILE,
+    AUTO_SCREENSHOT_INTERVAL_MS,
+)
+from core.logger import get_logger
+from core.screen_capture import ScreenshotInfo, capture_all_screens
+
+_logger = get_logger(__name__)
+
+# Differenz der Blockmittelwerte (0-255), ab der ein Block als geändert zählt.
+# Ein 1 px breiter Textstrich in einem 4×4-Block verschiebt dessen Mittel um ~35.
+_BLOCK_DELTA = 16
+_GROW_FACTOR = 1.5
+_SHRINK_FACTOR = 0.5
+
+
+def _workstation_locked() -> bool:
+    """``True``, solange der Windows-Sperrbildschirm aktiv ist (sonst immer ``False``)."""
+    if sys.platform != "win32":
+        return False
+    user32 = ctypes.windll.user32
+    desktop = user32.OpenInputDesktop(0, False, 0x0100)  # DESKTOP_SWITCHDESKTOP
+    if not desktop:
+        return True
+    try:
+        return not user32.SwitchDesktop(desktop)
+    finally:
+        user32.CloseDesktop(desktop)
+
+
+class ChangeDetector:
+    """Vergleicht verkleinerte Monitorbilder mit dem zuletzt gespeicherten Stand.
+
+    Der Grünkanal des rohen BGRA-Puffers wird ohne Kopie in ``block``×``block``
+    Pixelblöcke zerlegt und pro Block gemittelt; jedes Pixel fließt ein, auch
+    eine neue Textzeile verschiebt die Mittel der Blöcke, die sie berührt. Ein
+    Monitor gilt als geändert, wenn Blöcke mit einer Abweichung von mindestens
+    ``_BLOCK_DELTA`` in wenigstens ``min_tiles`` Kacheln von ``tile`` Pixeln
+    Kantenlänge liegen; ein blinkender Textcursor allein reicht so nicht. Die
+    Referenz wird nur bei einer Änderung ersetzt, damit auch langsame
+    Veränderungen irgendwann auffallen.
+    """
+
+    def __init__(
+        self,
+        block: int = AUTO_CAPTURE_BLOCK,
+        tile: int = AUTO_CAPTURE_TILE,
+        min_tiles: int = AUTO_CAPTURE_MIN_TILES,
+    ) -> None:
+        self.block = max(1, block)
+        # Kacheln in Blöcken gemessen, mindestens ein Block pro Kachel
+        self.tile_blocks = max(1, tile // self.block)
+        self.min_tiles = max(1, min_tiles)
+        self._frames: Dict[int, np.ndarray] = {}
+
+    def sample(self, raw) -> np.ndarray:
+        """Blockmittel des Grünkanals, Randpixel jenseits ganzer Blöcke fallen weg."""
+        pixels = np.frombuffer(raw.bgra, dtype=np.uint8).reshape(raw.height, raw.width, 4)
+        rows, cols = raw.height // self.block, raw.width // self.block
+        green = pixels[: rows * self.block, : cols * self.block, 1]
+        return green.reshape(rows, self.block, cols, self.block).mean(axis=(1, 3), dtype=np.float32)
+
+    def changed_tiles(self, previous: np.ndarray, sample: np.ndarray) -> int:
+        rows, cols = np.nonzero(np.abs(sample - previous) >= _BLOCK_DELTA)
+        if not len(rows):
+            return 0
+        tiles_per_row = sample.shape[1] // self.tile_blocks + 1
+        return len(np.unique(rows // self.tile_blocks * tiles_per_row + cols // self.tile_blocks))
+
+    def changed(self, monitor: int, raw) -> bool:
+        sample = self.sample(raw)
+        previous = self._frames.get(monitor)
+        if previous is not None and previous.shape == sample.shape:
+            if self.changed_tiles(previous, sample) < self.min_tiles:
+                return False
+        self._frames[monitor] = sample
+        return True
+
+    def reset(self) -> None:
+        self._frames.clear()
+
+
+@dataclass
+class SchedulerStats:
+    ticks: int = 0
+    stored: int = 0
+    unchanged: int = 0
+    paused: int = 0
+    interval_ms: int = 0
+
+
+class AutoCaptureScheduler:
+    """Nimmt in einem Hintergrund-Thread auf, aber nur, wenn sich etwas ändert.
+
+    Nach einer Änderung halbiert sich das Intervall (bis ``min_ms``), ohne
+    Änderung wächst es um den Faktor 1,5 (bis ``max_ms``). Ist die
+    Arbeitsstation gesperrt oder das Fenster über :meth:`set_visible`
+    als verborgen gemeldet, wird gar nicht aufgenommen.
+    ``on_stored`` erhält die gespeicherten Bilder aus dem Scheduler-Thread.
+    Mit ``submit`` (z.B. ``RequestScheduler.submit`` mit Priorität
+    ``CAPTURE``) läuft jeder Aufnahmeschritt im gemeinsamen Worker-Pool und
+    wartet dort hinter Nutzerfragen.
+    """
+
+    def __init__(
+        self,
+        on_stored: Optional[Callable[[List[ScreenshotInfo]], None]] = None,
+        *,
+        initial_ms: int = AUTO_SCREENSHOT_INTERVAL_MS,
+        min_ms: int = AUTO_CAPTURE_MIN_INTERVAL_MS,
+        max_ms: int = AUTO_CAPTURE_MAX_INTERVAL_MS,
+        detector: Optional[ChangeDetector] = None,
+        submit: Optional[Callable[[Callable[[], Any]], Future]] = None,
+    ) -> None:
+        self.on_stored = on_stored
+        self._submit = submit
+        self.min_ms = max(100, min_ms)
+        self.max_ms = max(self.min_ms, max_ms)
+        self.detector = detector or ChangeDetector()
+        self._interval_ms = float(min(max(initial_ms, self.min_ms), self.max_ms))
+        self._visible = threading.Event()
+        self._visible.set()
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        # Hält eine laufende Aufnahme gegen :meth:`suspended` ab
+        self._capture_lock = threading.Lock()
+        self._suspended = 0
+        self._stats = SchedulerStats()
+        self._was_paused = False
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def interval_ms(self) -> int:
+        with self._lock:
+            return int(self._interval_ms)
+
+    def set_visible(self, visible: bool) -> None:
+        """Meldet, ob das App-Fenster sichtbar ist; verborgen heißt pausiert."""
+        if visible:
+            self._visible.set()
+        else:
+            self._visible.clear()
+
+    @contextmanager
+    def suspended(self) -> Iterator[None]:
+        """Keine Aufnahme, solange der Block läuft, z.B. während ein Overlay den Bildschirm abdunkelt.
+
+        Beim Betreten wird auf eine gerade laufende Aufnahme gewartet.
+        """
+        with self._capture_lock:
+            self._suspended += 1
+        try:
+            yield
+        finally:
+            with self._capture_lock:
+                self._suspended -= 1
+
+    def _pause_reason(self) -> Optional[str]:
+        if self._suspended:
+            return "Bildschirm überlagert"
+        if not self._visible.is_set():
+            return "Fenster verborgen"
+        if _workstation_locked():
+            return "Arbeitsstation gesperrt"
+        return None
+
+    def _adapt(self, changed: bool) -> None:
+        with self._lock:
+            factor = _SHRINK_FACTOR if changed else _GROW_FACTOR
+            self._interval_ms = min(max(self._interval_ms * factor, self.min_ms), self.max_ms)
+
+    def tick(self) -> List[ScreenshotInfo]:
+        """Ein Aufnahmeschritt; liefert die gespeicherten Bilder (leer bei Pause oder ohne Änderung)."""
+        with self._capture_lock:
+            reason = self._pause_reason()
+            with self._lock:
+                self._stats.ticks += 1
+                if reason is not None:
+                    self._stats.paused += 1
+            if reason is not None:
+                if not self._was_paused:
+                    _logger.info("Auto-Aufnahme pausiert: %s", reason)
+                    self._was_paused = True
+                return []
+            if self._was_paused:
+                _logger.info("Auto-Aufnahme fortgesetzt")
+                self._was_paused = False
+            shots = [shot for shot in capture_all_screens(auto=True, changed=self.detector.changed) if shot.stored]
+        self._adapt(bool(shots))
+        with self._lock:
+            self._stats.stored += len(shots)
+            if not shots:
+                self._stats.unchanged += 1
+        if shots and self.on_stored is not None:
+            self.on_stored(shots)
+        return shots
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval_ms / 1000):
+            # Während das Fenster verborgen ist, ohne Abfragen auf das Wiederauftauchen warten.
+            while not self._visible.wait(1.0):
+                if self._stop.is_set():
+                    return
+            try:
+                self._run_tick()
+            except CancelledError:
+                continue
+            except Exception as exc:
+                _logger.error("Auto-Screenshot fehlgeschlagen: %s", exc)
+
+    def _run_tick(self) -> None:
+        if self._submit is None:
+            self.tick()
+            return
+        future = self._submit(self.tick)
+        while not self._stop.is_set():
+            try:
+                future.result(timeout=0.5)
+                return
+            except TimeoutError:
+                continue
+        future.cancel()
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="AutoCapture", daemon=True)
+        self._thread.start()
+
+    def stats(self) -> SchedulerStats:
+        with self._lock:
+            return SchedulerStats(
+                ticks=self._stats.ticks,
+                stored=self._stats.stored,
+                unchanged=self._stats.unchanged,
+                paused=self._stats.paused,
+                interval_ms=int(self._interval_ms),
+            )
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+            self._thread = None
+        stats = self.stats()
+        _logger.info(
+            "Auto-Aufnahme: %d Durchläufe, %d Bilder gespeichert, %d ohne Änderung, %d pausiert",
+            stats.ticks,
+            stats.stored,
+            stats.unchanged,
+            stats.paused,
+        )
@@ -15,14 +15,108 @@ for directory in (DATA_DIR, LOG_DIR, SCREENSHOT_DIR, DOCS_DIR):
     directory.mkdir(parents=True, exist_ok=True)
 
 MEMORY_DB_PATH = DATA_DIR / "memory.sqlite"
+MEMORY_READ_POOL_SIZE = int(os.getenv("KI_KUMPEL_MEMORY_READ_POOL", "4"))
+MEMORY_WRITE_BATCH_SIZE = int(os.getenv("KI_KUMPEL_MEMORY_WRITE_BATCH", "256"))
+
+# "bm25" (invertierter Index) oder "vector" (lokale N-Gramm-Vektoren)
+FACT_RETRIEVAL_STRATEGY = os.getenv("KI_KUMPEL_FACT_RETRIEVAL", "bm25")
+VECTOR_DIM = int(os.getenv("KI_KUMPEL_VECTOR_DIM", "512"))
 
 MODEL_VISION = os.getenv("KI_KUMPEL_MODEL_VISION", "gpt-4o-mini")
 MODEL_TEXT = os.getenv("KI_KUMPEL_MODEL_TEXT", "gpt-4o-mini")
+STREAM_RESPONSES = os.getenv("KI_KUMPEL_STREAMING", "1") != "0"
+
+# "openai" (Standard, auch für lokale Ersatzserver per Base-URL) oder "fake" (ohne Netzwerk)
+LLM_BACKEND = os.getenv("KI_KUMPEL_LLM_BACKEND", "openai")
+LLM_BASE_URL = os.getenv("KI_KUMPEL_LLM_BASE_URL") or None
+FAKE_LLM_LATENCY_S = float(os.getenv("KI_KUMPEL_FAKE_LLM_LATENCY_S", "0.2"))
+FAKE_LLM_TOKEN_DELAY_S = float(os.getenv("KI_KUMPEL_FAKE_LLM_TOKEN_DELAY_S", "0.02"))
+FAKE_LLM_ERROR_RATE = float(os.getenv("KI_KUMPEL_FAKE_LLM_ERROR_RATE", "0"))
+
+# Gemeinsamer HTTP-Pool und Zeitlimits für alle LLM-Aufrufe
+LLM_MAX_CONCURRENCY = int(os.getenv("KI_KUMPEL_LLM_CONCURRENCY", "4"))
+LLM_MAX_CONNECTIONS = int(os.getenv("KI_KUMPEL_LLM_CONNECTIONS", "8"))
+LLM_REQUEST_TIMEOUT_S = float(os.getenv("KI_KUMPEL_LLM_TIMEOUT_S", "60"))
+LLM_CONNECT_TIMEOUT_S = float(os.getenv("KI_KUMPEL_LLM_CONNECT_TIMEOUT_S", "5"))
+# Wiederholungen mit exponentiellem Backoff (voller Jitter) bei 429/5xx/Netzwerkfehlern
+LLM_RETRIES = int(os.getenv("KI_KUMPEL_LLM_RETRIES", "2"))
+LLM_RETRY_BASE_DELAY_S = float(os.getenv("KI_KUMPEL_LLM_RETRY_BASE_S", "0.5"))
+LLM_RETRY_MAX_DELAY_S = float(os.getenv("KI_KUMPEL_LLM_RETRY_MAX_S", "8"))
+# Hedging: zweite Anfrage, wenn die erste länger als das Perzentil der bisherigen Latenzen braucht
+LLM_HEDGE_ENABLED = os.getenv("KI_KUMPEL_LLM_HEDGE", "0") == "1"
+LLM_HEDGE_PERCENTILE = float(os.getenv("KI_KUMPEL_LLM_HEDGE_PERCENTILE", "95"))
+LLM_HEDGE_MIN_DELAY_S = float(os.getenv("KI_KUMPEL_LLM_HEDGE_MIN_S", "1.0"))
+# Circuit Breaker: nach N Fehlern in Folge für X Sekunden sofort ablehnen (0 = aus)
+LLM_BREAKER_THRESHOLD = int(os.getenv("KI_KUMPEL_LLM_BREAKER_THRESHOLD", "5"))
+LLM_BREAKER_RESET_S = float(os.getenv("KI_KUMPEL_LLM_BREAKER_RESET_S", "30"))
+
+LLM_CACHE_ENABLED = os.getenv("KI_KUMPEL_LLM_CACHE", "1") != "0"
+LLM_CACHE_PATH = DATA_DIR / "llm_cache.sqlite"
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("KI_KUMPEL_LLM_CACHE_MAX_ENTRIES", "2000"))
+LLM_CACHE_TTL_SECONDS = float(os.getenv("KI_KUMPEL_LLM_CACHE_TTL_S", str(7 * 24 * 3600)))
+# Verlauf im Cache-Schlüssel berücksichtigen; mit "0" werden nur Prompts ohne Verlauf gecacht
+LLM_CACHE_INCLUDE_HISTORY = os.getenv("KI_KUMPEL_LLM_CACHE_HISTORY", "1") == "1"
+# Nur die jüngsten N Verlaufsbeiträge (ohne Zeitstempel) gehen in den Cache-Schlüssel ein
+LLM_CACHE_HISTORY_TURNS = max(1, int(os.getenv("KI_KUMPEL_LLM_CACHE_HISTORY_TURNS", "2")))
 
+# Beiträge älter als N Tage werden archiviert und zusammengefasst (0 = aus)
+INTERACTION_ARCHIVE_AFTER_DAYS = int(os.getenv("KI_KUMPEL_ARCHIVE_AFTER_DAYS", "14"))
+
+CONTEXT_HISTORY_LIMIT = int(os.getenv("KI_KUMPEL_CONTEXT_LIMIT", "30"))
+PROMPT_TOKEN_BUDGET = int(os.getenv("KI_KUMPEL_PROMPT_TOKEN_BUDGET", "3000"))
+PROMPT_FACT_TOKEN_SHARE = float(os.getenv("KI_KUMPEL_PROMPT_FACT_SHARE", "0.25"))
+PROMPT_STYLE_TOKEN_SHARE = float(os.getenv("KI_KUMPEL_PROMPT_STYLE_SHARE", "0.15"))
+
+# Startintervall der automatischen Aufnahme
 AUTO_SCREENSHOT_INTERVAL_MS = int(os.getenv("KI_KUMPEL_AUTO_INTERVAL_MS", "20000"))
+# Adaptive Auto-Aufnahme: Intervall schrumpft bei Aktivität und wächst im Leerlauf innerhalb dieser Grenzen
+AUTO_CAPTURE_MIN_INTERVAL_MS = int(os.getenv("KI_KUMPEL_AUTO_MIN_INTERVAL_MS", "3000"))
+AUTO_CAPTURE_MAX_INTERVAL_MS = int(os.getenv("KI_KUMPEL_AUTO_MAX_INTERVAL_MS", "120000"))
+# Änderungserkennung: Mittelwerte über n×n-Pixelblöcke werden verglichen; gespeichert wird,
+# sobald geänderte Blöcke in mindestens so vielen Kacheln (Kantenlänge in Pixeln) liegen
+AUTO_CAPTURE_BLOCK = int(os.getenv("KI_KUMPEL_AUTO_BLOCK", "4"))
+AUTO_CAPTURE_TILE = int(os.getenv("KI_KUMPEL_AUTO_TILE", "32"))
+AUTO_CAPTURE_MIN_TILES = int(os.getenv("KI_KUMPEL_AUTO_MIN_TILES", "2"))
+# Standardziel für Vision-Fragen: cursor, window, region oder mosaic
+CAPTURE_TARGET = os.getenv("KI_KUMPEL_CAPTURE_TARGET", "cursor")
+# Screenshots werden einmal skaliert und kodiert (jpeg, webp oder png; 0 = keine Skalierung)
+SCREENSHOT_MAX_EDGE = int(os.getenv("KI_KUMPEL_SCREENSHOT_MAX_EDGE", "1600"))
+SCREENSHOT_FORMAT = os.getenv("KI_KUMPEL_SCREENSHOT_FORMAT", "jpeg")
+SCREENSHOT_QUALITY = int(os.getenv("KI_KUMPEL_SCREENSHOT_QUALITY", "80"))
+SCREENSHOT_GREYSCALE = os.getenv("KI_KUMPEL_SCREENSHOT_GREYSCALE", "0") == "1"
+# PNG-Kompression (0-9) bzw. WebP-Aufwand; niedriger = schneller, größer
+SCREENSHOT_COMPRESS_LEVEL = int(os.getenv("KI_KUMPEL_SCREENSHOT_COMPRESS_LEVEL", "3"))
+# Hintergrund-Schreiber für Screenshots: Threads und maximale Warteschlange
+SCREENSHOT_WRITER_THREADS = int(os.getenv("KI_KUMPEL_SCREENSHOT_WRITERS", "2"))
+SCREENSHOT_WRITE_QUEUE = int(os.getenv("KI_KUMPEL_SCREENSHOT_WRITE_QUEUE", "8"))
+# Screenshot-Ablage: Dateien nach Inhalts-Hash, Metadaten im SQLite-Index
+SCREENSHOT_INDEX_PATH = DATA_DIR / "screenshots.sqlite"
+# Speicherquote in MB und Höchstalter in Tagen (0 = unbegrenzt); Verdrängung läuft im Hintergrund
+SCREENSHOT_QUOTA_MB = float(os.getenv("KI_KUMPEL_SCREENSHOT_QUOTA_MB", "500"))
+SCREENSHOT_MAX_AGE_DAYS = float(os.getenv("KI_KUMPEL_SCREENSHOT_MAX_AGE_DAYS", "7"))
+SCREENSHOT_EVICT_INTERVAL_S = float(os.getenv("KI_KUMPEL_SCREENSHOT_EVICT_INTERVAL_S", "300"))
+# Hamming-Distanz (von 64 Bit), bis zu der zwei Screenshots als gleich gelten (-1 = aus;
+# der dHash übersieht Textänderungen, gleiche Bytes teilt die Ablage ohnehin)
+SCREENSHOT_DEDUP_DISTANCE = int(os.getenv("KI_KUMPEL_SCREENSHOT_DEDUP_DISTANCE", "-1"))
+# Vision-Fragen nutzen ein Auto-Bild im Speicher, das höchstens so alt ist, statt neu aufzunehmen (0 = immer live)
+VISION_FRAME_MAX_AGE_S = float(os.getenv("KI_KUMPEL_VISION_FRAME_MAX_AGE_S", "2"))
+# Vision-Antworten bei gleicher Frage auch für ähnliche statt byte-gleiche Bilder wiederverwenden
+# (dHash-Distanz, -1 = aus; textlastige Bildschirme kollidieren leicht)
+VISION_REUSE_DISTANCE = int(os.getenv("KI_KUMPEL_VISION_REUSE_DISTANCE", "-1"))
+
+# Zentraler Worker-Pool für Router-Anfragen; reservierte Worker stehen nur Nutzerfragen zur Verfügung
+REQUEST_WORKERS = int(os.getenv("KI_KUMPEL_REQUEST_WORKERS", "4"))
+REQUEST_RESERVED_WORKERS = int(os.getenv("KI_KUMPEL_REQUEST_RESERVED", "1"))
+
+# UI-Aktualisierungen: Zeitbudget pro Frame und Abstand der Frames (ohne Arbeit seltener)
+UI_FRAME_BUDGET_MS = float(os.getenv("KI_KUMPEL_UI_FRAME_BUDGET_MS", "8"))
+UI_FRAME_INTERVAL_MS = int(os.getenv("KI_KUMPEL_UI_FRAME_INTERVAL_MS", "16"))
+UI_IDLE_INTERVAL_MS = int(os.getenv("KI_KUMPEL_UI_IDLE_INTERVAL_MS", "100"))
 
 STYLE_SAMPLE_DIR = DATA_DIR / "style_samples"
 STYLE_SAMPLE_DIR.mkdir(parents=True, exist_ok=True)
+STYLE_EXAMPLE_COUNT = int(os.getenv("KI_KUMPEL_STYLE_EXAMPLES", "2"))
+STYLE_EXAMPLE_MAX_CHARS = int(os.getenv("KI_KUMPEL_STYLE_EXAMPLE_CHARS", "1500"))
 
 DEFAULT_SYSTEM_PROMPT_VISION = (
     "Du bist ein persönlicher Desktop-Assistent. "
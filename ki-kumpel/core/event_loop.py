@@ -0,0 +1,112 @@
+"""Gemeinsamer asyncio-Event-Loop in einem Hintergrund-Thread.
+
+Tk-App, Tray und CLI laufen synchron; alle asynchronen Netzwerkaufrufe werden
+über diesen einen Loop abgewickelt und von dort als ``Future`` zurückgereicht.
+"""
+from __future__ import annotations
+
+import asyncio
+import concurrent.futures
+import queue
+import threading
+from typing import Any, AsyncIterator, Awaitable, Iterator, Optional, TypeVar
+
+from core.logger import get_logger
+
+_logger = get_logger(__name__)
+
+T = TypeVar("T")
+
+_END = object()
+
+
+class _Failure:
+    def __init__(self, error: BaseException) -> None:
+        self.error = error
+
+
+class LoopThread:
+    def __init__(self) -> None:
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run, name="KI-Kumpel-Loop", daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_forever()
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        return self._loop
+
+    def submit(self, coro: Awaitable[T]) -> concurrent.futures.Future:
+        """Plant ``coro`` auf dem Loop ein; ``future.cancel()`` bricht die Task ab."""
+        return asyncio.run_coroutine_threadsafe(coro, self._loop)
+
+    def run(self, coro: Awaitable[T], timeout: Optional[float] = None) -> T:
+        """Führt ``coro`` aus und blockiert den aufrufenden Thread bis zum Ergebnis."""
+        future = self.submit(coro)
+        try:
+            return future.result(timeout)
+        except BaseException:
+            future.cancel()
+            raise
+
+    def iterate(self, agen: AsyncIterator[T], holder: Optional[list] = None) -> Iterator[T]:
+        """Macht einen asynchronen Iterator synchron konsumierbar.
+
+        Die Pump-Task startet sofort. Ist ``holder`` eine Liste, wird ihr
+        Future angehängt, damit Aufrufer den Stream von außen abbrechen können.
+        """
+        items: "queue.Queue[Any]" = queue.Queue()
+
+        async def pump() -> None:
+            try:
+                async for item in agen:
+                    items.put(item)
+            except Exception as exc:
+                items.put(_Failure(exc))
+
+        def finished(done: concurrent.futures.Future) -> None:
+            # Läuft auch, wenn die Task abgebrochen wurde, bevor sie starten konnte.
+            if done.cancelled():
+                items.put(_Failure(concurrent.futures.CancelledError()))
+            items.put(_END)
+
+        future = self.submit(pump())
+        future.add_done_callback(finished)
+        if holder is not None:
+            holder.append(future)
+        return self._drain(items, future)
+
+    @staticmethod
+    def _drain(items: "queue.Queue[Any]", future: concurrent.futures.Future) -> Iterator[Any]:
+        try:
+            while True:
+                item = items.get()
+                if item is _END:
+                    return
+                if isinstance(item, _Failure):
+                    raise item.error
+                yield item
+        finally:
+            if not future.done():
+                future.cancel()
+
+    def stop(self) -> None:
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=2)
+
+
+_loop_thread: Optional[LoopThread] = None
+_loop_lock = threading.Lock()
+
+
+def get_loop_thread() -> LoopThread:
+    """Liefert den prozessweit gemeinsamen Loop-Thread (wird bei Bedarf gestartet)."""
+    global _loop_thread
+    with _loop_lock:
+        if _loop_thread is None:
+            _loop_thread = LoopThread()
+            _logger.info("Event-Loop-Thread gestartet")
+        return _loop_thread
@@ -0,0 +1,96 @@
+"""Deterministisches Fake-LLM für Offline-Tests und Lastmessungen."""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import random
+import re
+from typing import AsyncIterator, List, Optional
+
+from core.config import FAKE_LLM_ERROR_RATE, FAKE_LLM_LATENCY_S, FAKE_LLM_TOKEN_DELAY_S
+from core.logger import get_logger
+from core.resilience import TransientError
+
+_logger = get_logger(__name__)
+
+_CHUNK_PATTERN = re.compile(r"\S+\s*")
+
+
+class InjectedError(TransientError):
+    """Absichtlich ausgelöster, wiederholbarer Fehler des Fake-Backends."""
+
+
+def _question_text(messages: List[dict]) -> str:
+    content = messages[-1].get("content") if messages else ""
+    if isinstance(content, list):
+        texts = [part.get("text", "") for part in content if part.get("type") == "text"]
+        images = sum(1 for part in content if part.get("type") == "image_url")
+        return " ".join(texts) + (f" [{images} Bild(er)]" if images else "")
+    return str(content or "")
+
+
+def fake_answer(model: str, messages: List[dict]) -> str:
+    """Liefert für dieselben Nachrichten immer dieselbe Antwort."""
+    question = " ".join(_question_text(messages).split())
+    digest = hashlib.sha1(repr((model, messages)).encode("utf-8")).hexdigest()[:8]
+    if len(question) > 120:
+        question = question[:119].rstrip() + "…"
+    return (
+        f"Das ist eine Testantwort ({digest}) von {model}. "
+        f"Du hast gefragt: {question}. "
+        f"Der Prompt bestand aus {len(messages)} Nachrichten."
+    )
+
+
+def split_chunks(text: str) -> List[str]:
+    """Teilt eine Antwort wortweise in Stream-Stücke."""
+    return _CHUNK_PATTERN.findall(text) or [text]
+
+
+class FakeLLMBackend:
+    """Backend ohne Netzwerk mit derselben Schnittstelle wie :class:`AsyncLLMClient`.
+
+    ``latency`` verzögert die erste Antwort, ``token_delay`` jedes weitere
+    Stream-Stück; mit Wahrscheinlichkeit ``error_rate`` wird stattdessen
+    :class:`InjectedError` ausgelöst. ``seed`` macht die Fehlerfolge reproduzierbar.
+    """
+
+    def __init__(
+        self,
+        *,
+        latency: float = FAKE_LLM_LATENCY_S,
+        token_delay: float = FAKE_LLM_TOKEN_DELAY_S,
+        error_rate: float = FAKE_LLM_ERROR_RATE,
+        seed: Optional[int] = 0,
+    ) -> None:
+        self.latency = latency
+        self.token_delay = token_delay
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+        self.calls = 0
+
+    async def _begin(self, model: str) -> None:
+        self.calls += 1
+        if self.latency > 0:
+            await asyncio.sleep(self.latency)
+        if self.error_rate > 0 and self._random.random() < self.error_rate:
+            raise InjectedError(f"Injizierter Fehler (Modell {model})")
+
+    async def warm_up(self) -> None:
+        _logger.info("Fake-LLM-Backend aktiv (Latenz %.2f s, Fehlerrate %.0f %%)", self.latency, self.error_rate * 100)
+
+    async def complete(
+        self, model: str, messages: List[dict], temperature: float, timeout: Optional[float] = None
+    ) -> str:
+        await asyncio.wait_for(self._begin(model), timeout)
+        return fake_answer(model, messages)
+
+    async def stream(self, model: str, messages: List[dict], temperature: float) -> AsyncIterator[str]:
+        await self._begin(model)
+        for index, chunk in enumerate(split_chunks(fake_answer(model, messages))):
+            if index and self.token_delay > 0:
+                await asyncio.sleep(self.token_delay)
+            yield chunk
+
+    async def aclose(self) -> None:
+        return None
@@ -0,0 +1,205 @@
+"""Lokaler Ersatz für den OpenAI-Endpunkt ``/v1/chat/completions``.
+
+Der echte OpenAI-Client kann über ``base_url`` (``KI_KUMPEL_LLM_BASE_URL``)
+auf diesen Server zeigen; damit läuft die komplette Pipeline inklusive HTTP,
+Streaming und Fehlerbehandlung offline::
+
+    python -m core.fake_openai_server --port 8765 --latency 0.3 --error-rate 0.05
+    set KI_KUMPEL_LLM_BASE_URL=http://127.0.0.1:8765/v1
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+from core.config import FAKE_LLM_ERROR_RATE, FAKE_LLM_LATENCY_S, FAKE_LLM_TOKEN_DELAY_S
+from core.fake_llm import fake_answer, split_chunks
+from core.logger import get_logger
+
+_logger = get_logger(__name__)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: "FakeOpenAIServer"
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format: str, *args) -> None:  # noqa: A002 - Signatur der Basisklasse
+        _logger.debug("Fake-Server: " + format, *args)
+
+    def _send_json(self, status: int, payload: dict) -> None:
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_HEAD(self) -> None:  # noqa: N802 - http.server-Konvention
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_POST(self) -> None:  # noqa: N802 - http.server-Konvention
+        length = int(self.headers.get("Content-Length", "0"))
+        try:
+            request = json.loads(self.rfile.read(length) or b"{}")
+        except json.JSONDecodeError:
+            self._send_json(400, {"error": {"message": "Ungültiges JSON", "type": "invalid_request_error"}})
+            return
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": f"Unbekannter Pfad {self.path}", "type": "not_found"}})
+            return
+
+        settings = self.server
+        settings.requests += 1
+        if settings.latency > 0:
+            time.sleep(settings.latency)
+        if settings.should_fail():
+            self._send_json(
+                settings.error_status,
+                {"error": {"message": "Injizierter Fehler", "type": "server_error"}},
+            )
+            return
+
+        model = request.get("model", "fake")
+        answer = fake_answer(model, request.get("messages", []))
+        completion_id = "chatcmpl-" + uuid.uuid4().hex[:12]
+        created = int(time.time())
+        if request.get("stream"):
+            self._stream(completion_id, created, model, answer)
+            return
+        self._send_json(
+            200,
+            {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [
+                    {
+                        "index": 0,
+                        "message": {"role": "assistant", "content": answer},
+                        "finish_reason": "stop",
+                    }
+                ],
+                "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+            },
+        )
+
+    def _stream(self, completion_id: str, created: int, model: str, answer: str) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+        def event(delta: dict, finish_reason: Optional[str] = None) -> None:
+            chunk = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            }
+            self.wfile.write(b"data: " + json.dumps(chunk).encode("utf-8") + b"\n\n")
+            self.wfile.flush()
+
+        event({"role": "assistant", "content": ""})
+        for index, piece in enumerate(split_chunks(answer)):
+            if index and self.server.token_delay > 0:
+                time.sleep(self.server.token_delay)
+            event({"content": piece})
+        event({}, "stop")
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+
+class FakeOpenAIServer(ThreadingHTTPServer):
+    """HTTP-Server, der ``chat.completions`` (auch gestreamt) deterministisch beantwortet."""
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        *,
+        latency: float = FAKE_LLM_LATENCY_S,
+        token_delay: float = FAKE_LLM_TOKEN_DELAY_S,
+        error_rate: float = FAKE_LLM_ERROR_RATE,
+        error_status: int = 500,
+        seed: Optional[int] = 0,
+    ) -> None:
+        super().__init__((host, port), _Handler)
+        self.latency = latency
+        self.token_delay = token_delay
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.requests = 0
+        self._random = random.Random(seed)
+        self._random_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def should_fail(self) -> bool:
+        if self.error_rate <= 0:
+            return False
+        with self._random_lock:
+            return self._random.random() < self.error_rate
+
+    def start(self) -> "FakeOpenAIServer":
+        """Startet den Server in einem Hintergrund-Thread."""
+        self._thread = threading.Thread(target=self.serve_forever, name="FakeOpenAI", daemon=True)
+        self._thread.start()
+        _logger.info("Fake-OpenAI-Server läuft unter %s", self.base_url)
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+
+
+def main() -> None:  # pragma: no cover - CLI Einstieg
+    parser = argparse.ArgumentParser(description="Lokaler OpenAI-Ersatz für Lasttests")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=FAKE_LLM_LATENCY_S, help="Verzögerung pro Anfrage in Sekunden")
+    parser.add_argument("--token-delay", type=float, default=FAKE_LLM_TOKEN_DELAY_S, help="Verzögerung pro Stream-Stück")
+    parser.add_argument("--error-rate", type=float, default=FAKE_LLM_ERROR_RATE, help="Anteil fehlschlagender Anfragen (0-1)")
+    parser.add_argument("--error-status", type=int, default=500, help="HTTP-Status injizierter Fehler (z.B. 429, 500, 503)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    server = FakeOpenAIServer(
+        args.host,
+        args.port,
+        latency=args.latency,
+        token_delay=args.token_delay,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        seed=args.seed,
+    )
+    print(f"Fake-OpenAI-Server: {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":  # pragma: no cover - CLI Einstieg
+    main()
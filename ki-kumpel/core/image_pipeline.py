@@ -0,0 +1,140 @@
+"""Aufbereitung von Screenshots für Vision-Anfragen und Ablage."""
+from __future__ import annotations
+
+import base64
+import hashlib
+import io
+import time
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+from PIL import Image
+
+from core.config import (
+    SCREENSHOT_COMPRESS_LEVEL,
+    SCREENSHOT_FORMAT,
+    SCREENSHOT_GREYSCALE,
+    SCREENSHOT_MAX_EDGE,
+    SCREENSHOT_QUALITY,
+)
+
+_DHASH_SIZE = 8
+
+_FORMATS = {
+    "jpeg": ("JPEG", "image/jpeg", "jpg"),
+    "webp": ("WEBP", "image/webp", "webp"),
+    "png": ("PNG", "image/png", "png"),
+}
+
+
+@dataclass(frozen=True)
+class EncodedImage:
+    """Einmal kodierter Screenshot; dieselben Bytes gehen auf die Platte und an die API."""
+
+    data: bytes
+    format: str
+    size: Tuple[int, int]
+    original_size: Tuple[int, int]
+    encode_ms: float
+    phash: Optional[int] = None
+
+    @property
+    def mime_type(self) -> str:
+        return _FORMATS[self.format][1]
+
+    @property
+    def extension(self) -> str:
+        return _FORMATS[self.format][2]
+
+    @property
+    def sha1(self) -> str:
+        return hashlib.sha1(self.data).hexdigest()
+
+    def data_url(self) -> str:
+        return f"data:{self.mime_type};base64," + base64.b64encode(self.data).decode("ascii")
+
+    def describe(self) -> str:
+        return "{}x{} {} ({}x{} Original), {:.1f} KB, Kodierung {:.1f} ms".format(
+            *self.size,
+            self.format.upper(),
+            *self.original_size,
+            len(self.data) / 1024,
+            self.encode_ms,
+        )
+
+
+def normalise_format(fmt: str) -> str:
+    fmt = fmt.lower()
+    if fmt == "jpg":
+        fmt = "jpeg"
+    if fmt not in _FORMATS:
+        raise ValueError(f"Unbekanntes Bildformat: {fmt}")
+    return fmt
+
+
+def extension_for(fmt: str = SCREENSHOT_FORMAT) -> str:
+    return _FORMATS[normalise_format(fmt)][2]
+
+
+def dhash(image: Image.Image, size: int = _DHASH_SIZE) -> int:
+    """Differenz-Hash: ``size``×``size`` Bits aus Helligkeitsgefällen benachbarter Pixel.
+
+    Kleine Änderungen (Cursor, Uhrzeit) kippen nur wenige Bits, sodass die
+    Hamming-Distanz zweier Hashes als Maß für „gleicher Bildschirm“ taugt.
+    """
+    small = image.convert("L").resize((size + 1, size), Image.Resampling.BOX)
+    pixels = small.tobytes()
+    value = 0
+    for row in range(size):
+        offset = row * (size + 1)
+        for col in range(size):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+
+def hamming_distance(first: int, second: int) -> int:
+    return bin(first ^ second).count("1")
+
+
+def prepare_image(
+    image: Image.Image,
+    *,
+    max_edge: int = SCREENSHOT_MAX_EDGE,
+    fmt: str = SCREENSHOT_FORMAT,
+    quality: int = SCREENSHOT_QUALITY,
+    greyscale: bool = SCREENSHOT_GREYSCALE,
+    compress_level: int = SCREENSHOT_COMPRESS_LEVEL,
+    phash: Optional[int] = None,
+) -> EncodedImage:
+    """Skaliert ``image`` auf höchstens ``max_edge`` Pixel Kantenlänge und kodiert es einmalig.
+
+    ``fmt`` ist ``"jpeg"``, ``"webp"`` oder ``"png"``; ``quality`` gilt für die
+    verlustbehafteten Formate, ``compress_level`` (0-9) für PNG und als
+    Aufwandsstufe für WebP. ``max_edge <= 0`` behält die Originalgröße. Ein
+    bereits bekannter Perceptual-Hash kann als ``phash`` übergeben werden.
+    """
+    fmt = normalise_format(fmt)
+    started = time.perf_counter()
+    original_size = image.size
+    prepared = image.convert("L") if greyscale else image.convert("RGB")
+    if max_edge > 0 and max(prepared.size) > max_edge:
+        scale = max_edge / max(prepared.size)
+        target = (max(1, round(prepared.width * scale)), max(1, round(prepared.height * scale)))
+        prepared = prepared.resize(target, Image.Resampling.LANCZOS)
+
+    buffer = io.BytesIO()
+    pil_format = _FORMATS[fmt][0]
+    if pil_format == "PNG":
+        prepared.save(buffer, format=pil_format, optimize=False, compress_level=compress_level)
+    elif pil_format == "WEBP":
+        prepared.save(buffer, format=pil_format, quality=quality, method=min(6, compress_level))
+    else:
+        prepared.save(buffer, format=pil_format, quality=quality)
+    return EncodedImage(
+        data=buffer.getvalue(),
+        format=fmt,
+        size=prepared.size,
+        original_size=original_size,
+        encode_ms=(time.perf_counter() - started) * 1000,
+        phash=phash if phash is not None else dhash(prepared),
+    )
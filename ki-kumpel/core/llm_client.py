@@ -1,126 +1,377 @@
 """Kapselung aller LLM-Aufrufe."""
 from __future__ import annotations
 
-import base64
-import io
-import os
-from typing import Iterable, List, Optional
+import concurrent.futures
+import re
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Iterable, Iterator, List, Optional
 
 from PIL import Image
-from openai import OpenAI
 
+from core.async_llm import LLMBackend, create_backend
 from core.config import (
     DEFAULT_SYSTEM_PROMPT_TEXT,
     DEFAULT_SYSTEM_PROMPT_VISION,
+    LLM_CACHE_ENABLED,
+    LLM_CACHE_HISTORY_TURNS,
+    LLM_CACHE_INCLUDE_HISTORY,
     MODEL_TEXT,
     MODEL_VISION,
+    VISION_REUSE_DISTANCE,
 )
+from core.event_loop import get_loop_thread
+from core.image_pipeline import EncodedImage, prepare_image
 from core.logger import get_logger
+from core.prompt_builder import BuiltPrompt, PromptBuilder, estimate_image_tokens
+from core.response_cache import ResponseCache
 
 _logger = get_logger(__name__)
 
+# Zeitstempel der Verlaufsbeiträge („USER (2024-05-01T09:30:00): …“, siehe
+# ``AssistantRouter._format_interaction``); sie gehören nicht in den Cache-Schlüssel.
+_HISTORY_TIMESTAMP = re.compile(r"^(\w+) \([^)]*\): ")
+
+
+class RequestCancelledError(RuntimeError):
+    """Die Anfrage wurde abgebrochen oder durch eine neuere ersetzt."""
+
+
+@dataclass
+class PreparedRequest:
+    model: str
+    messages: List[dict]
+    temperature: float
+    cache_key: str | None = None
+    # Nur Vision: Schlüssel aus Modell, Temperatur, Verlauf und Frage plus Bild-Hashes
+    question_key: str | None = None
+    image_hash: str | None = None
+    phash: int | None = None
+
 
 class LLMClient:
-    """Wrapper für das OpenAI SDK."""
+    """Synchrone Fassade über ein :class:`~core.async_llm.LLMBackend`.
 
-    def __init__(self, api_key: Optional[str] = None) -> None:
-        key = api_key or os.getenv("OPENAI_API_KEY")
-        if not key:
-            raise RuntimeError("OPENAI_API_KEY ist nicht gesetzt")
-        self._client = OpenAI(api_key=key)
+    Ohne ``backend`` wird das konfigurierte Backend erzeugt (OpenAI oder Fake).
+    Die Aufrufe laufen auf dem gemeinsamen Event-Loop-Thread. Pro ``channel``
+    ist höchstens eine Anfrage aktiv: eine neue Anfrage auf demselben Kanal
+    bricht die vorherige ab, die dann :class:`RequestCancelledError` auslöst.
+    """
 
-    @staticmethod
-    def _encode_image(image: Image.Image) -> str:
-        buffer = io.BytesIO()
-        image.save(buffer, format="PNG")
-        return base64.b64encode(buffer.getvalue()).decode("ascii")
+    def __init__(self, api_key: Optional[str] = None, backend: LLMBackend | None = None) -> None:
+        self._backend = backend if backend is not None else create_backend(api_key)
+        self._loop = get_loop_thread()
+        self._loop.submit(self._backend.warm_up())
+        self._inflight: Dict[str, concurrent.futures.Future] = {}
+        self._inflight_lock = threading.Lock()
+        self._prompt_builder = PromptBuilder()
+        self.cache: ResponseCache | None = ResponseCache() if LLM_CACHE_ENABLED else None
 
-    def ask_text(
+    def _encode_image(self, image: Image.Image | EncodedImage) -> EncodedImage:
+        encoded = image if isinstance(image, EncodedImage) else prepare_image(image)
+        _logger.info("Vision-Bild: %s", encoded.describe())
+        return encoded
+
+    def _build_prompt(
         self,
+        system_prompt: str,
         question: str,
         *,
-        context_messages: Iterable[str] | None = None,
-        facts: Iterable[str] | None = None,
-        temperature: float = 0.3,
-    ) -> str:
-        messages: List[dict] = [
-            {"role": "system", "content": DEFAULT_SYSTEM_PROMPT_TEXT},
+        context_messages: Iterable[str] | None,
+        facts: Iterable[str] | None,
+        style_examples: Iterable[str] | None = None,
+        image: EncodedImage | None = None,
+    ) -> BuiltPrompt:
+        prompt = self._prompt_builder.build(
+            system_prompt,
+            question,
+            facts=facts,
+            history=list(context_messages or []),
+            style_examples=style_examples,
+            image_url=image.data_url() if image is not None else None,
+            image_tokens=estimate_image_tokens(image.size) if image is not None else 0,
+        )
+        stats = prompt.stats
+        _logger.info(
+            "Prompt-Tokens %d/%d (System %d, Stil %d, Fakten %d, Verlauf %d, Frage %d, Bild %d; Verlauf behalten %d, gekürzt %d, verworfen %d)",
+            stats.total,
+            stats.budget,
+            stats.system,
+            stats.style,
+            stats.facts,
+            stats.history,
+            stats.question,
+            stats.image,
+            stats.history_kept,
+            stats.history_truncated,
+            stats.history_dropped,
+        )
+        return prompt
+
+    @staticmethod
+    def _key_history(prompt: BuiltPrompt) -> List[dict]:
+        """Verlauf für den Cache-Schlüssel: die jüngsten Beiträge ohne Zeitstempel.
+
+        Mit Zeitstempeln wäre jeder Schlüssel einmalig. Ältere Beiträge bleiben
+        außen vor, damit eine wiederholte Frage trotz gewachsenen Verlaufs trifft.
+        """
+        history = prompt.messages[prompt.history_slice][-LLM_CACHE_HISTORY_TURNS:]
+        return [
+            {**message, "content": _HISTORY_TIMESTAMP.sub(r"\1: ", message["content"])} for message in history
         ]
 
-        if facts:
-            fact_block = "\n".join(f"- {fact}" for fact in facts)
-            messages.append(
-                {
-                    "role": "system",
-                    "content": "Relevantes Hintergrundwissen:\n" + fact_block,
-                }
+    def _prepare(
+        self, model: str, prompt: BuiltPrompt, temperature: float, image_hash: str | None = None
+    ) -> PreparedRequest:
+        cache_key = None
+        # Ohne Verlauf im Schlüssel bekämen Rückfragen wie „Und warum?“ fremde Antworten.
+        start, stop = prompt.history_slice.start, prompt.history_slice.stop
+        if self.cache is not None and (LLM_CACHE_INCLUDE_HISTORY or stop == start):
+            key_messages = prompt.messages[:start] + self._key_history(prompt) + prompt.messages[stop:]
+            cache_key = ResponseCache.make_key(model, temperature, key_messages, image_hash)
+        return PreparedRequest(model, prompt.messages, temperature, cache_key)
+
+    def _text_request(
+        self,
+        question: str,
+        temperature: float,
+        *,
+        context_messages: Iterable[str] | None,
+        facts: Iterable[str] | None,
+        style_examples: Iterable[str] | None,
+    ) -> PreparedRequest:
+        prompt = self._build_prompt(
+            DEFAULT_SYSTEM_PROMPT_TEXT,
+            question,
+            context_messages=context_messages,
+            facts=facts,
+            style_examples=style_examples,
+        )
+        return self._prepare(MODEL_TEXT, prompt, temperature)
+
+    def _vision_request(
+        self,
+        question: str,
+        image: Image.Image | EncodedImage,
+        temperature: float,
+        *,
+        context_messages: Iterable[str] | None,
+        facts: Iterable[str] | None,
+        style_examples: Iterable[str] | None,
+    ) -> PreparedRequest:
+        encoded = self._encode_image(image)
+        prompt_text = (
+            "Hier ist ein Screenshot meines Bildschirms. "
+            "Nutze ihn zur Beantwortung der Frage. Frage: " + question
+        )
+        prompt = self._build_prompt(
+            DEFAULT_SYSTEM_PROMPT_VISION,
+            prompt_text,
+            context_messages=context_messages,
+            facts=facts,
+            style_examples=style_examples,
+            image=encoded,
+        )
+        request = self._prepare(MODEL_VISION, prompt, temperature, encoded.sha1)
+        if request.cache_key is not None:
+            # Fakten und Stilbeispiele dürfen sich ändern, Verlauf, Frage und Bild nicht.
+            request.question_key = ResponseCache.make_key(
+                MODEL_VISION, temperature, self._key_history(prompt) + [{"role": "user", "content": question}]
             )
+            request.image_hash = encoded.sha1
+            request.phash = encoded.phash
+        return request
 
-        if context_messages:
-            for entry in context_messages:
-                messages.append({"role": "system", "content": entry})
+    def _cached(self, request: PreparedRequest, bypass_cache: bool) -> str | None:
+        if self.cache is None or request.cache_key is None or bypass_cache:
+            return None
+        cached = self.cache.get(request.cache_key)
+        if cached is not None:
+            _logger.info("Antwort aus dem Cache (Modell %s)", request.model)
+            return cached
+        if request.question_key is None or request.image_hash is None:
+            return None
+        cached = self.cache.find_same_image(request.question_key, request.image_hash)
+        if cached is None and request.phash is not None and VISION_REUSE_DISTANCE >= 0:
+            cached = self.cache.find_similar(request.question_key, request.phash, VISION_REUSE_DISTANCE)
+        if cached is not None:
+            _logger.info("Vision-Antwort für unveränderten Bildschirm wiederverwendet")
+        return cached
 
-        messages.append({"role": "user", "content": question})
+    def _store(self, request: PreparedRequest, answer: str, started: float) -> None:
+        if self.cache is not None and request.cache_key is not None:
+            self.cache.put(
+                request.cache_key,
+                request.model,
+                answer,
+                time.perf_counter() - started,
+                question_key=request.question_key,
+                image_hash=request.image_hash,
+                phash=request.phash,
+            )
 
-        _logger.info("Text-Anfrage an Modell %s", MODEL_TEXT)
-        response = self._client.chat.completions.create(
-            model=MODEL_TEXT,
-            messages=messages,
-            temperature=temperature,
+    def _register(self, channel: str | None, future: concurrent.futures.Future) -> None:
+        if channel is None:
+            return
+        with self._inflight_lock:
+            previous = self._inflight.get(channel)
+            self._inflight[channel] = future
+        if previous is not None and previous.cancel():
+            _logger.info("Vorherige Anfrage auf Kanal %s abgebrochen", channel)
+
+    def _release(self, channel: str | None, future: concurrent.futures.Future) -> None:
+        with self._inflight_lock:
+            if channel is not None and self._inflight.get(channel) is future:
+                del self._inflight[channel]
+
+    def _complete(
+        self, request: PreparedRequest, bypass_cache: bool = False, channel: str | None = None
+    ) -> str:
+        cached = self._cached(request, bypass_cache)
+        if cached is not None:
+            return cached
+        started = time.perf_counter()
+        future = self._loop.submit(
+            self._backend.complete(request.model, request.messages, request.temperature)
         )
-        return response.choices[0].message.content or ""
+        self._register(channel, future)
+        try:
+            answer = future.result()
+        except concurrent.futures.CancelledError as exc:
+            raise RequestCancelledError("Anfrage abgebrochen") from exc
+        finally:
+            self._release(channel, future)
+        self._store(request, answer, started)
+        return answer
 
-    def ask_vision(
+    def _stream(
+        self, request: PreparedRequest, bypass_cache: bool = False, channel: str | None = None
+    ) -> Iterator[str]:
+        cached = self._cached(request, bypass_cache)
+        if cached is not None:
+            return iter([cached])
+        # Der Stream startet sofort, damit er schon vor dem ersten Token abbrechbar ist.
+        holder: List[concurrent.futures.Future] = []
+        deltas = self._loop.iterate(
+            self._backend.stream(request.model, request.messages, request.temperature), holder
+        )
+        self._register(channel, holder[0])
+        return self._relay(request, deltas, holder[0], channel)
+
+    def _relay(
+        self,
+        request: PreparedRequest,
+        deltas: Iterator[str],
+        future: concurrent.futures.Future,
+        channel: str | None,
+    ) -> Iterator[str]:
+        started = time.perf_counter()
+        parts: List[str] = []
+        try:
+            for delta in deltas:
+                parts.append(delta)
+                yield delta
+        except concurrent.futures.CancelledError as exc:
+            raise RequestCancelledError("Anfrage abgebrochen") from exc
+        finally:
+            deltas.close()
+            self._release(channel, future)
+        self._store(request, "".join(parts), started)
+
+    def resilience_stats(self) -> Dict[str, object]:
+        """Latenz-Perzentile, Retry-/Hedge-Zähler und Breaker-Zustand (leer ohne Resilienz-Schicht)."""
+        stats = getattr(self._backend, "stats", None)
+        return stats() if callable(stats) else {}
+
+    def cancel(self, channel: str | None = None) -> int:
+        """Bricht die laufende Anfrage auf ``channel`` ab (``None``: alle Kanäle)."""
+        with self._inflight_lock:
+            if channel is None:
+                futures = list(self._inflight.values())
+                self._inflight.clear()
+            else:
+                future = self._inflight.pop(channel, None)
+                futures = [future] if future is not None else []
+        return sum(1 for future in futures if future.cancel())
+
+    def close(self) -> None:
+        self.cancel()
+        try:
+            self._loop.run(self._backend.aclose(), timeout=5)
+        except Exception:
+            _logger.exception("HTTP-Pool konnte nicht sauber geschlossen werden")
+        if self.cache is not None:
+            self.cache.close()
+
+    def ask_text(
         self,
         question: str,
-        image: Image.Image,
         *,
         context_messages: Iterable[str] | None = None,
         facts: Iterable[str] | None = None,
+        style_examples: Iterable[str] | None = None,
         temperature: float = 0.3,
+        bypass_cache: bool = False,
+        channel: str | None = None,
     ) -> str:
-        encoded = self._encode_image(image)
-
-        messages: List[dict] = [
-            {"role": "system", "content": DEFAULT_SYSTEM_PROMPT_VISION},
-        ]
-
-        if facts:
-            fact_block = "\n".join(f"- {fact}" for fact in facts)
-            messages.append(
-                {
-                    "role": "system",
-                    "content": "Relevantes Hintergrundwissen:\n" + fact_block,
-                }
-            )
+        request = self._text_request(
+            question, temperature, context_messages=context_messages, facts=facts, style_examples=style_examples
+        )
+        _logger.info("Text-Anfrage an Modell %s", MODEL_TEXT)
+        return self._complete(request, bypass_cache, channel)
 
-        if context_messages:
-            for entry in context_messages:
-                messages.append({"role": "system", "content": entry})
-
-        messages.append(
-            {
-                "role": "user",
-                "content": [
-                    {
-                        "type": "text",
-                        "text": (
-                            "Hier ist ein Screenshot meines Bildschirms. "
-                            "Nutze ihn zur Beantwortung der Frage. Frage: " + question
-                        ),
-                    },
-                    {
-                        "type": "image_url",
-                        "image_url": {"url": "data:image/png;base64," + encoded},
-                    },
-                ],
-            }
+    def stream_text(
+        self,
+        question: str,
+        *,
+        context_messages: Iterable[str] | None = None,
+        facts: Iterable[str] | None = None,
+        style_examples: Iterable[str] | None = None,
+        temperature: float = 0.3,
+        bypass_cache: bool = False,
+        channel: str | None = None,
+    ) -> Iterator[str]:
+        """Wie :meth:`ask_text`, liefert die Antwort aber stückweise."""
+        request = self._text_request(
+            question, temperature, context_messages=context_messages, facts=facts, style_examples=style_examples
         )
+        _logger.info("Text-Anfrage (Stream) an Modell %s", MODEL_TEXT)
+        return self._stream(request, bypass_cache, channel)
 
+    def ask_vision(
+        self,
+        question: str,
+        image: Image.Image | EncodedImage,
+        *,
+        context_messages: Iterable[str] | None = None,
+        facts: Iterable[str] | None = None,
+        style_examples: Iterable[str] | None = None,
+        temperature: float = 0.3,
+        bypass_cache: bool = False,
+        channel: str | None = None,
+    ) -> str:
+        request = self._vision_request(
+            question, image, temperature, context_messages=context_messages, facts=facts, style_examples=style_examples
+        )
         _logger.info("Vision-Anfrage an Modell %s", MODEL_VISION)
-        response = self._client.chat.completions.create(
-            model=MODEL_VISION,
-            messages=messages,
-            temperature=temperature,
+        return self._complete(request, bypass_cache, channel)
+
+    def stream_vision(
+        self,
+        question: str,
+        image: Image.Image | EncodedImage,
+        *,
+        context_messages: Iterable[str] | None = None,
+        facts: Iterable[str] | None = None,
+        style_examples: Iterable[str] | None = None,
+        temperature: float = 0.3,
+        bypass_cache: bool = False,
+        channel: str | None = None,
+    ) -> Iterator[str]:
+        """Wie :meth:`ask_vision`, liefert die Antwort aber stückweise."""
+        request = self._vision_request(
+            question, image, temperature, context_messages=context_messages, facts=facts, style_examples=style_examples
         )
-        return response.choices[0].message.content or ""
+        _logger.info("Vision-Anfrage (Stream) an Modell %s", MODEL_VISION)
+        return self._stream(request, bypass_cache, channel)
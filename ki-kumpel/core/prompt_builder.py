@@ -0,0 +1,241 @@
+"""Token-budgetierter Aufbau der Chat-Nachrichten für das LLM."""
+from __future__ import annotations
+
+import math
+import re
+from dataclasses import dataclass, field
+from typing import Iterable, List, Sequence, Tuple
+
+from core.config import PROMPT_FACT_TOKEN_SHARE, PROMPT_STYLE_TOKEN_SHARE, PROMPT_TOKEN_BUDGET
+
+# Grobe lokale Schätzung: Wörter kosten etwa ein Token pro vier Zeichen,
+# Satzzeichen je ein Token. Für Budgetierung reicht das, ohne Tokenizer-Download.
+_TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+_MESSAGE_OVERHEAD = 4
+_MIN_TRUNCATED_TOKENS = 24
+_ALWAYS_KEEP_RECENT = 4
+_FACT_HEADER = "Relevantes Hintergrundwissen:"
+_STYLE_HEADER = "Beispiele für den gewünschten Schreibstil (nur Ton und Aufbau übernehmen):"
+# Bildkosten nach dem Kachelschema der Vision-Modelle (detail=high): das Bild
+# wird in 2048er-Rahmen, die kurze Seite auf 768 px skaliert, pro 512er-Kachel
+# kommen 170 Tokens zum Grundpreis von 85 hinzu.
+_IMAGE_BASE_TOKENS = 85
+_IMAGE_TILE_TOKENS = 170
+_IMAGE_TILE = 512
+
+
+def _token_cost(piece: str) -> int:
+    return max(1, math.ceil(len(piece) / 4))
+
+
+def count_tokens(text: str) -> int:
+    return sum(_token_cost(match.group()) for match in _TOKEN_PATTERN.finditer(text))
+
+
+def truncate_to_tokens(text: str, max_tokens: int, marker: str = " …") -> str:
+    """Kürzt ``text`` auf höchstens ``max_tokens`` geschätzte Tokens."""
+    used = 0
+    end = 0
+    for match in _TOKEN_PATTERN.finditer(text):
+        cost = _token_cost(match.group())
+        if used + cost > max_tokens - 1:
+            return text[:end].rstrip() + marker
+        used += cost
+        end = match.end()
+    return text
+
+
+def estimate_image_tokens(size: Tuple[int, int]) -> int:
+    """Schätzt die Tokens, die ein Bild der Größe ``(Breite, Höhe)`` im Prompt kostet."""
+    width, height = size
+    if width <= 0 or height <= 0:
+        return _IMAGE_BASE_TOKENS
+    scale = min(1.0, 2048 / max(width, height))
+    width, height = width * scale, height * scale
+    scale = min(1.0, 768 / min(width, height))
+    width, height = width * scale, height * scale
+    tiles = math.ceil(width / _IMAGE_TILE) * math.ceil(height / _IMAGE_TILE)
+    return _IMAGE_BASE_TOKENS + _IMAGE_TILE_TOKENS * tiles
+
+
+@dataclass
+class PromptStats:
+    budget: int
+    system: int = 0
+    style: int = 0
+    facts: int = 0
+    history: int = 0
+    question: int = 0
+    image: int = 0
+    style_examples: int = 0
+    facts_kept: int = 0
+    facts_dropped: int = 0
+    history_kept: int = 0
+    history_truncated: int = 0
+    history_dropped: int = 0
+
+    @property
+    def total(self) -> int:
+        return self.system + self.style + self.facts + self.history + self.question + self.image
+
+
+@dataclass
+class BuiltPrompt:
+    messages: List[dict]
+    stats: PromptStats
+    history_indices: List[int] = field(default_factory=list)
+    history_slice: slice = field(default_factory=lambda: slice(0, 0))
+
+
+class PromptBuilder:
+    """Verteilt ein Token-Budget auf Systemprompt, Fakten, Verlauf und Frage.
+
+    Systemprompt, Frage und ein mitgeschicktes Bild haben Vorrang (die Frage
+    wird notfalls gekürzt, das Bild mit seinen geschätzten Kosten reserviert),
+    danach folgen Stilbeispiele und
+    Fakten (höchstens ``style_share`` bzw. ``fact_share`` des Budgets) und
+    zuletzt der Verlauf: die jüngsten Beiträge
+    zuerst, dann ältere Beiträge mit Wortüberschneidung zur Frage, dann der Rest.
+    Einzelne Beiträge werden auf ein Viertel des Verlaufsbudgets gekürzt, was
+    danach nicht mehr passt, wird gekürzt oder weggelassen.
+    """
+
+    def __init__(
+        self,
+        budget: int = PROMPT_TOKEN_BUDGET,
+        fact_share: float = PROMPT_FACT_TOKEN_SHARE,
+        style_share: float = PROMPT_STYLE_TOKEN_SHARE,
+    ) -> None:
+        self.budget = budget
+        self.fact_share = fact_share
+        self.style_share = style_share
+
+    def build(
+        self,
+        system_prompt: str,
+        question: str,
+        *,
+        facts: Iterable[str] | None = None,
+        history: Sequence[str] | None = None,
+        style_examples: Iterable[str] | None = None,
+        image_url: str | None = None,
+        image_tokens: int = 0,
+    ) -> BuiltPrompt:
+        """Baut die Nachrichten; mit ``image_url`` wird das Bild an die Frage gehängt."""
+        stats = PromptStats(budget=self.budget)
+        stats.system = count_tokens(system_prompt) + _MESSAGE_OVERHEAD
+        stats.image = image_tokens if image_url is not None else 0
+
+        question_limit = max((self.budget - stats.image) // 2, _MIN_TRUNCATED_TOKENS)
+        if count_tokens(question) > question_limit:
+            question = truncate_to_tokens(question, question_limit)
+        stats.question = count_tokens(question) + _MESSAGE_OVERHEAD
+        remaining = max(0, self.budget - stats.system - stats.question - stats.image)
+
+        messages: List[dict] = [{"role": "system", "content": system_prompt}]
+
+        examples, stats.style = self._select_blocks(
+            _STYLE_HEADER,
+            [f"---\n{example.strip()}" for example in style_examples or []],
+            min(remaining, int(self.budget * self.style_share)),
+        )
+        stats.style_examples = len(examples)
+        if examples:
+            messages.append({"role": "system", "content": _STYLE_HEADER + "\n" + "\n".join(examples)})
+        remaining -= stats.style
+
+        all_facts = [f"- {fact}" for fact in facts or []]
+        fact_lines, stats.facts = self._select_blocks(
+            _FACT_HEADER, all_facts, min(remaining, int(self.budget * self.fact_share))
+        )
+        stats.facts_kept = len(fact_lines)
+        stats.facts_dropped = len(all_facts) - len(fact_lines)
+        if fact_lines:
+            messages.append({"role": "system", "content": _FACT_HEADER + "\n" + "\n".join(fact_lines)})
+        remaining -= stats.facts
+
+        kept = self._select_history(list(history or []), question, remaining, stats)
+        history_start = len(messages)
+        for _index, entry in kept:
+            messages.append({"role": "system", "content": entry})
+        history_slice = slice(history_start, len(messages))
+
+        if image_url is not None:
+            messages.append(
+                {
+                    "role": "user",
+                    "content": [
+                        {"type": "text", "text": question},
+                        {"type": "image_url", "image_url": {"url": image_url}},
+                    ],
+                }
+            )
+        else:
+            messages.append({"role": "user", "content": question})
+        return BuiltPrompt(
+            messages=messages,
+            stats=stats,
+            history_indices=[index for index, _ in kept],
+            history_slice=history_slice,
+        )
+
+    @staticmethod
+    def _select_blocks(header: str, blocks: List[str], allowance: int) -> Tuple[List[str], int]:
+        """Übernimmt Blöcke in Reihenfolge, solange sie samt Überschrift ins Budget passen."""
+        header_cost = count_tokens(header) + _MESSAGE_OVERHEAD
+        if not blocks or allowance <= header_cost:
+            return [], 0
+        used = header_cost
+        selected: List[str] = []
+        for block in blocks:
+            cost = count_tokens(block) + 1
+            if used + cost > allowance:
+                continue
+            selected.append(block)
+            used += cost
+        if not selected:
+            return [], 0
+        return selected, used
+
+    @staticmethod
+    def _select_history(
+        history: List[str], question: str, allowance: int, stats: PromptStats
+    ) -> List[Tuple[int, str]]:
+        if not history:
+            return []
+        question_tokens = {token.lower() for token in _TOKEN_PATTERN.findall(question) if len(token) > 2}
+        newest_first = list(range(len(history) - 1, -1, -1))
+        recent = newest_first[:_ALWAYS_KEEP_RECENT]
+        older = newest_first[_ALWAYS_KEEP_RECENT:]
+
+        def overlap(index: int) -> int:
+            tokens = {token.lower() for token in _TOKEN_PATTERN.findall(history[index])}
+            return len(question_tokens & tokens)
+
+        older.sort(key=lambda index: (overlap(index), index), reverse=True)
+
+        # Ein einzelner langer Beitrag darf den Verlauf nicht allein füllen.
+        entry_cap = max(_MIN_TRUNCATED_TOKENS, allowance // 4)
+        selected: List[Tuple[int, str]] = []
+        used = 0
+        for index in recent + older:
+            entry = history[index]
+            if count_tokens(entry) > entry_cap:
+                entry = truncate_to_tokens(entry, entry_cap)
+            cost = count_tokens(entry) + _MESSAGE_OVERHEAD
+            if used + cost <= allowance:
+                selected.append((index, entry))
+                used += cost
+                continue
+            room = allowance - used - _MESSAGE_OVERHEAD
+            if room >= _MIN_TRUNCATED_TOKENS:
+                shortened = truncate_to_tokens(entry, room)
+                selected.append((index, shortened))
+                used += count_tokens(shortened) + _MESSAGE_OVERHEAD
+
+        selected.sort(key=lambda item: item[0])
+        stats.history = used
+        stats.history_truncated = sum(1 for index, entry in selected if entry != history[index])
+        stats.history_kept = len(selected)
+        stats.history_dropped = len(history) - len(selected)
+        return selected
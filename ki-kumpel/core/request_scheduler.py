@@ -0,0 +1,246 @@
+"""Priorisierter Worker-Pool für alle Anfragen an den Router."""
+from __future__ import annotations
+
+import heapq
+import itertools
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from enum import IntEnum
+from typing import Any, Callable, Dict, List, Optional
+
+from core.config import REQUEST_RESERVED_WORKERS, REQUEST_WORKERS
+from core.logger import get_logger
+
+_logger = get_logger(__name__)
+
+
+class Priority(IntEnum):
+    """Kleiner = wichtiger; bei gleicher Priorität gilt die Eingangsreihenfolge."""
+
+    INTERACTIVE = 0
+    VISION = 1
+    CAPTURE = 2
+    MAINTENANCE = 3
+
+
+# Diese Klassen dürfen die reservierten Worker nicht belegen.
+_BACKGROUND = (Priority.CAPTURE, Priority.MAINTENANCE)
+
+
+@dataclass(order=True)
+class _Job:
+    priority: int
+    seq: int
+    func: Callable[..., Any] = field(compare=False)
+    args: tuple = field(compare=False)
+    kwargs: dict = field(compare=False)
+    future: Future = field(compare=False)
+    key: Optional[str] = field(compare=False, default=None)
+    queued_at: float = field(compare=False, default_factory=time.perf_counter)
+    # Gesetzt, sobald ein laufender Auftrag ersetzt oder abgebrochen wird
+    cancelled: bool = field(compare=False, default=False)
+
+
+@dataclass
+class ClassStats:
+    queued: int = 0
+    running: int = 0
+    completed: int = 0
+    failed: int = 0
+    cancelled: int = 0
+    superseded: int = 0
+    max_wait_ms: float = 0.0
+    total_wait_ms: float = 0.0
+
+    @property
+    def avg_wait_ms(self) -> float:
+        started = self.completed + self.failed + self.running
+        return self.total_wait_ms / started if started else 0.0
+
+
+class RequestScheduler:
+    """Führt Aufträge nach Priorität in höchstens ``workers`` Threads aus.
+
+    ``reserved`` Worker bleiben für :attr:`Priority.INTERACTIVE` und
+    :attr:`Priority.VISION` frei, damit eine Nutzerfrage nie hinter
+    Hintergrundarbeit wartet. Ein Auftrag mit ``key`` ersetzt noch wartende
+    Aufträge mit demselben Schlüssel (deren Future wird abgebrochen) und
+    meldet einen laufenden über ``on_supersede(key)``, damit er abgebrochen
+    werden kann, z.B. über ``LLMClient.cancel``. Zusätzlich wird der laufende
+    Auftrag als abgebrochen markiert; er fragt das über :meth:`cancelled` ab.
+    """
+
+    def __init__(
+        self,
+        workers: int = REQUEST_WORKERS,
+        reserved: int = REQUEST_RESERVED_WORKERS,
+        on_supersede: Optional[Callable[[str], None]] = None,
+    ) -> None:
+        self.workers = max(1, workers)
+        self.reserved = min(max(0, reserved), self.workers - 1)
+        self.on_supersede = on_supersede
+        self._heap: List[_Job] = []
+        self._seq = itertools.count()
+        self._condition = threading.Condition()
+        self._running: Dict[str, List[_Job]] = {}
+        self._local = threading.local()
+        self._background_running = 0
+        self._stats: Dict[Priority, ClassStats] = {priority: ClassStats() for priority in Priority}
+        self._closed = False
+        self._threads: List[threading.Thread] = []
+        for index in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f"RequestWorker-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(
+        self,
+        func: Callable[..., Any],
+        *args: Any,
+        priority: Priority = Priority.INTERACTIVE,
+        key: Optional[str] = None,
+        **kwargs: Any,
+    ) -> Future:
+        """Reiht ``func(*args, **kwargs)`` ein und liefert dessen Future."""
+        future: Future = Future()
+        job = _Job(int(priority), next(self._seq), func, args, kwargs, future, key)
+        superseded_running = False
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("RequestScheduler ist bereits beendet")
+            if key is not None:
+                self._drop_queued(key)
+                superseded_running = self._mark_running_cancelled(key)
+            heapq.heappush(self._heap, job)
+            self._stats[Priority(job.priority)].queued += 1
+            self._condition.notify_all()
+        if superseded_running and self.on_supersede is not None:
+            self.on_supersede(key)
+        return future
+
+    def _drop_queued(self, key: str) -> None:
+        kept = []
+        for job in self._heap:
+            if job.key == key:
+                job.future.cancel()
+                stats = self._stats[Priority(job.priority)]
+                stats.queued -= 1
+                stats.superseded += 1
+            else:
+                kept.append(job)
+        if len(kept) != len(self._heap):
+            heapq.heapify(kept)
+            self._heap = kept
+
+    def _mark_running_cancelled(self, key: str) -> bool:
+        running = self._running.get(key, [])
+        for job in running:
+            job.cancelled = True
+        return bool(running)
+
+    def cancel(self, key: str) -> int:
+        """Bricht wartende Aufträge mit ``key`` ab und meldet einen laufenden; liefert die Zahl der wartenden."""
+        with self._condition:
+            before = len(self._heap)
+            self._drop_queued(key)
+            dropped = before - len(self._heap)
+            running = self._mark_running_cancelled(key)
+        if running and self.on_supersede is not None:
+            self.on_supersede(key)
+        return dropped
+
+    def cancelled(self) -> bool:
+        """``True``, wenn der im aufrufenden Thread laufende Auftrag ersetzt oder abgebrochen wurde.
+
+        Für Prüfungen an Stellen, die ``on_supersede`` nicht erreicht, z.B. vor
+        dem LLM-Aufruf und vor dem Ausliefern des Ergebnisses.
+        """
+        job = getattr(self._local, "job", None)
+        return job is not None and job.cancelled
+
+    def _next_job(self) -> Optional[_Job]:
+        with self._condition:
+            while True:
+                if self._closed and not self._heap:
+                    return None
+                if self._heap:
+                    job = self._heap[0]
+                    background = Priority(job.priority) in _BACKGROUND
+                    # Hintergrundarbeit nur, solange die reservierten Worker frei bleiben.
+                    if not background or self._background_running < self.workers - self.reserved:
+                        heapq.heappop(self._heap)
+                        stats = self._stats[Priority(job.priority)]
+                        stats.queued -= 1
+                        if not job.future.set_running_or_notify_cancel():
+                            stats.cancelled += 1
+                            continue
+                        wait_ms = (time.perf_counter() - job.queued_at) * 1000
+                        stats.running += 1
+                        stats.total_wait_ms += wait_ms
+                        stats.max_wait_ms = max(stats.max_wait_ms, wait_ms)
+                        if background:
+                            self._background_running += 1
+                        if job.key is not None:
+                            self._running.setdefault(job.key, []).append(job)
+                        return job
+                self._condition.wait()
+
+    def _finish(self, job: _Job, failed: bool) -> None:
+        with self._condition:
+            stats = self._stats[Priority(job.priority)]
+            stats.running -= 1
+            if failed:
+                stats.failed += 1
+            else:
+                stats.completed += 1
+            if Priority(job.priority) in _BACKGROUND:
+                self._background_running -= 1
+            if job.key is not None:
+                self._running[job.key].remove(job)
+                if not self._running[job.key]:
+                    del self._running[job.key]
+            self._condition.notify_all()
+
+    def _worker(self) -> None:
+        while True:
+            job = self._next_job()
+            if job is None:
+                return
+            self._local.job = job
+            try:
+                result = job.func(*job.args, **job.kwargs)
+            except BaseException as exc:
+                job.future.set_exception(exc)
+                self._finish(job, failed=True)
+            else:
+                job.future.set_result(result)
+                self._finish(job, failed=False)
+            finally:
+                self._local.job = None
+
+    def queue_depth(self) -> Dict[str, int]:
+        """Wartende Aufträge je Prioritätsklasse."""
+        with self._condition:
+            return {priority.name.lower(): self._stats[priority].queued for priority in Priority}
+
+    def stats(self) -> Dict[str, ClassStats]:
+        with self._condition:
+            return {priority.name.lower(): ClassStats(**vars(self._stats[priority])) for priority in Priority}
+
+    def shutdown(self, cancel_pending: bool = True, timeout: float = 5.0) -> None:
+        """Nimmt keine Aufträge mehr an und wartet auf laufende (wartende werden optional verworfen)."""
+        with self._condition:
+            self._closed = True
+            if cancel_pending:
+                for job in self._heap:
+                    job.future.cancel()
+                    stats = self._stats[Priority(job.priority)]
+                    stats.queued -= 1
+                    stats.cancelled += 1
+                self._heap = []
+            self._condition.notify_all()
+        deadline = time.monotonic() + timeout
+        for thread in self._threads:
+            thread.join(timeout=max(0.0, deadline - time.monotonic()))
@@ -0,0 +1,357 @@
+"""Wiederholungen, Hedging und Circuit Breaker für LLM-Aufrufe."""
+from __future__ import annotations
+
+import asyncio
+import math
+import random
+import threading
+import time
+from collections import deque
+from typing import AsyncIterator, Deque, Dict, List, Optional, Tuple
+
+import httpx
+import openai
+
+from core.config import (
+    LLM_BREAKER_RESET_S,
+    LLM_BREAKER_THRESHOLD,
+    LLM_HEDGE_ENABLED,
+    LLM_HEDGE_MIN_DELAY_S,
+    LLM_HEDGE_PERCENTILE,
+    LLM_RETRIES,
+    LLM_RETRY_BASE_DELAY_S,
+    LLM_RETRY_MAX_DELAY_S,
+)
+from core.logger import get_logger
+
+_logger = get_logger(__name__)
+
+_LATENCY_WINDOW = 200
+# Unterhalb dieser Stichprobengröße ist ein p95 nicht belastbar.
+_MIN_HEDGE_SAMPLES = 20
+
+
+class CircuitOpenError(RuntimeError):
+    """Der Circuit Breaker ist offen; Anfragen werden ohne Netzwerkaufruf abgelehnt."""
+
+
+class TransientError(RuntimeError):
+    """Vorübergehender Backend-Fehler, der wie ein Netzwerkfehler wiederholt wird."""
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Vorübergehende Fehler (Netzwerk, Timeout, 429, 5xx) lohnen eine Wiederholung."""
+    if isinstance(error, (asyncio.TimeoutError, httpx.TransportError, TransientError)):
+        return True
+    if isinstance(error, (openai.APIConnectionError, openai.RateLimitError, openai.InternalServerError)):
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code == 429 or error.status_code >= 500
+    return False
+
+
+class LatencyTracker:
+    """Gleitendes Fenster der letzten Latenzen mit Perzentil-Auswertung."""
+
+    def __init__(self, window: int = _LATENCY_WINDOW) -> None:
+        self._samples: Deque[float] = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def percentile(self, percent: float) -> Optional[float]:
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return None
+        rank = max(0, math.ceil(percent / 100 * len(samples)) - 1)
+        return samples[min(rank, len(samples) - 1)]
+
+    def snapshot(self) -> Dict[str, float]:
+        result: Dict[str, float] = {"count": float(len(self._samples))}
+        for percent in (50, 95, 99):
+            value = self.percentile(percent)
+            if value is not None:
+                result[f"p{percent}"] = value
+        return result
+
+
+class CircuitBreaker:
+    """Öffnet nach ``failure_threshold`` fehlgeschlagenen Anfragen in Folge für ``reset_after`` Sekunden.
+
+    Danach wird genau eine Probeanfrage durchgelassen (halb offen); gelingt
+    sie, schließt der Breaker wieder, sonst bleibt er eine weitere Periode offen.
+    """
+
+    def __init__(self, failure_threshold: int = LLM_BREAKER_THRESHOLD, reset_after: float = LLM_BREAKER_RESET_S) -> None:
+        self.failure_threshold = failure_threshold
+        self.reset_after = reset_after
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            if self._probing or time.monotonic() - self._opened_at >= self.reset_after:
+                return "half_open"
+            return "open"
+
+    def check(self) -> bool:
+        """Lässt eine Anfrage zu; ``True``, wenn sie die Probeanfrage ist."""
+        if self.failure_threshold <= 0:
+            return False
+        with self._lock:
+            if self._opened_at is None:
+                return False
+            remaining = self.reset_after - (time.monotonic() - self._opened_at)
+            if remaining <= 0 and not self._probing:
+                self._probing = True
+                return True
+        raise CircuitOpenError(f"LLM-Dienst nicht erreichbar, nächster Versuch in {max(remaining, 0):.0f} s")
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self._opened_at is not None:
+                _logger.info("Circuit Breaker geschlossen")
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._probing or (self._opened_at is None and 0 < self.failure_threshold <= self._failures):
+                self._opened_at = time.monotonic()
+                self._probing = False
+                _logger.warning("Circuit Breaker geöffnet nach %d Fehlern", self._failures)
+
+    def release_probe(self) -> None:
+        """Gibt die Probe frei, wenn sie weder Erfolg noch Fehler lieferte (z.B. Abbruch)."""
+        with self._lock:
+            self._probing = False
+
+
+class ResilientBackend:
+    """Umhüllt ein :class:`~core.async_llm.LLMBackend` mit Retries, Hedging und Breaker.
+
+    * Wiederholbare Fehler werden bis zu ``retries`` mal mit exponentiellem
+      Backoff und vollem Jitter wiederholt.
+    * Mit ``hedge`` startet :meth:`complete` eine zweite, identische Anfrage,
+      wenn die erste länger als das ``hedge_percentile``-Perzentil der
+      bisherigen Latenzen (mindestens ``hedge_min_delay``) braucht; die
+      schnellere Antwort gewinnt, die andere wird abgebrochen. :meth:`stream`
+      hedgt ebenso anhand der Zeit bis zum ersten Stück.
+    * Streams werden nur bis zum ersten Stück wiederholt.
+    * Der Breaker zählt je Anfrage höchstens einen Fehler, und zwar erst,
+      wenn alle Wiederholungen aufgebraucht sind.
+    """
+
+    def __init__(
+        self,
+        inner,
+        *,
+        retries: int = LLM_RETRIES,
+        base_delay: float = LLM_RETRY_BASE_DELAY_S,
+        max_delay: float = LLM_RETRY_MAX_DELAY_S,
+        hedge: bool = LLM_HEDGE_ENABLED,
+        hedge_min_delay: float = LLM_HEDGE_MIN_DELAY_S,
+        hedge_percentile: float = LLM_HEDGE_PERCENTILE,
+        breaker: Optional[CircuitBreaker] = None,
+    ) -> None:
+        self.inner = inner
+        self.retries = retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.hedge = hedge
+        self.hedge_min_delay = hedge_min_delay
+        self.hedge_percentile = hedge_percentile
+        self.breaker = breaker or CircuitBreaker()
+        self.latency = LatencyTracker()
+        self.first_token = LatencyTracker()
+        self.counters: Dict[str, int] = {"retries": 0, "hedges": 0, "hedge_wins": 0, "rejected": 0}
+        self._random = random.Random()
+
+    def _backoff(self, attempt: int) -> float:
+        return self._random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    def hedge_delay(self, tracker: Optional[LatencyTracker] = None) -> Optional[float]:
+        """Wartezeit bis zur Hedge-Anfrage nach ``tracker`` (Standard: Gesamtlatenz)."""
+        tracker = tracker or self.latency
+        if not self.hedge or len(tracker) < _MIN_HEDGE_SAMPLES:
+            return None
+        threshold = tracker.percentile(self.hedge_percentile) or 0.0
+        return max(self.hedge_min_delay, threshold)
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "latency": self.latency.snapshot(),
+            "first_token": self.first_token.snapshot(),
+            "breaker": self.breaker.state,
+            **self.counters,
+        }
+
+    def _admit(self) -> bool:
+        """Fragt den Breaker; ``True``, wenn die Anfrage die Probeanfrage ist."""
+        try:
+            return self.breaker.check()
+        except CircuitOpenError:
+            self.counters["rejected"] += 1
+            raise
+
+    async def _handle_failure(self, error: BaseException, attempt: int, probe: bool) -> bool:
+        """Wartet vor dem nächsten Versuch oder reicht den Fehler weiter.
+
+        Liefert, ob die Anfrage danach die Probeanfrage des Breakers hält.
+        """
+        if not is_retryable(error):
+            if probe:
+                self.breaker.release_probe()
+            raise error
+        if attempt >= self.retries:
+            self.breaker.record_failure()
+            raise error
+        delay = self._backoff(attempt)
+        self.counters["retries"] += 1
+        _logger.warning("LLM-Aufruf fehlgeschlagen (%s), Versuch %d in %.2f s", error, attempt + 2, delay)
+        await asyncio.sleep(delay)
+        # Hat eine andere Anfrage den Breaker inzwischen geöffnet, wird hier abgelehnt.
+        return probe or self._admit()
+
+    async def warm_up(self) -> None:
+        await self.inner.warm_up()
+
+    async def _hedged(
+        self, model: str, messages: List[dict], temperature: float, timeout: Optional[float]
+    ) -> str:
+        delay = self.hedge_delay()
+        primary = asyncio.ensure_future(self.inner.complete(model, messages, temperature, timeout))
+        if delay is None:
+            return await primary
+        tasks = [primary]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if not done:
+                self.counters["hedges"] += 1
+                _logger.info("Hedge-Anfrage nach %.2f s gestartet", delay)
+                tasks.append(asyncio.ensure_future(self.inner.complete(model, messages, temperature, timeout)))
+            error: Optional[BaseException] = None
+            while tasks:
+                done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    tasks.remove(task)
+                    if task.exception() is None:
+                        if task is not primary:
+                            self.counters["hedge_wins"] += 1
+                        return task.result()
+                    error = error or task.exception()
+            assert error is not None
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def complete(
+        self, model: str, messages: List[dict], temperature: float, timeout: Optional[float] = None
+    ) -> str:
+        probe = self._admit()
+        attempt = 0
+        while True:
+            started = time.perf_counter()
+            try:
+                answer = await self._hedged(model, messages, temperature, timeout)
+            except asyncio.CancelledError:
+                if probe:
+                    self.breaker.release_probe()
+                raise
+            except Exception as exc:
+                probe = await self._handle_failure(exc, attempt, probe)
+                attempt += 1
+                continue
+            self.latency.record(time.perf_counter() - started)
+            self.breaker.record_success()
+            return answer
+
+    async def _first_delta(
+        self, model: str, messages: List[dict], temperature: float
+    ) -> Tuple[AsyncIterator[str], Optional[str]]:
+        """Öffnet den Stream und wartet auf das erste Stück, bei Bedarf gehedgt.
+
+        Liefert den schnelleren Stream samt erstem Stück (``None``, wenn er
+        leer ist); der andere wird geschlossen.
+        """
+        delay = self.hedge_delay(self.first_token)
+        attempts: Dict[asyncio.Future, AsyncIterator[str]] = {}
+
+        def launch() -> asyncio.Future:
+            deltas = self.inner.stream(model, messages, temperature)
+            task = asyncio.ensure_future(deltas.__anext__())
+            attempts[task] = deltas
+            return task
+
+        primary = launch()
+        try:
+            if delay is not None:
+                done, _ = await asyncio.wait([primary], timeout=delay)
+                if not done:
+                    self.counters["hedges"] += 1
+                    _logger.info("Hedge-Stream nach %.2f s gestartet", delay)
+                    launch()
+            error: Optional[BaseException] = None
+            while attempts:
+                done, _ = await asyncio.wait(list(attempts), return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    deltas = attempts.pop(task)
+                    failure = task.exception()
+                    if failure is None or isinstance(failure, StopAsyncIteration):
+                        if task is not primary:
+                            self.counters["hedge_wins"] += 1
+                        return deltas, None if failure is not None else task.result()
+                    await deltas.aclose()
+                    error = error or failure
+            assert error is not None
+            raise error
+        finally:
+            for task in attempts:
+                task.cancel()
+            await asyncio.gather(*attempts, return_exceptions=True)
+            for deltas in attempts.values():
+                await deltas.aclose()
+
+    async def stream(self, model: str, messages: List[dict], temperature: float) -> AsyncIterator[str]:
+        probe = self._admit()
+        attempt = 0
+        while True:
+            started = time.perf_counter()
+            try:
+                deltas, first = await self._first_delta(model, messages, temperature)
+            except asyncio.CancelledError:
+                if probe:
+                    self.breaker.release_probe()
+                raise
+            except Exception as exc:
+                probe = await self._handle_failure(exc, attempt, probe)
+                attempt += 1
+                continue
+            self.breaker.record_success()
+            try:
+                if first is None:
+                    return
+                self.first_token.record(time.perf_counter() - started)
+                yield first
+                async for delta in deltas:
+                    yield delta
+            finally:
+                await deltas.aclose()
+            return
+
+    async def aclose(self) -> None:
+        await self.inner.aclose()
@@ -0,0 +1,263 @@
+"""Persistenter Antwort-Cache für LLM-Anfragen (SQLite, LRU + TTL)."""
+from __future__ import annotations
+
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, List, Optional
+
+from core.config import LLM_CACHE_MAX_ENTRIES, LLM_CACHE_PATH, LLM_CACHE_TTL_SECONDS
+from core.image_pipeline import hamming_distance
+from core.logger import get_logger
+
+_logger = get_logger(__name__)
+
+# Aufräumen (TTL, LRU, verwaiste Bild-Hashes) spätestens nach so vielen Puts
+_EVICT_INTERVAL = 64
+
+
+def _normalise_text(text: str) -> str:
+    return re.sub(r"\s+", " ", text.strip()).lower()
+
+
+def _normalise_content(content: Any) -> Any:
+    if isinstance(content, str):
+        return _normalise_text(content)
+    if isinstance(content, list):
+        parts = []
+        for part in content:
+            if part.get("type") == "text":
+                parts.append(_normalise_text(part.get("text", "")))
+            else:
+                # Bilddaten fließen über den separaten Bild-Hash in den Schlüssel ein.
+                parts.append("<" + str(part.get("type")) + ">")
+        return parts
+    return content
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    expired: int = 0
+    similar_hits: int = 0
+    entries: int = 0
+    saved_seconds: float = 0.0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+class ResponseCache:
+    """Speichert LLM-Antworten unter einem Hash aus Modell, Temperatur und Nachrichten.
+
+    Einträge verfallen nach ``ttl_seconds``; überschreitet der Cache
+    ``max_entries``, werden die am längsten nicht genutzten Einträge entfernt.
+    Aufgeräumt wird nicht bei jedem Put, sondern beim Überschreiten der
+    Obergrenze (dann mit etwas Puffer) und sonst alle ``_EVICT_INTERVAL`` Puts.
+    """
+
+    def __init__(
+        self,
+        path: Path | None = None,
+        max_entries: int = LLM_CACHE_MAX_ENTRIES,
+        ttl_seconds: float = LLM_CACHE_TTL_SECONDS,
+    ) -> None:
+        self._path = path or LLM_CACHE_PATH
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        self._max_entries = max_entries
+        self._ttl = ttl_seconds
+        self._lock = threading.Lock()
+        self._stats = CacheStats()
+        self._conn = sqlite3.connect(self._path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode = WAL")
+        self._conn.execute("PRAGMA synchronous = NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS llm_cache (
+                key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                response TEXT NOT NULL,
+                created REAL NOT NULL,
+                last_access REAL NOT NULL,
+                latency REAL NOT NULL DEFAULT 0
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_access ON llm_cache (last_access)")
+        # Bild-Hashes von Vision-Anfragen: gleiche Frage + gleiches Bild -> gleicher Eintrag.
+        # ``image_hash`` ist der SHA-1 der gesendeten Bytes, ``phash`` der dHash für
+        # die optionale Ähnlichkeitssuche.
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS llm_cache_image (
+                key TEXT PRIMARY KEY,
+                question_key TEXT NOT NULL,
+                image_hash TEXT NOT NULL,
+                phash TEXT
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_llm_cache_image_question ON llm_cache_image (question_key, image_hash)"
+        )
+        # Geschätzte Eintragszahl (obere Schranke): ersetzte Einträge werden mitgezählt und
+        # beim nächsten Aufräumen korrigiert.
+        self._entries = self._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+        self._puts_since_evict = 0
+
+    @staticmethod
+    def make_key(
+        model: str, temperature: float, messages: List[dict], image_hash: str | None = None
+    ) -> str:
+        payload = {
+            "model": model,
+            "temperature": round(temperature, 3),
+            "messages": [
+                [message.get("role"), _normalise_content(message.get("content"))] for message in messages
+            ],
+            "image": image_hash,
+        }
+        return hashlib.sha256(json.dumps(payload, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response, created, latency FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self._stats.misses += 1
+                return None
+            response, created, latency = row
+            if self._ttl > 0 and now - created > self._ttl:
+                self._conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                self._entries -= 1
+                self._stats.expired += 1
+                self._stats.misses += 1
+                return None
+            self._conn.execute("UPDATE llm_cache SET last_access = ? WHERE key = ?", (now, key))
+            self._stats.hits += 1
+            self._stats.saved_seconds += latency
+            return response
+
+    def _reuse(self, key: str) -> Optional[str]:
+        response = self.get(key)
+        if response is not None:
+            with self._lock:
+                self._stats.similar_hits += 1
+        return response
+
+    def find_same_image(self, question_key: str, image_hash: str) -> Optional[str]:
+        """Sucht einen Eintrag zur selben Frage mit byte-gleichem Bild (SHA-1)."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT key FROM llm_cache_image WHERE question_key = ? AND image_hash = ?",
+                (question_key, image_hash),
+            ).fetchone()
+        return self._reuse(row[0]) if row is not None else None
+
+    def find_similar(self, question_key: str, phash: int, max_distance: int) -> Optional[str]:
+        """Sucht einen Eintrag zur selben Frage, dessen dHash höchstens ``max_distance`` Bits abweicht.
+
+        Der dHash bildet ganze Bildschirme auf 64 Bit ab; textlastige Ansichten
+        kollidieren leicht. Daher nur auf ausdrücklichen Wunsch verwenden.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT key, phash FROM llm_cache_image WHERE question_key = ? AND phash IS NOT NULL",
+                (question_key,),
+            ).fetchall()
+        best = None
+        for key, stored in rows:
+            distance = hamming_distance(int(stored, 16), phash)
+            if distance <= max_distance and (best is None or distance < best[0]):
+                best = (distance, key)
+        return self._reuse(best[1]) if best is not None else None
+
+    def put(
+        self,
+        key: str,
+        model: str,
+        response: str,
+        latency: float = 0.0,
+        *,
+        question_key: str | None = None,
+        image_hash: str | None = None,
+        phash: int | None = None,
+    ) -> None:
+        if not response:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, model, response, created, last_access, latency) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model, response, now, now, latency),
+            )
+            if question_key is not None and image_hash is not None:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO llm_cache_image (key, question_key, image_hash, phash) VALUES (?, ?, ?, ?)",
+                    (key, question_key, image_hash, format(phash, "016x") if phash is not None else None),
+                )
+            self._entries += 1
+            self._puts_since_evict += 1
+            if self._entries > self._max_entries or self._puts_since_evict >= _EVICT_INTERVAL:
+                self._evict(now)
+
+    def _evict(self, now: float) -> None:
+        self._puts_since_evict = 0
+        removed = 0
+        if self._ttl > 0:
+            expired = self._conn.execute(
+                "DELETE FROM llm_cache WHERE created < ?", (now - self._ttl,)
+            ).rowcount
+            self._stats.expired += expired
+            removed += expired
+        count = self._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+        excess = count - self._max_entries
+        if excess > 0:
+            # Etwas Luft schaffen, damit nicht jeder folgende Put erneut aufräumt.
+            evicted = self._conn.execute(
+                "DELETE FROM llm_cache WHERE key IN "
+                "(SELECT key FROM llm_cache ORDER BY last_access ASC LIMIT ?)",
+                (excess + self._max_entries // 10,),
+            ).rowcount
+            self._stats.evictions += evicted
+            removed += evicted
+            count -= evicted
+        self._entries = count
+        if removed:
+            self._conn.execute("DELETE FROM llm_cache_image WHERE key NOT IN (SELECT key FROM llm_cache)")
+
+    def stats(self) -> CacheStats:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+            return CacheStats(
+                hits=self._stats.hits,
+                misses=self._stats.misses,
+                evictions=self._stats.evictions,
+                expired=self._stats.expired,
+                similar_hits=self._stats.similar_hits,
+                entries=entries,
+                saved_seconds=self._stats.saved_seconds,
+            )
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM llm_cache")
+            self._conn.execute("DELETE FROM llm_cache_image")
+            self._entries = 0
+        _logger.info("LLM-Cache geleert")
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -1,78 +1,275 @@
 """Zentrale Orchestrierung zwischen UI, Speicher und LLM."""
 from __future__ import annotations
 
-from typing import List
+from collections import deque
+from concurrent.futures import Future
+from typing import Callable, Deque, Iterable, List
 
 from PIL import Image
 
+from core.config import (
+    CAPTURE_TARGET,
+    CONTEXT_HISTORY_LIMIT,
+    STYLE_EXAMPLE_COUNT,
+    STYLE_EXAMPLE_MAX_CHARS,
+    VISION_FRAME_MAX_AGE_S,
+)
+from core.image_pipeline import EncodedImage
 from core.logger import get_logger, log_line
-from core.llm_client import LLMClient
-from core.tts import speak
+from core.llm_client import LLMClient, RequestCancelledError
+from core.request_scheduler import Priority, RequestScheduler
+from core.screen_capture import Region, capture_screen
+from core.screenshot_store import get_screenshot_store
+from core.screenshot_writer import get_screenshot_writer
+from core.tts import SentenceSpeaker, speak
+from memory.compaction import ConversationCompactor
 from memory.knowledge_builder import KnowledgeBuilder
-from memory.memory_db import MemoryDB
-from memory.style_profile import apply_style, build_style_profile
+from memory.memory_db import Interaction, MemoryDB
+from memory.style_profile import apply_style, get_style_profile
 
 _logger = get_logger(__name__)
 
+DeltaCallback = Callable[[str], None]
+
 
 class AssistantRouter:
     def __init__(self) -> None:
         self.memory = MemoryDB()
         self.knowledge = KnowledgeBuilder(self.memory)
-        self.style_profile = build_style_profile()
+        self.style_profile = get_style_profile()
         self.llm = LLMClient()
-        self._context_cache = self._load_context()
-        self.knowledge.refresh_facts()
+        # Schlüssel der Aufträge sind die LLM-Kanäle: eine neue Frage bricht die laufende ab.
+        self.scheduler = RequestScheduler(on_supersede=self.llm.cancel)
+        self._context_cache: Deque[str] = deque(maxlen=CONTEXT_HISTORY_LIMIT)
+        self._load_context()
+        self.compactor = ConversationCompactor(self.memory, self.knowledge)
+        self._schedule_maintenance()
+
+    @staticmethod
+    def _format_interaction(interaction: Interaction) -> str:
+        return f"{interaction.role.upper()} ({interaction.timestamp}): {interaction.content}"
+
+    def _load_context(self) -> None:
+        recent = self.memory.get_recent_interactions(limit=CONTEXT_HISTORY_LIMIT)
+        self._context_cache.clear()
+        self._context_cache.extend(self._format_interaction(interaction) for interaction in reversed(recent))
+        _logger.info("Kontext geladen (%d Einträge)", len(self._context_cache))
 
-    def _load_context(self) -> List[str]:
-        recent = self.memory.get_recent_interactions(limit=30)
-        context = [
-            f"{interaction.role.upper()} ({interaction.timestamp}): {interaction.content}" for interaction in reversed(recent)
-        ]
-        _logger.info("Kontext geladen (%d Einträge)", len(context))
-        return context
+    def resync_context(self) -> None:
+        """Lädt den Gesprächskontext explizit neu aus der Datenbank."""
+        self.memory.flush()
+        self._load_context()
 
-    def _update_context(self) -> None:
-        self._context_cache = self._load_context()
+    def _context_snapshot(self) -> List[str]:
+        return list(self._context_cache)
 
     def _record_interaction(self, role: str, content: str, meta: str | None = None) -> None:
-        self.memory.add_interaction(role, content, meta)
-        self._update_context()
+        interaction = self.memory.add_interaction(role, content, meta)
+        self._context_cache.append(self._format_interaction(interaction))
+
+    def _maintain(self) -> None:
+        self.knowledge.refresh_facts()
+        self.compactor.compact()
+
+    def _schedule_maintenance(self) -> None:
+        """Faktenextraktion und Verdichtung laufen mit niedrigster Priorität im Hintergrund."""
+        try:
+            self.scheduler.submit(self._maintain, priority=Priority.MAINTENANCE, key="maintenance")
+        except RuntimeError:
+            # Nach cleanup() können noch Antworten eintreffen, z.B. aus Batch-Threads nach Strg+C.
+            _logger.info("Router wird beendet, keine Wartung mehr eingeplant")
 
     def _gather_facts(self, query: str) -> List[str]:
         self.knowledge.refresh_facts()
         return self.knowledge.get_relevant_facts(query)
 
-    def handle_text(self, question: str) -> str:
-        log_line(f"USER Frage (Text): {question}")
-        self._record_interaction("user", question)
-        facts = self._gather_facts(question)
-        answer = self.llm.ask_text(
-            question,
-            context_messages=self._context_cache,
-            facts=facts,
+    def _style_guidance(self, question: str) -> List[str]:
+        self.style_profile = get_style_profile()
+        return self.style_profile.select_examples(
+            question, k=STYLE_EXAMPLE_COUNT, max_chars=STYLE_EXAMPLE_MAX_CHARS
         )
+
+    def _consume_stream(self, deltas: Iterable[str], on_delta: DeltaCallback, speak_answer: bool = True) -> str:
+        speaker = SentenceSpeaker() if speak_answer else None
+        parts: List[str] = []
+        for delta in deltas:
+            parts.append(delta)
+            on_delta(delta)
+            if speaker is not None:
+                speaker.feed(delta)
+        if speaker is not None:
+            speaker.finish()
+        return "".join(parts)
+
+    def _check_superseded(self) -> None:
+        """Bricht ab, wenn der laufende Auftrag inzwischen durch einen neueren ersetzt wurde.
+
+        ``LLMClient.cancel`` erreicht nur Anfragen, die schon beim LLM sind;
+        Kontextaufbau und Aufnahme davor sowie die fertige Antwort danach
+        prüfen das Flag des Schedulers.
+        """
+        if self.scheduler.cancelled():
+            raise RequestCancelledError("Anfrage durch eine neuere ersetzt")
+
+    def _finish_answer(self, question: str, answer: str, meta: str | None, spoken: bool, record: bool) -> str:
         styled = apply_style(answer, self.style_profile)
-        self._record_interaction("assistant", styled)
         log_line(f"ASSISTANT Antwort: {styled}")
-        speak(styled)
+        if not spoken:
+            speak(styled)
+        if record:
+            # Frage und Antwort erst gemeinsam speichern: abgebrochene oder ersetzte
+            # Anfragen hinterlassen so keine unbeantworteten Beiträge.
+            self._record_interaction("user", question, meta=meta)
+            self._record_interaction("assistant", styled, meta=meta)
+            self._schedule_maintenance()
         return styled
 
-    def handle_vision(self, question: str, image: Image.Image) -> str:
+    def handle_text(
+        self,
+        question: str,
+        on_delta: DeltaCallback | None = None,
+        fresh: bool = False,
+        channel: str | None = "chat",
+        speak_answer: bool = True,
+        record: bool = True,
+    ) -> str:
+        """Beantwortet eine Textfrage.
+
+        Mit ``on_delta`` wird die Antwort gestreamt: der Callback erhält jedes
+        Teilstück (aus dem Worker-Thread), die Sprachausgabe startet mit dem
+        ersten vollständigen Satz. ``fresh=True`` umgeht den Antwort-Cache.
+        Eine neue Frage auf demselben ``channel`` bricht eine noch laufende ab;
+        die abgebrochene löst ``RequestCancelledError`` aus (``channel=None``:
+        kein Abbruch, z.B. für parallele Batch-Anfragen). ``speak_answer=False``
+        unterdrückt die Sprachausgabe. ``record=False`` beantwortet die Frage
+        ohne Gesprächsverlauf und speichert weder Frage noch Antwort (Batch).
+        Rückgabe ist immer die gestylte Antwort.
+        """
+        log_line(f"USER Frage (Text): {question}")
+        request = dict(
+            context_messages=self._context_snapshot() if record else [],
+            facts=self._gather_facts(question),
+            style_examples=self._style_guidance(question),
+            bypass_cache=fresh,
+            channel=channel,
+        )
+        self._check_superseded()
+        if on_delta is None:
+            answer = self.llm.ask_text(question, **request)
+        else:
+            answer = self._consume_stream(self.llm.stream_text(question, **request), on_delta, speak_answer)
+        self._check_superseded()
+        return self._finish_answer(
+            question, answer, meta=None, spoken=on_delta is not None or not speak_answer, record=record
+        )
+
+    def handle_vision(
+        self,
+        question: str,
+        image: Image.Image | EncodedImage | None = None,
+        on_delta: DeltaCallback | None = None,
+        fresh: bool = False,
+        channel: str | None = "chat",
+        speak_answer: bool = True,
+        record: bool = True,
+        target: str = CAPTURE_TARGET,
+        region: Region | None = None,
+        max_age_s: float = VISION_FRAME_MAX_AGE_S,
+    ) -> str:
+        """Beantwortet eine Frage zu einem Screenshot; Parameter wie bei :meth:`handle_text`.
+
+        Ohne ``image`` nimmt der Router selbst genau das Ziel ``target`` auf
+        (siehe :func:`core.screen_capture.capture_screen`, bei ``"region"`` mit
+        ``region``). Ist ein Bild der Auto-Aufnahme höchstens ``max_age_s``
+        Sekunden alt, wird es ohne neue Aufnahme verwendet; ``fresh=True``
+        erzwingt eine Live-Aufnahme. Ein übergebenes Bild ist bevorzugt das
+        bereits kodierte ``ScreenshotInfo.encoded``, damit es nicht ein
+        zweites Mal kodiert wird.
+        """
+        if image is None:
+            image = capture_screen(target, region, 0.0 if fresh else max_age_s).encoded
         log_line(f"USER Frage (Vision): {question}")
-        self._record_interaction("user", question, meta="vision")
-        facts = self._gather_facts(question)
-        answer = self.llm.ask_vision(
-            question,
-            image,
-            context_messages=self._context_cache,
-            facts=facts,
+        request = dict(
+            context_messages=self._context_snapshot() if record else [],
+            facts=self._gather_facts(question),
+            style_examples=self._style_guidance(question),
+            bypass_cache=fresh,
+            channel=channel,
+        )
+        self._check_superseded()
+        if on_delta is None:
+            answer = self.llm.ask_vision(question, image, **request)
+        else:
+            answer = self._consume_stream(
+                self.llm.stream_vision(question, image, **request), on_delta, speak_answer
+            )
+        self._check_superseded()
+        return self._finish_answer(
+            question, answer, meta="vision", spoken=on_delta is not None or not speak_answer, record=record
+        )
+
+    def submit_text(self, question: str, *, channel: str = "chat", **kwargs) -> Future:
+        """:meth:`handle_text` als interaktiver Auftrag; ersetzt einen laufenden auf demselben Kanal."""
+        return self.scheduler.submit(
+            self.handle_text, question, priority=Priority.INTERACTIVE, key=channel, channel=channel, **kwargs
+        )
+
+    def submit_vision(self, question: str, *, channel: str = "chat", **kwargs) -> Future:
+        """:meth:`handle_vision` als Vision-Auftrag; ersetzt einen laufenden auf demselben Kanal."""
+        return self.scheduler.submit(
+            self.handle_vision, question, priority=Priority.VISION, key=channel, channel=channel, **kwargs
         )
-        styled = apply_style(answer, self.style_profile)
-        self._record_interaction("assistant", styled, meta="vision")
-        log_line(f"ASSISTANT Antwort: {styled}")
-        speak(styled)
-        return styled
 
     def cleanup(self) -> None:
+        self.scheduler.shutdown()
+        for name, stats in self.scheduler.stats().items():
+            if stats.completed or stats.failed or stats.cancelled or stats.superseded:
+                _logger.info(
+                    "Aufträge %s: %d fertig, %d fehlgeschlagen, %d abgebrochen, %d ersetzt; Wartezeit Ø %.0f ms, max %.0f ms",
+                    name,
+                    stats.completed,
+                    stats.failed,
+                    stats.cancelled,
+                    stats.superseded,
+                    stats.avg_wait_ms,
+                    stats.max_wait_ms,
+                )
+        if self.llm.cache is not None:
+            stats = self.llm.cache.stats()
+            _logger.info(
+                "LLM-Cache: %d Treffer (davon %d über gleiche Screenshots), %d Fehlschläge, %d verdrängt, %.1f s gespart",
+                stats.hits,
+                stats.similar_hits,
+                stats.misses,
+                stats.evictions,
+                stats.saved_seconds,
+            )
+        resilience = self.llm.resilience_stats()
+        if resilience:
+            latency = resilience["latency"]
+            _logger.info(
+                "LLM-Latenz p50 %.2f s, p95 %.2f s (%d Messungen); %d Retries, %d Hedges (%d gewonnen), %d abgewiesen",
+                latency.get("p50", 0.0),
+                latency.get("p95", 0.0),
+                latency.get("count", 0),
+                resilience["retries"],
+                resilience["hedges"],
+                resilience["hedge_wins"],
+                resilience["rejected"],
+            )
+        self.llm.close()
+        # Noch ausstehende Screenshots fertig schreiben.
+        get_screenshot_writer().close()
+        store = get_screenshot_store()
+        stats = store.stats()
+        _logger.info(
+            "Screenshot-Ablage: %d Aufnahmen in %d Dateien (%.1f MB), %d dedupliziert, %d verdrängt",
+            stats.frames,
+            stats.blobs,
+            stats.bytes / (1024 * 1024),
+            stats.deduplicated,
+            stats.evicted,
+        )
+        store.close()
+        self.knowledge.close()
         self.memory.close()
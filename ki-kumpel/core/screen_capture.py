@@ -1,43 +1,303 @@
 """Hilfsfunktionen zum Erfassen von Screenshots."""
 from __future__ import annotations
 
-from datetime import datetime
+import ctypes
+import math
+import os
+import sys
+import threading
+import time
+from dataclasses import dataclass, field
+from ctypes import wintypes
 from pathlib import Path
-from typing import Iterable, List, Tuple
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
 
 import mss
 from PIL import Image
 
-from core.config import SCREENSHOT_DIR
-from core.logger import log_line
+from core.config import (
+    CAPTURE_TARGET,
+    SCREENSHOT_DEDUP_DISTANCE,
+    SCREENSHOT_MAX_EDGE,
+)
+from core.image_pipeline import EncodedImage, dhash, hamming_distance, prepare_image
+from core.logger import get_logger, log_line
+from core.screenshot_store import get_screenshot_store
+from core.screenshot_writer import get_screenshot_writer
 
-ScreenshotInfo = Tuple[Path, Image.Image]
+_logger = get_logger(__name__)
 
+# Aufnahmeziele für capture_screen / handle_vision
+CAPTURE_TARGETS = ("cursor", "window", "region", "mosaic")
 
-def capture_all_screens() -> List[ScreenshotInfo]:
-    """Erzeugt Screenshots aller Monitore und speichert sie temporär."""
+# (links, oben, Breite, Höhe) in virtuellen Bildschirmkoordinaten
+Region = Tuple[int, int, int, int]
+
+# mss-Instanzen je Thread: mss ab 10.1 legt Gerätekontexte und Handles in
+# ``threading.local`` ab, eine fremde Instanz scheitert mit ``AttributeError``.
+_sct_local = threading.local()
+
+# Perceptual-Hash des zuletzt gespeicherten Bildes je Monitor
+_last_stored_hash: Dict[int, int] = {}
+
+# Jüngstes Vollbild je Monitor im Speicher; sein Alter ergibt sich aus ``captured_at``
+_latest_frames: Dict[int, "ScreenshotInfo"] = {}
+_latest_lock = threading.Lock()
+
+
+@dataclass
+class ScreenshotInfo:
+    """Ein Monitorbild: Originalbild, Perceptual-Hash und Ablageort.
+
+    ``stored`` ist ``False``, wenn das Bild nicht gespeichert wird (Duplikat
+    oder bei voller Schreib-Warteschlange verworfen). ``path`` setzt der
+    Hintergrund-Schreiber, sobald die Datei in der
+    :class:`~core.screenshot_store.ScreenshotStore` liegt. ``encoded`` wird
+    beim ersten Zugriff genau einmal kodiert, egal ob zuerst der Schreiber
+    oder eine Vision-Anfrage danach fragt.
+    """
+
+    image: Image.Image
+    monitor: int
+    phash: int
+    label: str = ""
+    captured_at: float = field(default_factory=time.time)
+    stored: bool = False
+    path: Optional[Path] = None
+    _encoded: Optional[EncodedImage] = field(default=None, repr=False)
+    _encode_lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    @property
+    def encoded(self) -> EncodedImage:
+        with self._encode_lock:
+            if self._encoded is None:
+                self._encoded = prepare_image(self.image, phash=self.phash)
+            return self._encoded
+
+
+def _grabber() -> mss.base.MSSBase:
+    """mss-Instanz des aufrufenden Threads, beim ersten Aufruf angelegt.
+
+    Aufgenommen wird auf langlebigen Threads (Scheduler-Worker, Tk-Thread für
+    die Bereichsauswahl), die Zahl der Instanzen bleibt damit klein.
+    """
+    sct = getattr(_sct_local, "sct", None)
+    if sct is None:
+        sct = _sct_local.sct = mss.mss()
+    return sct
+
+
+def _grab(sct: mss.base.MSSBase, box: dict) -> Image.Image:
+    raw = sct.grab(box)
+    return Image.frombytes("RGB", raw.size, raw.bgra, "raw", "BGRX")
+
+
+def _monitor_at(sct: mss.base.MSSBase, x: int, y: int) -> int:
+    for idx, monitor in enumerate(sct.monitors[1:], start=1):
+        inside_x = monitor["left"] <= x < monitor["left"] + monitor["width"]
+        inside_y = monitor["top"] <= y < monitor["top"] + monitor["height"]
+        if inside_x and inside_y:
+            return idx
+    return 1
+
+
+def _cursor_position() -> Optional[Tuple[int, int]]:
+    if sys.platform != "win32":
+        return None
+    point = wintypes.POINT()
+    if ctypes.windll.user32.GetCursorPos(ctypes.byref(point)):
+        return point.x, point.y
+    return None
+
+
+def _active_window_region() -> Optional[Region]:
+    """Rahmen des vordersten fremden Fensters.
+
+    Fenster des eigenen Prozesses (Chatfenster, Tray-Dialog) werden
+    übersprungen, damit nicht der KI-Kumpel selbst aufgenommen wird.
+    """
+    if sys.platform != "win32":
+        return None
+    user32 = ctypes.windll.user32
+    own_pid = os.getpid()
+    hwnd = user32.GetForegroundWindow()
+    pid = wintypes.DWORD()
+    rect = wintypes.RECT()
+    while hwnd:
+        user32.GetWindowThreadProcessId(hwnd, ctypes.byref(pid))
+        if pid.value != own_pid and user32.IsWindowVisible(hwnd) and not user32.IsIconic(hwnd):
+            if user32.GetWindowRect(hwnd, ctypes.byref(rect)):
+                width, height = rect.right - rect.left, rect.bottom - rect.top
+                if width > 0 and height > 0:
+                    return rect.left, rect.top, width, height
+        hwnd = user32.GetWindow(hwnd, 2)  # GW_HWNDNEXT: nächstes Fenster in Z-Reihenfolge
+    return None
+
+
+def _clip_to_desktop(sct: mss.base.MSSBase, region: Region) -> dict:
+    desktop = sct.monitors[0]
+    left = max(region[0], desktop["left"])
+    top = max(region[1], desktop["top"])
+    right = min(region[0] + region[2], desktop["left"] + desktop["width"])
+    bottom = min(region[1] + region[3], desktop["top"] + desktop["height"])
+    if right <= left or bottom <= top:
+        raise ValueError(f"Bereich {region} liegt außerhalb des Bildschirms")
+    return {"left": left, "top": top, "width": right - left, "height": bottom - top}
+
+
+def _mosaic(sct: mss.base.MSSBase) -> Image.Image:
+    """Alle Monitore in ihrer echten Anordnung als ein verkleinertes Bild."""
+    image = _grab(sct, sct.monitors[0])
+    if SCREENSHOT_MAX_EDGE > 0 and max(image.size) > SCREENSHOT_MAX_EDGE:
+        image = image.reduce(math.ceil(max(image.size) / SCREENSHOT_MAX_EDGE))
+    return image
+
+
+def virtual_desktop() -> Region:
+    """Umfassendes Rechteck aller Monitore als ``(links, oben, Breite, Höhe)``."""
+    desktop = _grabber().monitors[0]
+    return desktop["left"], desktop["top"], desktop["width"], desktop["height"]
+
+
+def _is_duplicate(monitor: int, phash: int) -> bool:
+    if SCREENSHOT_DEDUP_DISTANCE < 0:
+        return False
+    previous = _last_stored_hash.get(monitor)
+    return previous is not None and hamming_distance(previous, phash) <= SCREENSHOT_DEDUP_DISTANCE
+
+
+def _register(
+    image: Image.Image, monitor: int, label: str, *, skip_duplicates: bool = False, auto: bool = False
+) -> ScreenshotInfo:
+    phash = dhash(image)
+    shot = ScreenshotInfo(image, monitor, phash, label)
+    if skip_duplicates and _is_duplicate(monitor, phash):
+        return shot
+    shot.stored = True
+    if get_screenshot_writer().submit(shot, auto=auto) and skip_duplicates:
+        _last_stored_hash[monitor] = phash
+    return shot
+
+
+def _remember(shot: ScreenshotInfo) -> None:
+    with _latest_lock:
+        _latest_frames[shot.monitor] = shot
+
+
+def latest_frame(monitor: int, max_age_s: float) -> Optional[ScreenshotInfo]:
+    """Jüngstes Vollbild von ``monitor`` aus dem Speicher, wenn es vor höchstens ``max_age_s`` aufgenommen wurde.
+
+    Maßgeblich ist der Aufnahmezeitpunkt: meldet die Änderungserkennung den
+    Monitor später als unverändert, macht das das Bild nicht wieder frisch,
+    denn kleine Änderungen (etwa getippter Text) kann sie übersehen.
+    """
+    if max_age_s <= 0:
+        return None
+    with _latest_lock:
+        frame = _latest_frames.get(monitor)
+    if frame is None or time.time() - frame.captured_at > max_age_s:
+        return None
+    return frame
+
+
+def _fresh_crop(sct: mss.base.MSSBase, monitor: int, box: dict, max_age_s: float) -> Optional[Image.Image]:
+    """Schneidet ``box`` aus einem frischen Vollbild aus, sofern sie ganz auf dem Monitor liegt."""
+    frame = latest_frame(monitor, max_age_s)
+    if frame is None:
+        return None
+    bounds = sct.monitors[monitor]
+    left, top = box["left"] - bounds["left"], box["top"] - bounds["top"]
+    right, bottom = left + box["width"], top + box["height"]
+    if left < 0 or top < 0 or right > frame.image.width or bottom > frame.image.height:
+        return None
+    return frame.image.crop((left, top, right, bottom))
+
+
+def capture_all_screens(
+    skip_duplicates: bool = False,
+    auto: bool = False,
+    changed: Optional[Callable[[int, "mss.screenshot.ScreenShot"], bool]] = None,
+) -> List[ScreenshotInfo]:
+    """Erzeugt Screenshots aller Monitore und gibt sie sofort zurück.
+
+    Kodieren und Speichern übernimmt der :class:`ScreenshotWriter` im
+    Hintergrund; die gespeicherte Datei enthält dieselben Bytes, die später
+    an die API gehen. Mit ``skip_duplicates`` werden Bilder, deren
+    Perceptual-Hash höchstens ``SCREENSHOT_DEDUP_DISTANCE`` Bits vom zuletzt
+    gespeicherten Bild desselben Monitors abweicht, nicht erneut gespeichert
+    (Standard: aus).
+    ``auto=True`` markiert Bilder der automatischen Aufnahme; nur diese darf
+    der Schreiber bei Rückstau verwerfen. ``changed(monitor, rohbild)`` prüft
+    vor jeder weiteren Verarbeitung, ob sich ein Monitor geändert hat;
+    unveränderte Monitore fehlen dann in der Rückgabe.
+    """
+    sct = _grabber()
     results: List[ScreenshotInfo] = []
-    with mss.mss() as sct:
-        for idx, monitor in enumerate(sct.monitors[1:], start=1):
-            raw = sct.grab(monitor)
-            img = Image.frombytes("RGB", raw.size, raw.bgra, "raw", "BGRX")
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            filename = f"screenshot_{timestamp}_m{idx}.png"
-            path = SCREENSHOT_DIR / filename
-            img.save(path, "PNG")
-            results.append((path, img))
-    log_line(f"Auto-Screenshots erstellt: {len(results)}")
+    monitors = sct.monitors[1:]
+    for idx, monitor in enumerate(monitors, start=1):
+        raw = sct.grab(monitor)
+        if changed is not None and not changed(idx, raw):
+            continue
+        image = Image.frombytes("RGB", raw.size, raw.bgra, "raw", "BGRX")
+        shot = _register(image, idx, f"m{idx}", skip_duplicates=skip_duplicates, auto=auto)
+        _remember(shot)
+        results.append(shot)
+    stored = sum(1 for shot in results if shot.stored)
+    log_line(f"Auto-Screenshots erstellt: {stored} (unverändert übersprungen: {len(monitors) - stored})")
     return results
 
 
+def capture_screen(
+    target: str = CAPTURE_TARGET, region: Optional[Region] = None, max_age_s: float = 0.0
+) -> ScreenshotInfo:
+    """Nimmt genau die Pixel auf, die eine Vision-Frage braucht.
+
+    ``target`` ist ``"cursor"`` (Monitor unter dem Mauszeiger), ``"window"``
+    (aktives fremdes Fenster), ``"region"`` (``region`` in virtuellen
+    Bildschirmkoordinaten) oder ``"mosaic"`` (alle Monitore verkleinert in
+    einem Bild). Wo Mauszeiger oder Fenster nicht ermittelt werden können,
+    wird auf den Hauptmonitor zurückgefallen. Mit ``max_age_s > 0`` wird ein
+    höchstens so altes Vollbild aus dem Speicher verwendet (beim Fenster
+    ausgeschnitten) und gar nicht erst aufgenommen. Ein Bereich wird immer live
+    aufgenommen: das gemerkte Bild könnte noch das Auswahl-Overlay zeigen.
+    """
+    if target not in CAPTURE_TARGETS:
+        raise ValueError(f"Unbekanntes Aufnahmeziel: {target}")
+    sct = _grabber()
+    if target == "window":
+        region = _active_window_region()
+        if region is None:
+            _logger.info("Kein aktives Fenster ermittelt, nehme Monitor unter dem Mauszeiger")
+            target = "cursor"
+    reused = False
+    if target == "mosaic":
+        shot = _register(_mosaic(sct), 0, "mosaic")
+    elif target in ("window", "region"):
+        if region is None:
+            raise ValueError("Für das Ziel 'region' muss ein Bereich angegeben werden")
+        box = _clip_to_desktop(sct, region)
+        monitor = _monitor_at(sct, box["left"] + box["width"] // 2, box["top"] + box["height"] // 2)
+        image = _fresh_crop(sct, monitor, box, max_age_s) if target == "window" else None
+        reused = image is not None
+        shot = _register(image if reused else _grab(sct, box), monitor, f"{target}_m{monitor}")
+    else:
+        position = _cursor_position()
+        monitor = _monitor_at(sct, *position) if position is not None else 1
+        cached = latest_frame(monitor, max_age_s)
+        reused = cached is not None
+        if cached is not None:
+            shot = cached
+        else:
+            shot = _register(_grab(sct, sct.monitors[monitor]), monitor, f"m{monitor}")
+            _remember(shot)
+    source = "aus dem Speicher" if reused else "erstellt"
+    log_line(f"Screenshot ({target}) {source}: {shot.image.width}x{shot.image.height}, Monitor {shot.monitor}")
+    return shot
+
+
 def cleanup_screenshots() -> int:
-    """Löscht alle gespeicherten Screenshots und gibt die Anzahl zurück."""
-    count = 0
-    for file_path in SCREENSHOT_DIR.glob("*.png"):
-        try:
-            file_path.unlink()
-            count += 1
-        except OSError:
-            continue
+    """Löscht alle gespeicherten Screenshots samt Index und gibt die Anzahl zurück."""
+    get_screenshot_writer().flush(timeout=5)
+    count = get_screenshot_store().clear()
     log_line(f"Screenshots gelöscht: {count}")
     return count
@@ -0,0 +1,319 @@
+"""Inhaltsadressierte Screenshot-Ablage mit SQLite-Index, Speicherquote und Höchstalter."""
+from __future__ import annotations
+
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List, Optional
+
+from core.config import (
+    SCREENSHOT_DIR,
+    SCREENSHOT_EVICT_INTERVAL_S,
+    SCREENSHOT_INDEX_PATH,
+    SCREENSHOT_MAX_AGE_DAYS,
+    SCREENSHOT_QUOTA_MB,
+)
+from core.image_pipeline import EncodedImage
+from core.logger import get_logger
+
+_logger = get_logger(__name__)
+
+# Dateien aus der Zeit vor dem Index (screenshot_<zeit>_<monitor>.<ext>)
+_LEGACY_PATTERNS = ("*.png", "*.jpg", "*.webp")
+
+
+@dataclass(frozen=True)
+class StoredFrame:
+    id: int
+    hash: str
+    path: Path
+    captured: float
+    monitor: int
+    width: int
+    height: int
+    size: int
+    label: str
+
+
+@dataclass
+class StoreStats:
+    frames: int = 0
+    blobs: int = 0
+    bytes: int = 0
+    deduplicated: int = 0
+    evicted: int = 0
+
+
+class ScreenshotStore:
+    """Legt Screenshots unter ihrem SHA-1 ab; gleiche Bilder teilen sich eine Datei.
+
+    Jede Aufnahme ist eine Zeile in ``screenshot_frames`` (Zeit, Monitor,
+    Abmessungen, Hash), jede Datei eine Zeile in ``screenshot_blobs`` (Größe,
+    letzter Zugriff). Ein Hintergrund-Thread entfernt Aufnahmen älter als
+    ``max_age_days`` sowie danach die am längsten ungenutzten Dateien, bis
+    ``quota_mb`` wieder eingehalten ist.
+    """
+
+    def __init__(
+        self,
+        path: Path | None = None,
+        root: Path | None = None,
+        quota_mb: float = SCREENSHOT_QUOTA_MB,
+        max_age_days: float = SCREENSHOT_MAX_AGE_DAYS,
+        evict_interval: float = SCREENSHOT_EVICT_INTERVAL_S,
+    ) -> None:
+        self._path = path or SCREENSHOT_INDEX_PATH
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        self.root = root or SCREENSHOT_DIR
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.quota_bytes = int(quota_mb * 1024 * 1024)
+        self.max_age_s = max_age_days * 24 * 3600
+        self._evict_interval = max(1.0, evict_interval)
+        self._lock = threading.Lock()
+        self._stats = StoreStats()
+        self._conn = sqlite3.connect(self._path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode = WAL")
+        self._conn.execute("PRAGMA synchronous = NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS screenshot_blobs (
+                hash TEXT PRIMARY KEY,
+                ext TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_screenshot_blobs_access ON screenshot_blobs (last_access)"
+        )
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS screenshot_frames (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                hash TEXT NOT NULL,
+                captured REAL NOT NULL,
+                monitor INTEGER NOT NULL,
+                width INTEGER NOT NULL,
+                height INTEGER NOT NULL,
+                label TEXT NOT NULL DEFAULT ''
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_screenshot_frames_monitor ON screenshot_frames (monitor, captured)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_screenshot_frames_captured ON screenshot_frames (captured)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_screenshot_frames_hash ON screenshot_frames (hash)")
+        self._wake = threading.Event()
+        self._closed = threading.Event()
+        self._thread = threading.Thread(target=self._evict_loop, name="ScreenshotStoreEvict", daemon=True)
+        self._thread.start()
+
+    def path_for(self, digest: str, ext: str) -> Path:
+        # Zwei Zeichen Unterordner halten die Verzeichnisse klein.
+        return self.root / digest[:2] / f"{digest}.{ext}"
+
+    def _row_to_frame(self, row: tuple) -> StoredFrame:
+        frame_id, digest, captured, monitor, width, height, label, ext, size = row
+        return StoredFrame(frame_id, digest, self.path_for(digest, ext), captured, monitor, width, height, size, label)
+
+    def put(
+        self, encoded: EncodedImage, *, monitor: int, label: str = "", captured: float | None = None
+    ) -> StoredFrame:
+        """Speichert ``encoded``; existiert der Inhalt schon, wird nur ein Index-Eintrag angelegt."""
+        digest = encoded.sha1
+        now = time.time()
+        captured = now if captured is None else captured
+        with self._lock:
+            exists = self._conn.execute(
+                "UPDATE screenshot_blobs SET last_access = ? WHERE hash = ?", (now, digest)
+            ).rowcount
+            if exists:
+                self._stats.deduplicated += 1
+                return self._insert_frame(digest, encoded, monitor, label, captured)
+        path = self.path_for(digest, encoded.extension)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Erst vollständig schreiben, dann umbenennen: ein Leser sieht nie eine halbe Datei.
+        temp = path.with_name(f".{digest}.{threading.get_ident()}.tmp")
+        temp.write_bytes(encoded.data)
+        os.replace(temp, path)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO screenshot_blobs (hash, ext, size, created, last_access) VALUES (?, ?, ?, ?, ?)",
+                (digest, encoded.extension, len(encoded.data), now, now),
+            )
+            frame = self._insert_frame(digest, encoded, monitor, label, captured)
+            over_quota = self.quota_bytes > 0 and self._total_bytes() > self.quota_bytes
+        if over_quota:
+            self._wake.set()
+        return frame
+
+    def _insert_frame(
+        self, digest: str, encoded: EncodedImage, monitor: int, label: str, captured: float
+    ) -> StoredFrame:
+        width, height = encoded.size
+        frame_id = self._conn.execute(
+            "INSERT INTO screenshot_frames (hash, captured, monitor, width, height, label) VALUES (?, ?, ?, ?, ?, ?)",
+            (digest, captured, monitor, width, height, label),
+        ).lastrowid
+        return StoredFrame(
+            frame_id,
+            digest,
+            self.path_for(digest, encoded.extension),
+            captured,
+            monitor,
+            width,
+            height,
+            len(encoded.data),
+            label,
+        )
+
+    def _total_bytes(self) -> int:
+        return self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM screenshot_blobs").fetchone()[0]
+
+    _FRAME_COLUMNS = (
+        "f.id, f.hash, f.captured, f.monitor, f.width, f.height, f.label, b.ext, b.size "
+        "FROM screenshot_frames f JOIN screenshot_blobs b ON b.hash = f.hash"
+    )
+
+    def latest(self, monitor: int | None = None) -> Optional[StoredFrame]:
+        """Jüngste Aufnahme (optional eines Monitors) direkt aus dem Index."""
+        with self._lock:
+            if monitor is None:
+                row = self._conn.execute(
+                    f"SELECT {self._FRAME_COLUMNS} ORDER BY f.captured DESC LIMIT 1"
+                ).fetchone()
+            else:
+                row = self._conn.execute(
+                    f"SELECT {self._FRAME_COLUMNS} WHERE f.monitor = ? ORDER BY f.captured DESC LIMIT 1",
+                    (monitor,),
+                ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute("UPDATE screenshot_blobs SET last_access = ? WHERE hash = ?", (time.time(), row[1]))
+        return self._row_to_frame(row)
+
+    def frames(self, since: float | None = None, monitor: int | None = None, limit: int = 100) -> List[StoredFrame]:
+        """Aufnahmen ab ``since`` (neueste zuerst)."""
+        clauses, params = [], []
+        if since is not None:
+            clauses.append("f.captured >= ?")
+            params.append(since)
+        if monitor is not None:
+            clauses.append("f.monitor = ?")
+            params.append(monitor)
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {self._FRAME_COLUMNS}{where} ORDER BY f.captured DESC LIMIT ?", (*params, limit)
+            ).fetchall()
+        return [self._row_to_frame(row) for row in rows]
+
+    def _delete_blobs(self, rows: List[tuple]) -> int:
+        removed = 0
+        for digest, ext in rows:
+            self._conn.execute("DELETE FROM screenshot_blobs WHERE hash = ?", (digest,))
+            path = self.path_for(digest, ext)
+            try:
+                path.unlink()
+                if not any(path.parent.iterdir()):
+                    path.parent.rmdir()
+            except FileNotFoundError:
+                pass
+            except OSError as exc:
+                _logger.warning("Screenshot %s konnte nicht gelöscht werden: %s", digest, exc)
+                continue
+            removed += 1
+        return removed
+
+    def evict(self, now: float | None = None) -> int:
+        """Entfernt abgelaufene Aufnahmen und verdrängt nach LRU bis zur Quote; liefert gelöschte Dateien."""
+        now = time.time() if now is None else now
+        with self._lock:
+            if self.max_age_s > 0:
+                self._conn.execute("DELETE FROM screenshot_frames WHERE captured < ?", (now - self.max_age_s,))
+            orphans = self._conn.execute(
+                "SELECT hash, ext FROM screenshot_blobs WHERE hash NOT IN (SELECT hash FROM screenshot_frames)"
+            ).fetchall()
+            removed = self._delete_blobs(orphans)
+            if self.quota_bytes > 0:
+                excess = self._total_bytes() - self.quota_bytes
+                if excess > 0:
+                    victims = []
+                    for digest, ext, size in self._conn.execute(
+                        "SELECT hash, ext, size FROM screenshot_blobs ORDER BY last_access ASC"
+                    ).fetchall():
+                        if excess <= 0:
+                            break
+                        victims.append((digest, ext))
+                        excess -= size
+                    self._conn.executemany(
+                        "DELETE FROM screenshot_frames WHERE hash = ?", [(digest,) for digest, _ in victims]
+                    )
+                    removed += self._delete_blobs(victims)
+            self._stats.evicted += removed
+        if removed:
+            _logger.info("Screenshot-Ablage: %d Dateien verdrängt", removed)
+        return removed
+
+    def _evict_loop(self) -> None:
+        while not self._closed.is_set():
+            try:
+                self.evict()
+            except Exception:
+                _logger.exception("Verdrängung in der Screenshot-Ablage fehlgeschlagen")
+            self._wake.wait(self._evict_interval)
+            self._wake.clear()
+
+    def clear(self) -> int:
+        """Löscht alle Screenshots samt Index und liefert die Anzahl gelöschter Dateien."""
+        with self._lock:
+            rows = self._conn.execute("SELECT hash, ext FROM screenshot_blobs").fetchall()
+            self._conn.execute("DELETE FROM screenshot_frames")
+            count = self._delete_blobs(rows)
+        for legacy in (path for pattern in _LEGACY_PATTERNS for path in self.root.glob(pattern)):
+            try:
+                legacy.unlink()
+                count += 1
+            except OSError:
+                continue
+        return count
+
+    def stats(self) -> StoreStats:
+        with self._lock:
+            frames = self._conn.execute("SELECT COUNT(*) FROM screenshot_frames").fetchone()[0]
+            blobs, size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM screenshot_blobs"
+            ).fetchone()
+            return StoreStats(
+                frames=frames,
+                blobs=blobs,
+                bytes=size,
+                deduplicated=self._stats.deduplicated,
+                evicted=self._stats.evicted,
+            )
+
+    def close(self) -> None:
+        self._closed.set()
+        self._wake.set()
+        self._thread.join(timeout=2)
+        with self._lock:
+            self._conn.close()
+
+
+_store: Optional[ScreenshotStore] = None
+_store_lock = threading.Lock()
+
+
+def get_screenshot_store() -> ScreenshotStore:
+    """Liefert die prozessweit gemeinsame Ablage (wird bei Bedarf geöffnet)."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = ScreenshotStore()
+        return _store
@@ -0,0 +1,144 @@
+"""Hintergrund-Schreiber, der Screenshots abseits des Aufnahmepfads speichert."""
+from __future__ import annotations
+
+import threading
+from collections import deque
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Deque, List, Optional
+
+from core.config import SCREENSHOT_WRITE_QUEUE, SCREENSHOT_WRITER_THREADS
+from core.logger import get_logger
+from core.screenshot_store import ScreenshotStore, get_screenshot_store
+
+if TYPE_CHECKING:  # pragma: no cover - nur für Typprüfung
+    from core.screen_capture import ScreenshotInfo
+
+_logger = get_logger(__name__)
+
+
+@dataclass
+class WriterStats:
+    written: int = 0
+    dropped: int = 0
+    failed: int = 0
+    pending: int = 0
+
+
+class ScreenshotWriter:
+    """Kodiert Screenshots in ``threads`` Hintergrund-Threads und legt sie in ``store`` ab.
+
+    Die Warteschlange fasst höchstens ``max_pending`` Bilder. Läuft sie voll,
+    wird zuerst das älteste Auto-Bild verworfen, danach ein neues Auto-Bild;
+    vom Nutzer ausgelöste Bilder werden nie verworfen und vorrangig geschrieben.
+    """
+
+    def __init__(
+        self,
+        threads: int = SCREENSHOT_WRITER_THREADS,
+        max_pending: int = SCREENSHOT_WRITE_QUEUE,
+        store: Optional[ScreenshotStore] = None,
+    ) -> None:
+        self.max_pending = max(1, max_pending)
+        self.store = store or get_screenshot_store()
+        self._user: Deque["ScreenshotInfo"] = deque()
+        self._auto: Deque["ScreenshotInfo"] = deque()
+        self._active = 0
+        self._condition = threading.Condition()
+        self._stats = WriterStats()
+        self._closed = False
+        self._threads: List[threading.Thread] = []
+        for index in range(max(1, threads)):
+            thread = threading.Thread(target=self._worker, name=f"ScreenshotWriter-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _drop(self, shot: "ScreenshotInfo") -> None:
+        shot.stored = False
+        self._stats.dropped += 1
+
+    def submit(self, shot: "ScreenshotInfo", auto: bool = False) -> bool:
+        """Reiht ``shot`` zum Speichern ein; ``False``, wenn das Auto-Bild verworfen wurde."""
+        with self._condition:
+            if len(self._user) + len(self._auto) >= self.max_pending:
+                if self._auto:
+                    self._drop(self._auto.popleft())
+                elif auto:
+                    self._drop(shot)
+                    _logger.warning("Screenshot-Warteschlange voll, Auto-Bild verworfen")
+                    return False
+            (self._auto if auto else self._user).append(shot)
+            self._condition.notify()
+        return True
+
+    def _next(self) -> Optional["ScreenshotInfo"]:
+        with self._condition:
+            while not (self._user or self._auto or self._closed):
+                self._condition.wait()
+            if self._user:
+                shot = self._user.popleft()
+            elif self._auto:
+                shot = self._auto.popleft()
+            else:
+                return None
+            self._active += 1
+            return shot
+
+    def _worker(self) -> None:
+        while True:
+            shot = self._next()
+            if shot is None:
+                return
+            try:
+                if shot.stored:
+                    frame = self.store.put(
+                        shot.encoded, monitor=shot.monitor, label=shot.label, captured=shot.captured_at
+                    )
+                    shot.path = frame.path
+                    with self._condition:
+                        self._stats.written += 1
+            except Exception:
+                _logger.exception("Screenshot konnte nicht gespeichert werden (%s)", shot.label)
+                shot.stored = False
+                with self._condition:
+                    self._stats.failed += 1
+            finally:
+                with self._condition:
+                    self._active -= 1
+                    self._condition.notify_all()
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Wartet, bis alle eingereihten Bilder geschrieben sind."""
+        with self._condition:
+            return self._condition.wait_for(
+                lambda: not (self._user or self._auto or self._active), timeout
+            )
+
+    def stats(self) -> WriterStats:
+        with self._condition:
+            return WriterStats(
+                written=self._stats.written,
+                dropped=self._stats.dropped,
+                failed=self._stats.failed,
+                pending=len(self._user) + len(self._auto) + self._active,
+            )
+
+    def close(self, timeout: float = 5.0) -> None:
+        self.flush(timeout)
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        for thread in self._threads:
+            thread.join(timeout=1)
+
+
+_writer: Optional[ScreenshotWriter] = None
+_writer_lock = threading.Lock()
+
+
+def get_screenshot_writer() -> ScreenshotWriter:
+    """Liefert den prozessweit gemeinsamen Schreiber (wird bei Bedarf gestartet)."""
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = ScreenshotWriter()
+        return _writer
@@ -1,6 +1,8 @@
 """Wrapper für Text-to-Speech."""
 from __future__ import annotations
 
+import queue
+import re
 import threading
 from typing import Optional
 
@@ -17,11 +19,16 @@ except Exception as exc:  # pragma: no cover - Initialisierung kann auf CI schei
     _tts_engine = None
 
 
-def speak(text: str) -> None:
-    if not _tts_engine:
-        return
+# Ein Satz gilt erst als abgeschlossen, wenn nach dem Satzzeichen Leerraum folgt.
+_SENTENCE_END = re.compile(r"[.!?]\s+")
+_speech_queue: "queue.Queue[str]" = queue.Queue()
+_speech_worker: Optional[threading.Thread] = None
+_worker_lock = threading.Lock()
+
 
-    def _run() -> None:
+def _speech_loop() -> None:
+    while True:
+        text = _speech_queue.get()
         try:
             assert _tts_engine is not None
             _tts_engine.say(text)
@@ -29,4 +36,36 @@ def speak(text: str) -> None:
         except Exception as exc:  # pragma: no cover - nur im Runtime-Fall relevant
             _logger.error("Fehler beim Sprechen: %s", exc)
 
-    threading.Thread(target=_run, daemon=True).start()
+
+def speak(text: str) -> None:
+    """Reiht ``text`` zur Sprachausgabe ein; Ausgaben laufen nacheinander in einem Thread."""
+    global _speech_worker
+    if not _tts_engine or not text.strip():
+        return
+
+    with _worker_lock:
+        if _speech_worker is None:
+            _speech_worker = threading.Thread(target=_speech_loop, name="TTS", daemon=True)
+            _speech_worker.start()
+    _speech_queue.put(text)
+
+
+class SentenceSpeaker:
+    """Spricht gestreamten Text satzweise, sobald ein Satz vollständig ist."""
+
+    def __init__(self) -> None:
+        self._buffer = ""
+
+    def feed(self, delta: str) -> None:
+        self._buffer += delta
+        last_end = 0
+        for match in _SENTENCE_END.finditer(self._buffer):
+            last_end = match.end()
+        if last_end:
+            speak(self._buffer[:last_end].strip())
+            self._buffer = self._buffer[last_end:]
+
+    def finish(self) -> None:
+        if self._buffer.strip():
+            speak(self._buffer.strip())
+        self._buffer = ""
@@ -0,0 +1,69 @@
+"""Verdichtung alter Gesprächsbeiträge in Tageszusammenfassungen und Archiv."""
+from __future__ import annotations
+
+from datetime import datetime, timedelta
+from typing import List
+
+from core.config import INTERACTION_ARCHIVE_AFTER_DAYS
+from core.logger import get_logger
+
+from .knowledge_builder import KnowledgeBuilder
+from .memory_db import Interaction, MemoryDB
+
+_logger = get_logger(__name__)
+
+_MAX_TOPICS = 5
+_TOPIC_LENGTH = 80
+
+
+def summarise_day(day: str, turns: List[Interaction]) -> str:
+    """Erzeugt eine knappe, extraktive Zusammenfassung eines Tages."""
+    questions = [turn.content.strip() for turn in turns if turn.role == "user" and turn.content.strip()]
+    answers = sum(1 for turn in turns if turn.role == "assistant")
+    vision = sum(1 for turn in turns if turn.meta == "vision" and turn.role == "user")
+
+    topics = []
+    for question in questions[:_MAX_TOPICS]:
+        line = " ".join(question.split())
+        if len(line) > _TOPIC_LENGTH:
+            line = line[: _TOPIC_LENGTH - 1].rstrip() + "…"
+        topics.append(line)
+
+    summary = f"{day}: {len(questions)} Fragen ({vision} mit Screenshot), {answers} Antworten."
+    if topics:
+        summary += " Themen: " + "; ".join(topics)
+        if len(questions) > _MAX_TOPICS:
+            summary += f" (+{len(questions) - _MAX_TOPICS} weitere)"
+    return summary
+
+
+class ConversationCompactor:
+    """Hält die ``interactions``-Tabelle klein.
+
+    Beiträge, die älter als ``max_age_days`` sind und bereits von der
+    Faktenextraktion verarbeitet wurden, wandern komprimiert in
+    ``interaction_archive``; pro Tag bleibt eine Zusammenfassung stehen.
+    """
+
+    def __init__(
+        self,
+        db: MemoryDB,
+        knowledge: KnowledgeBuilder | None = None,
+        max_age_days: int = INTERACTION_ARCHIVE_AFTER_DAYS,
+    ) -> None:
+        self._db = db
+        self._knowledge = knowledge
+        self._max_age = timedelta(days=max_age_days)
+
+    def compact(self, now: datetime | None = None) -> int:
+        if self._max_age.days <= 0:
+            return 0
+        cutoff = ((now or datetime.utcnow()) - self._max_age).date().isoformat()
+        # Nur Beiträge archivieren, die die Faktenextraktion schon gesehen hat.
+        max_id = self._knowledge.watermark if self._knowledge is not None else 2**63 - 1
+        moved = self._db.archive_interactions(cutoff, max_id, summarise_day)
+        if moved:
+            _logger.info("Verdichtung: %d Beiträge vor %s archiviert", moved, cutoff)
+            if self._knowledge is not None:
+                self._knowledge.prune_vectors()
+        return moved
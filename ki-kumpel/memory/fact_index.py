@@ -0,0 +1,137 @@
+"""Invertierter Index mit BM25-Ranking für gespeicherte Fakten."""
+from __future__ import annotations
+
+import heapq
+import math
+import re
+from collections import Counter
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+from .memory_db import Fact
+
+_TOKEN_PATTERN = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN_PATTERN.findall(text.lower())
+
+
+def _static_score(fact: Fact) -> int:
+    score = fact.importance
+    if fact.source.startswith("interaction"):
+        score += 1
+    return score
+
+
+class FactIndex:
+    """Hält Token→Fakt-Postings im Speicher und bewertet Anfragen per BM25.
+
+    Eine Anfrage berührt nur die Postings ihrer eigenen Tokens, die Laufzeit
+    hängt damit von der Trefferzahl und nicht von der Gesamtzahl der Fakten ab.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75, static_weight: float = 0.1) -> None:
+        self._k1 = k1
+        self._b = b
+        self._static_weight = static_weight
+        self._postings: Dict[str, Dict[int, int]] = {}
+        self._doc_lengths: Dict[int, int] = {}
+        self._facts: Dict[int, Fact] = {}
+        self._total_length = 0
+        self._static_ranking: List[int] | None = None
+
+    def __len__(self) -> int:
+        return len(self._facts)
+
+    def __iter__(self) -> Iterator[Fact]:
+        return iter(list(self._facts.values()))
+
+    def __contains__(self, fact_id: int) -> bool:
+        return fact_id in self._facts
+
+    def get(self, fact_id: int) -> Fact | None:
+        return self._facts.get(fact_id)
+
+    def add(self, fact: Fact) -> None:
+        if fact.id is None or fact.id in self._facts:
+            return
+        counts = Counter(tokenize(fact.fact))
+        for token, tf in counts.items():
+            self._postings.setdefault(token, {})[fact.id] = tf
+        length = sum(counts.values())
+        self._doc_lengths[fact.id] = length
+        self._total_length += length
+        self._facts[fact.id] = fact
+        self._static_ranking = None
+
+    def add_many(self, facts: Iterable[Fact]) -> None:
+        for fact in facts:
+            self.add(fact)
+
+    def remove(self, fact_id: int) -> None:
+        fact = self._facts.pop(fact_id, None)
+        if fact is None:
+            return
+        for token in set(tokenize(fact.fact)):
+            postings = self._postings.get(token)
+            if postings is None:
+                continue
+            postings.pop(fact_id, None)
+            if not postings:
+                del self._postings[token]
+        self._total_length -= self._doc_lengths.pop(fact_id, 0)
+        self._static_ranking = None
+
+    def clear(self) -> None:
+        self._postings.clear()
+        self._doc_lengths.clear()
+        self._facts.clear()
+        self._total_length = 0
+        self._static_ranking = None
+
+    def document_frequency(self, token: str) -> int:
+        return len(self._postings.get(token, ()))
+
+    def _idf(self, token: str) -> float:
+        df = self.document_frequency(token)
+        return math.log(1.0 + (len(self._facts) - df + 0.5) / (df + 0.5))
+
+    def search(self, query: str, limit: int = 5) -> List[Tuple[float, Fact]]:
+        """Liefert die ``limit`` besten Fakten samt Score.
+
+        Findet kein Token einen Treffer, wird wie bisher nach Wichtigkeit
+        sortiert zurückgegeben.
+        """
+        if not self._facts or limit <= 0:
+            return []
+
+        avg_length = self._total_length / len(self._facts) or 1.0
+        scores: Dict[int, float] = {}
+        for token in set(tokenize(query)):
+            postings = self._postings.get(token)
+            if not postings:
+                continue
+            idf = self._idf(token)
+            for fact_id, tf in postings.items():
+                norm = self._k1 * (1 - self._b + self._b * self._doc_lengths[fact_id] / avg_length)
+                scores[fact_id] = scores.get(fact_id, 0.0) + idf * tf * (self._k1 + 1) / (tf + norm)
+
+        if not scores:
+            return [
+                (float(_static_score(self._facts[fact_id])), self._facts[fact_id])
+                for fact_id in self._ranked_by_static()[:limit]
+            ]
+
+        for fact_id in scores:
+            scores[fact_id] += self._static_weight * _static_score(self._facts[fact_id])
+        best = heapq.nlargest(limit, scores.items(), key=lambda item: (item[1], item[0]))
+        return [(score, self._facts[fact_id]) for fact_id, score in best]
+
+    def _ranked_by_static(self) -> List[int]:
+        if self._static_ranking is None:
+            self._static_ranking = sorted(
+                self._facts,
+                key=lambda fact_id: (_static_score(self._facts[fact_id]), fact_id),
+                reverse=True,
+            )
+        return self._static_ranking
@@ -2,11 +2,16 @@
 from __future__ import annotations
 
 import re
-from typing import List
+import threading
+from itertools import chain
+from typing import Iterable, List, Set
 
+from core.config import FACT_RETRIEVAL_STRATEGY, VECTOR_DIM
 from core.logger import get_logger
 
-from .memory_db import Fact, Interaction, MemoryDB
+from .fact_index import FactIndex
+from .memory_db import Fact, FactRecord, Interaction, MemoryDB, normalise_fact
+from .vector_store import KIND_FACT, KIND_INTERACTION, VectorStore
 
 _logger = get_logger(__name__)
 
@@ -21,9 +26,8 @@ _IMPORTANT_PHRASES = ("muss", "müssen", "soll", "sollen", "wichtig", "immer")
 
 _SENTENCE_SPLIT = re.compile(r"[.!?]\s+")
 
-
-def _normalise(text: str) -> str:
-    return re.sub(r"\s+", " ", text.strip()).lower()
+# Höchstzahl gebundener Parameter je Abfrage beim Abgleich mit der Datenbank
+_PRUNE_CHUNK = 500
 
 
 def _extract_sentences(message: str) -> List[str]:
@@ -37,63 +41,209 @@ def _extract_sentences(message: str) -> List[str]:
 
 
 class KnowledgeBuilder:
-    def __init__(self, db: MemoryDB) -> None:
-        self._db = db
+    _WATERMARK_KEY = "knowledge.last_interaction_id"
 
-    def refresh_facts(self) -> List[Fact]:
-        seen_normalised = {_normalise(f.fact): f for f in self._db.get_facts()}
-        new_facts: List[Fact] = []
-
-        for interaction in self._db.iter_interactions():
-            sentences = _extract_sentences(interaction.content)
-            for sentence in sentences:
-                lower = sentence.lower()
-                if not any(phrase in lower for phrase in _IMPORTANT_PHRASES):
-                    continue
-                normalised = _normalise(sentence)
-                if normalised in seen_normalised:
-                    continue
-                fact_text = sentence.strip()
-                self._db.add_fact(
-                    source=f"interaction:{interaction.timestamp}",
-                    fact=fact_text,
-                    importance=2,
-                )
-                stored = Fact(
-                    timestamp="",  # wird aus DB nicht direkt zurückgegeben
-                    source=f"interaction:{interaction.timestamp}",
-                    fact=fact_text,
-                    importance=2,
-                )
-                seen_normalised[normalised] = stored
-                new_facts.append(stored)
-
-        for keyword, template in _KEYWORD_HINTS.items():
-            normalised_template = _normalise(template)
-            if normalised_template not in seen_normalised:
-                self._db.add_fact(source="heuristic", fact=template, importance=1)
-                stored = Fact(timestamp="", source="heuristic", fact=template, importance=1)
-                seen_normalised[normalised_template] = stored
-                new_facts.append(stored)
-
-        _logger.info("KnowledgeBuilder: %s neue Fakten", len(new_facts))
-        return new_facts
-
-    def get_relevant_facts(self, query: str, limit: int = 5) -> List[str]:
-        query_lower = query.lower()
-        scored: List[tuple[int, Fact]] = []
-        for fact in self._db.get_facts():
-            score = 0
-            for token in re.findall(r"\w+", fact.fact.lower()):
-                if token in query_lower:
-                    score += 2
-            if fact.source.startswith("interaction"):
-                score += 1
-            score += fact.importance
-            if score:
-                scored.append((score, fact))
-        scored.sort(key=lambda item: item[0], reverse=True)
-        return [fact.fact for score, fact in scored[:limit]]
+    def __init__(self, db: MemoryDB, strategy: str | None = None) -> None:
+        self._db = db
+        self._strategy = strategy or FACT_RETRIEVAL_STRATEGY
+        self._seen_normalised: Set[str] | None = None
+        self._heuristics_checked = False
+        self._index: FactIndex | None = None
+        self._vectors: VectorStore | None = None
+        self._vector_interaction_mark = 0
+        self._watermark: int | None = None
+        self._lock = threading.RLock()
+        if self._strategy == "vector":
+            self._ensure_vectors()
+
+    @property
+    def watermark(self) -> int:
+        """ID der zuletzt ausgewerteten Interaktion."""
+        if self._watermark is None:
+            self._watermark = int(self._db.get_state(self._WATERMARK_KEY, "0") or 0)
+        return self._watermark
+
+    def _set_watermark(self, value: int) -> None:
+        self._watermark = value
+        self._db.set_state(self._WATERMARK_KEY, str(value))
+
+    def _load_facts(self) -> None:
+        """Baut fehlende Caches (Normalformen, Index) aus einem einzigen Abruf auf."""
+        if self._seen_normalised is not None and self._index is not None:
+            return
+        facts = self._db.get_facts()
+        if self._seen_normalised is None:
+            self._seen_normalised = {normalise_fact(f.fact) for f in facts}
+            _logger.info("KnowledgeBuilder: %d bekannte Fakten geladen", len(self._seen_normalised))
+        if self._index is None:
+            self._index = FactIndex()
+            self._index.add_many(facts)
+            _logger.info("KnowledgeBuilder: Index mit %d Fakten aufgebaut", len(self._index))
+
+    def _ensure_seen(self) -> Set[str]:
+        self._load_facts()
+        assert self._seen_normalised is not None
+        return self._seen_normalised
+
+    def _ensure_index(self) -> FactIndex:
+        self._load_facts()
+        assert self._index is not None
+        return self._index
+
+    def _ensure_vectors(self) -> VectorStore:
+        if self._vectors is None:
+            self._vectors = VectorStore(self._db.path.with_suffix(""), dim=VECTOR_DIM)
+            self._vector_interaction_mark = self._vectors.max_key(KIND_INTERACTION)
+            self._sync_vectors()
+        return self._vectors
+
+    def _sync_vectors(self) -> None:
+        """Trägt fehlende Fakten und neue Interaktionen in den Vektorspeicher ein."""
+        assert self._vectors is not None
+        index = self._ensure_index()
+        added = self._vectors.add_many((KIND_FACT, fact.id, fact.fact) for fact in index if fact.id)
+        added += self._sync_interaction_vectors()
+        if added:
+            _logger.info("Vektorspeicher: %d Einträge nachgetragen", added)
+
+    def _sync_interaction_vectors(self) -> int:
+        assert self._vectors is not None
+        items = []
+        for interaction in self._db.iter_interactions(after_id=self._vector_interaction_mark):
+            if interaction.id is None:
+                continue
+            items.append((KIND_INTERACTION, interaction.id, interaction.content))
+            self._vector_interaction_mark = interaction.id
+        return self._vectors.add_many(items)
+
+    def prune_vectors(self) -> int:
+        """Entfernt Vektoren zu archivierten Interaktionen und gelöschten Fakten."""
+        with self._lock:
+            if self._vectors is None:
+                return 0
+            index = self._ensure_index()
+            stale = [(KIND_FACT, key) for key in self._vectors.keys(KIND_FACT) if index.get(key) is None]
+            keys = self._vectors.keys(KIND_INTERACTION)
+            for start in range(0, len(keys), _PRUNE_CHUNK):
+                chunk = keys[start : start + _PRUNE_CHUNK]
+                existing = {interaction.id for interaction in self._db.get_interactions_by_ids(chunk)}
+                stale.extend((KIND_INTERACTION, key) for key in chunk if key not in existing)
+            removed = self._vectors.discard(stale)
+            self._vectors.compact()
+            return removed
+
+    def _store_facts(self, records: List[FactRecord]) -> List[Fact]:
+        if not records:
+            return []
+        stored = self._db.add_facts(records)
+        if self._index is not None:
+            self._index.add_many(stored)
+        if self._vectors is not None:
+            self._vectors.add_many((KIND_FACT, fact.id, fact.fact) for fact in stored if fact.id)
+        return stored
+
+    def refresh_facts(self, full_rebuild: bool = False) -> List[Fact]:
+        """Wertet neue Interaktionen seit dem letzten Lauf aus.
+
+        Mit ``full_rebuild=True`` werden alle aus Interaktionen abgeleiteten
+        Fakten verworfen und die komplette Historie (inklusive Archiv) neu
+        analysiert, z.B. nach Änderungen an den Extraktionsregeln.
+        """
+        with self._lock:
+            if full_rebuild:
+                self._db.delete_facts_by_source_prefix("interaction:")
+                self._set_watermark(0)
+                self._seen_normalised = None
+                self._heuristics_checked = False
+                self._index = None
+                if self._vectors is not None:
+                    self._vectors.reset()
+                    self._vector_interaction_mark = 0
+
+            seen_normalised = self._ensure_seen()
+            watermark = self.watermark
+            last_id = watermark
+            pending: List[FactRecord] = []
+            # Erst nach erfolgreichem Speichern als bekannt markieren, damit
+            # ein fehlgeschlagener Schreibvorgang beim nächsten Lauf wiederholt wird.
+            pending_normalised: Set[str] = set()
+
+            interactions: Iterable[Interaction] = self._db.iter_interactions(after_id=watermark)
+            if full_rebuild:
+                interactions = chain(self._db.iter_archived_interactions(), interactions)
+
+            for interaction in interactions:
+                last_id = interaction.id or last_id
+                sentences = _extract_sentences(interaction.content)
+                for sentence in sentences:
+                    lower = sentence.lower()
+                    if not any(phrase in lower for phrase in _IMPORTANT_PHRASES):
+                        continue
+                    normalised = normalise_fact(sentence)
+                    if normalised in seen_normalised or normalised in pending_normalised:
+                        continue
+                    pending_normalised.add(normalised)
+                    pending.append((f"interaction:{interaction.timestamp}", sentence.strip(), 2))
+
+            if not self._heuristics_checked:
+                for keyword, template in _KEYWORD_HINTS.items():
+                    normalised_template = normalise_fact(template)
+                    if normalised_template not in seen_normalised and normalised_template not in pending_normalised:
+                        pending_normalised.add(normalised_template)
+                        pending.append(("heuristic", template, 1))
+
+            new_facts = self._store_facts(pending)
+            seen_normalised.update(pending_normalised)
+            self._heuristics_checked = True
+            if last_id != watermark:
+                self._set_watermark(last_id)
+
+            if self._vectors is not None:
+                if full_rebuild:
+                    self._sync_vectors()
+                    self._vectors.compact()
+                else:
+                    self._sync_interaction_vectors()
+
+            if new_facts or full_rebuild:
+                _logger.info("KnowledgeBuilder: %s neue Fakten", len(new_facts))
+            return new_facts
+
+    def get_relevant_facts(self, query: str, limit: int = 5, strategy: str | None = None) -> List[str]:
+        """Liefert passende Fakten über ``"bm25"`` (Standard) oder ``"vector"``."""
+        with self._lock:
+            strategy = strategy or self._strategy
+            index = self._ensure_index()
+            if strategy == "vector":
+                vectors = self._ensure_vectors()
+                hits = vectors.search(query, limit=limit, kind=KIND_FACT)
+                facts = [index.get(key) for _score, _kind, key in hits]
+                missing = [(KIND_FACT, key) for (_score, _kind, key), fact in zip(hits, facts) if fact is None]
+                if missing:
+                    # Außerhalb gelöschte Fakten: austragen und erneut suchen.
+                    vectors.discard(missing)
+                    return self.get_relevant_facts(query, limit=limit, strategy=strategy)
+                return [fact.fact for fact in facts if fact is not None]
+            return [fact.fact for _score, fact in index.search(query, limit=limit)]
+
+    def get_related_interactions(self, query: str, limit: int = 3) -> List[Interaction]:
+        """Sucht semantisch ähnliche frühere Interaktionen über den Vektorspeicher."""
+        with self._lock:
+            vectors = self._ensure_vectors()
+            hits = vectors.search(query, limit=limit, kind=KIND_INTERACTION)
+            interactions = self._db.get_interactions_by_ids([key for _score, _kind, key in hits])
+            if len(interactions) < len(hits):
+                # Inzwischen archivierte Interaktionen: austragen und erneut suchen.
+                found = {interaction.id for interaction in interactions}
+                vectors.discard((KIND_INTERACTION, key) for _score, _kind, key in hits if key not in found)
+                return self.get_related_interactions(query, limit=limit)
+            return interactions
+
+    def close(self) -> None:
+        with self._lock:
+            if self._vectors is not None:
+                self._vectors.close()
+                self._vectors = None
 
 
 def get_relevant_facts(db: MemoryDB, query: str, limit: int = 5) -> List[str]:
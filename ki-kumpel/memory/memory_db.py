@@ -1,17 +1,51 @@
 """SQLite-Datenbank für Interaktionen und Wissen."""
 from __future__ import annotations
 
+import hashlib
+import json
+import queue
+import re
 import sqlite3
+import threading
+import zlib
+from collections import defaultdict
+from concurrent.futures import Future
+from contextlib import contextmanager
 from dataclasses import dataclass
 from datetime import datetime
 from pathlib import Path
-from typing import Iterable, List, Optional, Sequence, Tuple
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
 
-from core.config import MEMORY_DB_PATH
+from core.config import MEMORY_DB_PATH, MEMORY_READ_POOL_SIZE, MEMORY_WRITE_BATCH_SIZE
 from core.logger import get_logger
 
 _logger = get_logger(__name__)
 
+_SCHEMA_VERSION = 1
+# Seitengröße von iter_interactions: pro Seite wird eine Leseverbindung nur kurz belegt
+_ITER_PAGE_SIZE = 500
+
+FactRecord = Tuple[str, str, int]  # (source, fact, importance)
+WriteOp = Callable[[sqlite3.Connection], Any]
+DaySummariser = Callable[[str, List["Interaction"]], str]
+
+_PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA cache_size = -16000",
+    "PRAGMA mmap_size = 134217728",
+    "PRAGMA busy_timeout = 5000",
+)
+
+
+def normalise_fact(text: str) -> str:
+    return re.sub(r"\s+", " ", text.strip()).lower()
+
+
+def fact_hash(text: str) -> str:
+    return hashlib.sha1(normalise_fact(text).encode("utf-8")).hexdigest()
+
 
 @dataclass
 class Interaction:
@@ -19,6 +53,7 @@ class Interaction:
     role: str
     content: str
     meta: Optional[str]
+    id: Optional[int] = None
 
 
 @dataclass
@@ -27,20 +62,163 @@ class Fact:
     source: str
     fact: str
     importance: int
+    id: Optional[int] = None
+
+
+def _pack_archive(turns: List[Interaction]) -> bytes:
+    payload = [[t.id, t.timestamp, t.role, t.content, t.meta] for t in turns]
+    return zlib.compress(json.dumps(payload, ensure_ascii=False).encode("utf-8"), 9)
+
+
+def _unpack_archive(blob: bytes) -> List[Interaction]:
+    payload = json.loads(zlib.decompress(blob).decode("utf-8"))
+    return [Interaction(ts, role, content, meta, item_id) for item_id, ts, role, content, meta in payload]
 
 
 class MemoryDB:
-    """Minimaler SQLite-Wrapper für Gesprächs- und Wissensspeicher."""
+    """Thread-sicherer SQLite-Wrapper für Gesprächs- und Wissensspeicher.
+
+    Lesezugriffe laufen über einen kleinen Pool eigener Verbindungen im
+    WAL-Modus. Alle Schreibzugriffe landen in einer Queue und werden von einem
+    einzigen Writer-Thread gebündelt in einer Transaktion committet.
+    """
 
     def __init__(self, db_path: Path | None = None) -> None:
         self._path = db_path or MEMORY_DB_PATH
         self._path.parent.mkdir(parents=True, exist_ok=True)
-        self._conn = sqlite3.connect(self._path)
-        self._conn.row_factory = sqlite3.Row
+        self._closed = False
+        # Schützt ``_closed`` zusammen mit dem Einreihen, damit nach dem
+        # Abschluss-Marker kein Schreibzugriff mehr in der Queue landet.
+        self._submit_lock = threading.Lock()
+
+        self._write_conn = self._connect()
         self._init_schema()
 
+        self._readers: queue.Queue[sqlite3.Connection] = queue.Queue(maxsize=MEMORY_READ_POOL_SIZE)
+        self._write_queue: queue.Queue[Tuple[WriteOp, Future] | None] = queue.Queue()
+        self._writer = threading.Thread(target=self._writer_loop, name="MemoryDB-Writer", daemon=True)
+        self._writer.start()
+
+    @property
+    def path(self) -> Path:
+        return self._path
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self._path, check_same_thread=False, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        for pragma in _PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    @contextmanager
+    def _reader(self) -> Iterator[sqlite3.Connection]:
+        try:
+            conn = self._readers.get_nowait()
+        except queue.Empty:
+            conn = self._connect()
+        try:
+            yield conn
+        finally:
+            if self._closed:
+                conn.close()
+            else:
+                try:
+                    self._readers.put_nowait(conn)
+                except queue.Full:
+                    conn.close()
+
+    # ------------------------------------------------------------------
+    # Schreibpfad
+    # ------------------------------------------------------------------
+    def _submit(self, op: WriteOp) -> Future:
+        """Reiht ``op`` ein; nach :meth:`close` wird nichts mehr geschrieben.
+
+        Das gelieferte Future trägt Ergebnis oder Fehler des Commits. Nach dem
+        Schließen ist es sofort mit :class:`RuntimeError` fehlgeschlagen, damit
+        späte Schreibzugriffe aus Hintergrund-Threads nicht auslösen.
+        """
+        future: Future = Future()
+        with self._submit_lock:
+            if not self._closed:
+                self._write_queue.put((op, future))
+                return future
+        _logger.warning("MemoryDB ist bereits geschlossen, Schreibzugriff verworfen")
+        future.set_exception(RuntimeError("MemoryDB ist bereits geschlossen"))
+        return future
+
+    def _writer_loop(self) -> None:
+        while True:
+            item = self._write_queue.get()
+            if item is None:
+                return
+            batch = [item]
+            stop = False
+            while len(batch) < MEMORY_WRITE_BATCH_SIZE:
+                try:
+                    item = self._write_queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+            self._commit_batch(batch)
+            if stop:
+                return
+
+    def _commit_batch(self, batch: List[Tuple[WriteOp, Future]]) -> None:
+        conn = self._write_conn
+        results: List[Tuple[Future, Any, BaseException | None]] = []
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for op, future in batch:
+                # Jede Operation in einem eigenen Savepoint, damit ein Fehler
+                # nicht die restliche Gruppe verwirft.
+                conn.execute("SAVEPOINT write_op")
+                try:
+                    result = op(conn)
+                except Exception as exc:
+                    conn.execute("ROLLBACK TO write_op")
+                    conn.execute("RELEASE write_op")
+                    results.append((future, None, exc))
+                else:
+                    conn.execute("RELEASE write_op")
+                    results.append((future, result, None))
+            conn.execute("COMMIT")
+        except sqlite3.Error as exc:
+            _logger.error("Gruppen-Commit fehlgeschlagen: %s", exc)
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            for _op, future in batch:
+                future.set_exception(exc)
+            return
+
+        for future, result, error in results:
+            if error is not None:
+                _logger.error("Schreiboperation fehlgeschlagen: %s", error)
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+    def _fail_pending(self) -> None:
+        """Lässt Futures fehlschlagen, die der beendete Writer nicht mehr abarbeitet."""
+        while True:
+            try:
+                item = self._write_queue.get_nowait()
+            except queue.Empty:
+                return
+            if item is not None:
+                item[1].set_exception(RuntimeError("MemoryDB ist bereits geschlossen"))
+
+    def flush(self) -> None:
+        """Blockiert, bis alle bisher eingereihten Schreibzugriffe committet sind."""
+        self._submit(lambda conn: None).result()
+
+    # ------------------------------------------------------------------
+    # Schema
+    # ------------------------------------------------------------------
     def _init_schema(self) -> None:
-        cur = self._conn.cursor()
+        cur = self._write_conn.cursor()
         cur.execute(
             """
             CREATE TABLE IF NOT EXISTS interactions (
@@ -59,54 +237,321 @@ class MemoryDB:
                 ts TEXT NOT NULL,
                 source TEXT NOT NULL,
                 fact TEXT NOT NULL,
-                importance INTEGER DEFAULT 1
+                importance INTEGER DEFAULT 1,
+                fact_hash TEXT
             )
             """
         )
-        self._conn.commit()
-
-    def add_interaction(self, role: str, content: str, meta: str | None = None) -> None:
-        cur = self._conn.cursor()
         cur.execute(
-            "INSERT INTO interactions (ts, role, content, meta) VALUES (?, ?, ?, ?)",
-            (datetime.utcnow().isoformat(), role, content, meta),
+            """
+            CREATE TABLE IF NOT EXISTS state (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            )
+            """
         )
-        self._conn.commit()
-        _logger.info("Interaktion gespeichert (%s)", role)
-
-    def add_fact(self, source: str, fact: str, importance: int = 1) -> None:
-        cur = self._conn.cursor()
         cur.execute(
-            "INSERT INTO facts (ts, source, fact, importance) VALUES (?, ?, ?, ?)",
-            (datetime.utcnow().isoformat(), source, fact, importance),
+            """
+            CREATE TABLE IF NOT EXISTS interaction_archive (
+                day TEXT PRIMARY KEY,
+                first_id INTEGER NOT NULL,
+                last_id INTEGER NOT NULL,
+                turn_count INTEGER NOT NULL,
+                payload BLOB NOT NULL
+            )
+            """
         )
-        self._conn.commit()
-        _logger.info("Fakt gespeichert (%s)", source)
-
-    def get_recent_interactions(self, limit: int = 50) -> List[Interaction]:
-        cur = self._conn.cursor()
         cur.execute(
-            "SELECT ts, role, content, meta FROM interactions ORDER BY id DESC LIMIT ?",
-            (limit,),
+            """
+            CREATE TABLE IF NOT EXISTS interaction_summaries (
+                day TEXT PRIMARY KEY,
+                ts TEXT NOT NULL,
+                turn_count INTEGER NOT NULL,
+                summary TEXT NOT NULL
+            )
+            """
         )
-        rows = cur.fetchall()
+        self._migrate()
+
+    def _migrate(self) -> None:
+        conn = self._write_conn
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        if version >= _SCHEMA_VERSION:
+            return
+
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if version < 1:
+                columns = {row["name"] for row in conn.execute("PRAGMA table_info(facts)")}
+                if "fact_hash" not in columns:
+                    conn.execute("ALTER TABLE facts ADD COLUMN fact_hash TEXT")
+                # Bestehende Zeilen nachziehen; Duplikate (gleicher normalisierter Text)
+                # werden entfernt, die älteste Zeile bleibt erhalten.
+                seen: set[str] = set()
+                updates: List[Tuple[str, int]] = []
+                duplicates: List[Tuple[int]] = []
+                for row in conn.execute("SELECT id, fact FROM facts ORDER BY id"):
+                    digest = fact_hash(row["fact"])
+                    if digest in seen:
+                        duplicates.append((row["id"],))
+                        continue
+                    seen.add(digest)
+                    updates.append((digest, row["id"]))
+                conn.executemany("DELETE FROM facts WHERE id = ?", duplicates)
+                conn.executemany("UPDATE facts SET fact_hash = ? WHERE id = ?", updates)
+                conn.execute(
+                    "CREATE UNIQUE INDEX IF NOT EXISTS idx_facts_hash ON facts (fact_hash)"
+                )
+                _logger.info(
+                    "Schema-Migration 1: %d Fakten gehasht, %d Duplikate entfernt",
+                    len(updates),
+                    len(duplicates),
+                )
+            conn.execute(f"PRAGMA user_version = {_SCHEMA_VERSION}")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    # ------------------------------------------------------------------
+    # Schreibzugriffe (über den Writer-Thread)
+    # ------------------------------------------------------------------
+    def add_interaction(
+        self, role: str, content: str, meta: str | None = None, *, durable: bool = False
+    ) -> Interaction:
+        """Reiht eine Interaktion zum Speichern ein.
+
+        Standardmäßig wird nicht auf den Commit gewartet; Fehler werden dann nur
+        protokolliert. Mit ``durable=True`` blockiert der Aufruf bis zum Commit
+        und löst Schreibfehler aus. In beiden Fällen erhält die Interaktion ihre
+        ``id``, sobald sie gespeichert ist.
+        """
+        interaction = Interaction(datetime.utcnow().isoformat(), role, content, meta)
+
+        def op(conn: sqlite3.Connection) -> int:
+            cur = conn.execute(
+                "INSERT INTO interactions (ts, role, content, meta) VALUES (?, ?, ?, ?)",
+                (interaction.timestamp, role, content, meta),
+            )
+            _logger.info("Interaktion gespeichert (%s)", role)
+            return cur.lastrowid
+
+        def assign_id(future: Future) -> None:
+            if not future.cancelled() and future.exception() is None:
+                interaction.id = future.result()
+
+        future = self._submit(op)
+        future.add_done_callback(assign_id)
+        if durable:
+            future.result()
+        return interaction
+
+    def add_fact(self, source: str, fact: str, importance: int = 1) -> Fact | None:
+        """Speichert einen Fakt; liefert ``None``, wenn er bereits existiert."""
+        stored = self.add_facts([(source, fact, importance)])
+        return stored[0] if stored else None
+
+    def add_facts(self, records: Iterable[FactRecord]) -> List[Fact]:
+        """Schreibt mehrere Fakten in einer Transaktion.
+
+        Duplikate werden über den eindeutigen Hash des normalisierten Texts
+        von SQLite verworfen; zurückgegeben werden nur neu gespeicherte Fakten.
+        """
+        timestamp = datetime.utcnow().isoformat()
+        records = list(records)
+
+        def op(conn: sqlite3.Connection) -> List[Fact]:
+            stored: List[Fact] = []
+            for source, fact, importance in records:
+                cur = conn.execute(
+                    "INSERT OR IGNORE INTO facts (ts, source, fact, importance, fact_hash) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (timestamp, source, fact, importance, fact_hash(fact)),
+                )
+                if cur.rowcount == 1:
+                    stored.append(Fact(timestamp, source, fact, importance, cur.lastrowid))
+            return stored
+
+        stored = self._submit(op).result()
+        if stored:
+            _logger.info("%d Fakten gespeichert", len(stored))
+        return stored
+
+    def delete_facts_by_source_prefix(self, prefix: str) -> int:
+        def op(conn: sqlite3.Connection) -> int:
+            return conn.execute("DELETE FROM facts WHERE source LIKE ?", (prefix + "%",)).rowcount
+
+        removed = self._submit(op).result()
+        _logger.info("%d Fakten mit Quelle '%s*' entfernt", removed, prefix)
+        return removed
+
+    def set_state(self, key: str, value: str) -> None:
+        self._submit(
+            lambda conn: conn.execute(
+                "INSERT INTO state (key, value) VALUES (?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+                (key, value),
+            )
+        )
+
+    def archive_interactions(self, before_ts: str, max_id: int, summarise: DaySummariser) -> int:
+        """Verschiebt Interaktionen vor ``before_ts`` (bis ``max_id``) ins Archiv.
+
+        Pro Kalendertag entsteht eine zlib-komprimierte JSON-Zeile in
+        ``interaction_archive`` sowie eine Zusammenfassung in
+        ``interaction_summaries``. Alles geschieht in einer Transaktion.
+        """
+
+        def op(conn: sqlite3.Connection) -> int:
+            rows = conn.execute(
+                "SELECT id, ts, role, content, meta FROM interactions WHERE ts < ? AND id <= ? ORDER BY id",
+                (before_ts, max_id),
+            ).fetchall()
+            if not rows:
+                return 0
+            by_day: Dict[str, List[Interaction]] = defaultdict(list)
+            for row in rows:
+                by_day[row["ts"][:10]].append(
+                    Interaction(row["ts"], row["role"], row["content"], row["meta"], row["id"])
+                )
+            for day, turns in by_day.items():
+                existing = conn.execute(
+                    "SELECT payload FROM interaction_archive WHERE day = ?", (day,)
+                ).fetchone()
+                if existing is not None:
+                    turns = _unpack_archive(existing["payload"]) + turns
+                conn.execute(
+                    "INSERT OR REPLACE INTO interaction_archive (day, first_id, last_id, turn_count, payload) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (day, turns[0].id, turns[-1].id, len(turns), _pack_archive(turns)),
+                )
+                conn.execute(
+                    "INSERT OR REPLACE INTO interaction_summaries (day, ts, turn_count, summary) "
+                    "VALUES (?, ?, ?, ?)",
+                    (day, datetime.utcnow().isoformat(), len(turns), summarise(day, turns)),
+                )
+            conn.execute(
+                "DELETE FROM interactions WHERE ts < ? AND id <= ?", (before_ts, max_id)
+            )
+            return len(rows)
+
+        moved = self._submit(op).result()
+        if moved:
+            _logger.info("%d Interaktionen archiviert", moved)
+        return moved
+
+    # ------------------------------------------------------------------
+    # Lesezugriffe (über den Verbindungspool)
+    # ------------------------------------------------------------------
+    def get_recent_interactions(self, limit: int = 50) -> List[Interaction]:
+        with self._reader() as conn:
+            rows = conn.execute(
+                "SELECT id, ts, role, content, meta FROM interactions ORDER BY id DESC LIMIT ?",
+                (limit,),
+            ).fetchall()
         return [
-            Interaction(row["ts"], row["role"], row["content"], row["meta"]) for row in rows
+            Interaction(row["ts"], row["role"], row["content"], row["meta"], row["id"]) for row in rows
+        ]
+
+    def get_interactions_before(self, before_id: int | None, limit: int = 50) -> List[Interaction]:
+        """Seitenweises Blättern im Verlauf: bis zu ``limit`` Interaktionen vor ``before_id``, neueste zuerst."""
+        if before_id is None:
+            return self.get_recent_interactions(limit)
+        with self._reader() as conn:
+            rows = conn.execute(
+                "SELECT id, ts, role, content, meta FROM interactions WHERE id < ? ORDER BY id DESC LIMIT ?",
+                (before_id, limit),
+            ).fetchall()
+        return [
+            Interaction(row["ts"], row["role"], row["content"], row["meta"], row["id"]) for row in rows
         ]
 
     def get_facts(self, minimum_importance: int = 1) -> List[Fact]:
-        cur = self._conn.cursor()
-        cur.execute(
-            "SELECT ts, source, fact, importance FROM facts WHERE importance >= ? ORDER BY importance DESC, id DESC",
-            (minimum_importance,),
-        )
-        rows = cur.fetchall()
-        return [Fact(row["ts"], row["source"], row["fact"], row["importance"]) for row in rows]
+        with self._reader() as conn:
+            rows = conn.execute(
+                "SELECT id, ts, source, fact, importance FROM facts WHERE importance >= ? ORDER BY importance DESC, id DESC",
+                (minimum_importance,),
+            ).fetchall()
+        return [
+            Fact(row["ts"], row["source"], row["fact"], row["importance"], row["id"]) for row in rows
+        ]
+
+    def iter_interactions(self, after_id: int = 0) -> Iterable[Interaction]:
+        """Liefert alle Interaktionen mit einer ID größer als ``after_id``.
+
+        Gelesen wird seitenweise; zwischen zwei Seiten hält der Generator keine
+        Verbindung aus dem Pool.
+        """
+        while True:
+            with self._reader() as conn:
+                rows = conn.execute(
+                    "SELECT id, ts, role, content, meta FROM interactions WHERE id > ? ORDER BY id LIMIT ?",
+                    (after_id, _ITER_PAGE_SIZE),
+                ).fetchall()
+            for row in rows:
+                yield Interaction(row["ts"], row["role"], row["content"], row["meta"], row["id"])
+            if len(rows) < _ITER_PAGE_SIZE:
+                return
+            after_id = rows[-1]["id"]
+
+    def get_interactions_by_ids(self, ids: Sequence[int]) -> List[Interaction]:
+        if not ids:
+            return []
+        placeholders = ", ".join("?" for _ in ids)
+        with self._reader() as conn:
+            rows = conn.execute(
+                f"SELECT id, ts, role, content, meta FROM interactions WHERE id IN ({placeholders})",
+                tuple(ids),
+            ).fetchall()
+        by_id = {
+            row["id"]: Interaction(row["ts"], row["role"], row["content"], row["meta"], row["id"])
+            for row in rows
+        }
+        return [by_id[item] for item in ids if item in by_id]
+
+    def get_state(self, key: str, default: str | None = None) -> str | None:
+        with self._reader() as conn:
+            row = conn.execute("SELECT value FROM state WHERE key = ?", (key,)).fetchone()
+        return row["value"] if row else default
+
+    def get_archived_days(self) -> List[str]:
+        with self._reader() as conn:
+            rows = conn.execute("SELECT day FROM interaction_archive ORDER BY day").fetchall()
+        return [row["day"] for row in rows]
+
+    def load_archived_interactions(self, day: str) -> List[Interaction]:
+        """Liefert die Original-Interaktionen eines archivierten Tages (``YYYY-MM-DD``)."""
+        with self._reader() as conn:
+            row = conn.execute(
+                "SELECT payload FROM interaction_archive WHERE day = ?", (day,)
+            ).fetchone()
+        return _unpack_archive(row["payload"]) if row else []
+
+    def iter_archived_interactions(self) -> Iterable[Interaction]:
+        for day in self.get_archived_days():
+            yield from self.load_archived_interactions(day)
 
-    def iter_interactions(self) -> Iterable[Interaction]:
-        cur = self._conn.cursor()
-        for row in cur.execute("SELECT ts, role, content, meta FROM interactions ORDER BY id"):
-            yield Interaction(row["ts"], row["role"], row["content"], row["meta"])
+    def get_summaries(self, limit: int = 30) -> List[Tuple[str, str]]:
+        """Liefert ``(day, summary)`` der jüngsten archivierten Tage."""
+        with self._reader() as conn:
+            rows = conn.execute(
+                "SELECT day, summary FROM interaction_summaries ORDER BY day DESC LIMIT ?", (limit,)
+            ).fetchall()
+        return [(row["day"], row["summary"]) for row in rows]
 
     def close(self) -> None:
-        self._conn.close()
+        with self._submit_lock:
+            if self._closed:
+                return
+            self._closed = True
+            # Der Writer arbeitet die Queue in Reihenfolge ab, alles vor dem
+            # Marker wird also noch committet.
+            self._write_queue.put(None)
+        self._writer.join()
+        self._fail_pending()
+        self._write_conn.close()
+        while True:
+            try:
+                self._readers.get_nowait().close()
+            except queue.Empty:
+                break
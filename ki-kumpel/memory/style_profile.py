@@ -1,14 +1,28 @@
 """Analyse und Anwendung des Eren-Schreibstils."""
 from __future__ import annotations
 
+import math
+import re
+import threading
+from collections import Counter
 from dataclasses import dataclass, field
-from typing import Dict, List
+from typing import Dict, List, Tuple
 
 from core.config import STYLE_SAMPLE_DIR
 from core.logger import get_logger
 
 _logger = get_logger(__name__)
 
+_TOKEN_PATTERN = re.compile(r"\w{3,}")
+
+_GREETING_PREFIXES = ("hallo", "hi", "guten", "liebe")
+_CLOSING_MARKERS = ("grüße", "gruesse", "thanks")
+
+
+def _term_vector(text: str) -> Tuple[Counter, float]:
+    counts = Counter(_TOKEN_PATTERN.findall(text.lower()))
+    return counts, math.sqrt(sum(value * value for value in counts.values()))
+
 
 @dataclass
 class StyleProfile:
@@ -16,6 +30,41 @@ class StyleProfile:
     examples: List[str] = field(default_factory=list)
     greeting: str = "Hallo zusammen"
     closing: str = "Viele Grüße\nEren"
+    _example_index: List[Tuple[Counter, float]] = field(
+        default_factory=list, init=False, repr=False, compare=False
+    )
+
+    def __post_init__(self) -> None:
+        self._example_index = [_term_vector(example) for example in self.examples]
+
+    def select_examples(self, query: str, k: int = 2, max_chars: int = 1500) -> List[str]:
+        """Wählt die ``k`` zur Anfrage ähnlichsten Beispiele innerhalb von ``max_chars``."""
+        if k <= 0 or not self.examples:
+            return []
+        query_counts, query_norm = _term_vector(query)
+
+        def similarity(position: int) -> float:
+            counts, norm = self._example_index[position]
+            if not norm or not query_norm:
+                return 0.0
+            dot = sum(value * counts.get(token, 0) for token, value in query_counts.items())
+            return dot / (norm * query_norm)
+
+        ranked = sorted(
+            range(len(self.examples)),
+            key=lambda position: (-similarity(position), len(self.examples[position])),
+        )
+        selected: List[str] = []
+        used = 0
+        for position in ranked:
+            example = self.examples[position]
+            if used + len(example) > max_chars:
+                continue
+            selected.append(example)
+            used += len(example)
+            if len(selected) >= k:
+                break
+        return selected
 
 
 def _load_samples() -> List[str]:
@@ -34,7 +83,7 @@ def _extract_greeting(samples: List[str]) -> str:
         if not lines:
             continue
         first_line = lines[0]
-        if first_line.lower().startswith(("hallo", "hi", "guten", "liebe")):
+        if first_line.lower().startswith(_GREETING_PREFIXES):
             return first_line.strip()
     return "Hallo zusammen"
 
@@ -44,11 +93,24 @@ def _extract_closing(samples: List[str]) -> str:
         lines = [line.strip() for line in sample.strip().splitlines() if line.strip()]
         if len(lines) >= 2:
             closing = "\n".join(lines[-2:])
-            if "grüße" in closing.lower() or "thanks" in closing.lower():
+            if any(marker in closing.lower() for marker in _CLOSING_MARKERS):
                 return closing
     return "Viele Grüße\nEren"
 
 
+def _strip_frame(sample: str) -> str:
+    """Entfernt Anrede und Grußformel; beides ergänzt :func:`apply_style` selbst."""
+    lines = sample.strip().splitlines()
+    first_word = lines[0].split(maxsplit=1)[0].strip(",!").lower() if lines and lines[0].strip() else ""
+    if first_word in _GREETING_PREFIXES:
+        lines = lines[1:]
+    for position in range(len(lines) - 1, max(-1, len(lines) - 4), -1):
+        if any(marker in lines[position].lower() for marker in _CLOSING_MARKERS):
+            lines = lines[:position]
+            break
+    return "\n".join(lines).strip()
+
+
 def build_style_profile() -> StyleProfile:
     samples = _load_samples()
     rules = {
@@ -56,11 +118,7 @@ def build_style_profile() -> StyleProfile:
         "struktur": "Kurze Einleitung, Problem benennen, klare nächsten Schritte, Bitte um Rückmeldung.",
         "abschluss": "Immer mit freundlicher Grußformel und Namen enden.",
     }
-    examples = [sample.strip() for sample in samples if sample.strip()]
-    if not examples:
-        examples.append(
-            "Hallo zusammen,\n\nkurzes Update: Bitte prüft die CAD-Cases bis 10 Uhr und gebt mir eine Rückmeldung.\n\nViele Grüße\nEren"
-        )
+    examples = [body for body in (_strip_frame(sample) for sample in samples) if body]
 
     greeting = _extract_greeting(samples)
     closing = _extract_closing(samples)
@@ -70,8 +128,62 @@ def build_style_profile() -> StyleProfile:
     return profile
 
 
+SampleSignature = Tuple[Tuple[str, int, int], ...]
+
+
+def _sample_signature() -> SampleSignature | None:
+    """Name, Änderungszeit und Größe jeder Beispieldatei.
+
+    Erfasst neben neuen und gelöschten Dateien auch solche, die an Ort und
+    Stelle überschrieben werden.
+    """
+    if not STYLE_SAMPLE_DIR.is_dir():
+        return None
+    signature = []
+    for sample_file in sorted(STYLE_SAMPLE_DIR.glob("*.txt")):
+        try:
+            stat = sample_file.stat()
+        except OSError:
+            continue
+        signature.append((sample_file.name, stat.st_mtime_ns, stat.st_size))
+    return tuple(signature)
+
+
+class StyleProfileCache:
+    """Hält das StyleProfile vor und lädt nur neu, wenn sich eine Beispieldatei ändert.
+
+    Pro Abruf kostet das ein ``stat`` je Beispieldatei, gelesen wird nur nach
+    einer Änderung. :meth:`invalidate` erzwingt den Neuaufbau.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._signature: SampleSignature | None = None
+        self._profile: StyleProfile | None = None
+
+    def get(self) -> StyleProfile:
+        signature = _sample_signature()
+        with self._lock:
+            if self._profile is None or signature != self._signature:
+                self._profile = build_style_profile()
+                self._signature = signature
+            return self._profile
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._profile = None
+
+
+_profile_cache = StyleProfileCache()
+
+
+def get_style_profile() -> StyleProfile:
+    """Liefert das zwischengespeicherte StyleProfile (Neuaufbau nur bei geänderten Samples)."""
+    return _profile_cache.get()
+
+
 def apply_style(raw_text: str, profile: StyleProfile | None = None) -> str:
-    profile = profile or build_style_profile()
+    profile = profile or get_style_profile()
 
     body = raw_text.strip()
     if not body:
@@ -0,0 +1,225 @@
+"""Offline-Vektorsuche über Fakten und Interaktionen.
+
+Texte werden lokal über gehashte Zeichen-N-Gramme eingebettet und in einer
+memory-mapped float32-Matrix neben der SQLite-Datei abgelegt. Eine Anfrage
+kostet ein einziges Matrix-Vektor-Produkt.
+"""
+from __future__ import annotations
+
+import os
+import re
+import zlib
+from pathlib import Path
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+
+from core.logger import get_logger
+
+_logger = get_logger(__name__)
+
+KIND_FACT = 0
+KIND_INTERACTION = 1
+# Zeilen, deren Quelle gelöscht oder archiviert wurde, bis zur nächsten Verdichtung
+_KIND_STALE = -2
+
+_FOLD_TABLE = str.maketrans({"ä": "a", "ö": "o", "ü": "u", "ß": "ss"})
+_WORD_PATTERN = re.compile(r"\w+")
+
+VectorHit = Tuple[float, int, int]  # (score, kind, key)
+
+
+class HashedNgramEmbedder:
+    """Bettet Texte über gehashte Zeichen-N-Gramme ein (ohne Netzwerk, ohne Training)."""
+
+    def __init__(self, dim: int = 512, ngram_sizes: Tuple[int, ...] = (3, 4)) -> None:
+        self.dim = dim
+        self._ngram_sizes = ngram_sizes
+
+    def _features(self, text: str) -> Iterable[str]:
+        folded = text.lower().translate(_FOLD_TABLE)
+        for word in _WORD_PATTERN.findall(folded):
+            padded = f" {word} "
+            for size in self._ngram_sizes:
+                if len(padded) < size:
+                    continue
+                for start in range(len(padded) - size + 1):
+                    yield padded[start : start + size]
+
+    def embed(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for feature in self._features(text):
+            digest = zlib.crc32(feature.encode("utf-8"))
+            sign = 1.0 if digest & 0x80000000 else -1.0
+            vector[digest % self.dim] += sign
+        norm = float(np.linalg.norm(vector))
+        if norm:
+            vector /= norm
+        return vector
+
+
+class VectorStore:
+    """Append-only Vektormatrix mit Schlüsseln ``(kind, key)``.
+
+    Die Dateien ``<base>.vectors.npy`` und ``<base>.keys.npy`` werden per
+    ``numpy.memmap`` geöffnet und bei Bedarf in doppelter Kapazität neu
+    angelegt. :meth:`discard` markiert Zeilen als veraltet; sie nehmen an
+    keiner Suche mehr teil und werden von :meth:`compact` entfernt.
+    """
+
+    def __init__(self, base_path: Path, dim: int = 512, initial_capacity: int = 1024) -> None:
+        self._vectors_path = base_path.with_name(base_path.name + ".vectors.npy")
+        self._keys_path = base_path.with_name(base_path.name + ".keys.npy")
+        self.embedder = HashedNgramEmbedder(dim)
+        self._dim = dim
+        self._open(initial_capacity)
+
+    def _open(self, initial_capacity: int) -> None:
+        vectors = keys = None
+        if self._vectors_path.exists() and self._keys_path.exists():
+            try:
+                vectors = np.load(self._vectors_path, mmap_mode="r+")
+                keys = np.load(self._keys_path, mmap_mode="r+")
+                if vectors.shape[1] != self._dim or len(keys) != len(vectors):
+                    _logger.warning("Vektorspeicher passt nicht zur Konfiguration, wird neu aufgebaut")
+                    vectors = keys = None
+            except (OSError, ValueError) as exc:
+                _logger.error("Vektorspeicher konnte nicht geladen werden: %s", exc)
+                vectors = keys = None
+
+        if vectors is None or keys is None:
+            vectors, keys = self._create(initial_capacity)
+
+        self._vectors = vectors
+        self._keys = keys
+        self._count = int(np.count_nonzero(keys[:, 0] != -1))
+        self._rows: Dict[Tuple[int, int], int] = {
+            (int(kind), int(key)): row
+            for row, (kind, key) in enumerate(keys[: self._count])
+            if kind != _KIND_STALE
+        }
+        self._stale = self._count - len(self._rows)
+        _logger.info("Vektorspeicher geöffnet (%d Einträge, %d veraltet)", len(self._rows), self._stale)
+
+    def _create(self, capacity: int, suffix: str = "") -> Tuple[np.memmap, np.memmap]:
+        vectors = np.lib.format.open_memmap(
+            str(self._vectors_path) + suffix, mode="w+", dtype=np.float32, shape=(capacity, self._dim)
+        )
+        keys = np.lib.format.open_memmap(
+            str(self._keys_path) + suffix, mode="w+", dtype=np.int64, shape=(capacity, 2)
+        )
+        keys[:] = -1
+        return vectors, keys
+
+    def _grow(self, needed: int) -> None:
+        capacity = len(self._keys)
+        if needed <= capacity:
+            return
+        new_capacity = max(capacity * 2, needed)
+        vectors, keys = self._create(new_capacity, suffix=".tmp")
+        vectors[: self._count] = self._vectors[: self._count]
+        keys[: self._count] = self._keys[: self._count]
+        vectors.flush()
+        keys.flush()
+        # Alte Mappings freigeben, bevor die Dateien ersetzt werden (Windows).
+        del self._vectors, self._keys, vectors, keys
+        os.replace(str(self._vectors_path) + ".tmp", self._vectors_path)
+        os.replace(str(self._keys_path) + ".tmp", self._keys_path)
+        self._vectors = np.load(self._vectors_path, mmap_mode="r+")
+        self._keys = np.load(self._keys_path, mmap_mode="r+")
+        _logger.info("Vektorspeicher auf %d Zeilen erweitert", new_capacity)
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    @property
+    def stale(self) -> int:
+        """Anzahl veralteter Zeilen, die noch Platz belegen."""
+        return self._stale
+
+    def __contains__(self, item: Tuple[int, int]) -> bool:
+        return item in self._rows
+
+    def keys(self, kind: int) -> List[int]:
+        return [key for item_kind, key in self._rows if item_kind == kind]
+
+    def max_key(self, kind: int) -> int:
+        keys = self._keys[: self._count]
+        selected = keys[keys[:, 0] == kind, 1]
+        return int(selected.max()) if len(selected) else 0
+
+    def add_many(self, items: Iterable[Tuple[int, int, str]]) -> int:
+        """Fügt ``(kind, key, text)``-Einträge hinzu, bereits bekannte werden übersprungen."""
+        fresh = [(kind, key, text) for kind, key, text in items if (kind, key) not in self._rows]
+        if not fresh:
+            return 0
+        self._grow(self._count + len(fresh))
+        for kind, key, text in fresh:
+            row = self._count
+            self._vectors[row] = self.embedder.embed(text)
+            self._keys[row] = (kind, key)
+            self._rows[(kind, key)] = row
+            self._count += 1
+        self._vectors.flush()
+        self._keys.flush()
+        return len(fresh)
+
+    def search(
+        self, query: str, limit: int = 5, kind: int | None = None, min_score: float = 0.05
+    ) -> List[VectorHit]:
+        if not self._rows or limit <= 0:
+            return []
+        scores = self._vectors[: self._count] @ self.embedder.embed(query)
+        # Veraltete und fremde Zeilen vor dem Top-k-Schnitt ausblenden, sonst
+        # kämen weniger als ``limit`` Treffer zurück.
+        kinds = self._keys[: self._count, 0]
+        valid = kinds == kind if kind is not None else kinds >= 0
+        scores = np.where(valid & (scores >= min_score), scores, -np.inf)
+        limit = min(limit, int(np.count_nonzero(np.isfinite(scores))))
+        if not limit:
+            return []
+        top = np.argpartition(-scores, limit - 1)[:limit]
+        top = top[np.argsort(-scores[top])]
+        return [(float(scores[row]), int(self._keys[row, 0]), int(self._keys[row, 1])) for row in top]
+
+    def discard(self, items: Iterable[Tuple[int, int]]) -> int:
+        """Markiert ``(kind, key)``-Einträge als veraltet, z.B. nach Löschen oder Archivieren."""
+        discarded = 0
+        for item in items:
+            row = self._rows.pop(item, None)
+            if row is None:
+                continue
+            self._keys[row, 0] = _KIND_STALE
+            discarded += 1
+        if discarded:
+            self._stale += discarded
+            self._keys.flush()
+        return discarded
+
+    def compact(self) -> int:
+        """Schiebt die gültigen Zeilen nach vorne und gibt veraltete frei; liefert deren Anzahl."""
+        if not self._stale:
+            return 0
+        live = np.flatnonzero(self._keys[: self._count, 0] != _KIND_STALE)
+        removed = self._count - len(live)
+        self._vectors[: len(live)] = self._vectors[live]
+        self._keys[: len(live)] = self._keys[live]
+        self._keys[len(live) : self._count] = -1
+        self._vectors.flush()
+        self._keys.flush()
+        self._count = len(live)
+        self._rows = {(int(kind), int(key)): row for row, (kind, key) in enumerate(self._keys[: self._count])}
+        self._stale = 0
+        _logger.info("Vektorspeicher verdichtet (%d veraltete Zeilen entfernt)", removed)
+        return removed
+
+    def reset(self) -> None:
+        self._keys[: self._count] = -1
+        self._keys.flush()
+        self._count = 0
+        self._stale = 0
+        self._rows.clear()
+
+    def close(self) -> None:
+        self._vectors.flush()
+        self._keys.flush()
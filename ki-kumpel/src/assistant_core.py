@@ -1,21 +1,248 @@
-"""CLI-Einstiegspunkt für schnelle Vision-Abfragen."""
+"""CLI-Einstiegspunkt für schnelle Vision-Abfragen und Batch-Fragen.
+
+Ohne Argumente wird das Aufnahmeziel ``--target`` (Standard:
+``KI_KUMPEL_CAPTURE_TARGET``) beschrieben. Mit ``--batch``
+werden Fragen aus einer Datei (oder ``-`` für stdin) parallel beantwortet::
+
+    python -m src.assistant_core --batch fragen.jsonl --output antworten.jsonl --concurrency 6
+    python -m src.assistant_core --batch fragen.tsv --output antworten.jsonl --resume
+
+Eingabezeilen sind entweder JSON (``{"id": ..., "question": ..., "image": ...}``)
+oder Text mit optionalem, per Tab getrenntem Bildpfad. Ergebnisse werden in
+Abschlussreihenfolge als JSONL geschrieben; ``--resume`` überspringt Fragen,
+die in der Ausgabedatei bereits erfolgreich beantwortet wurden.
+"""
 from __future__ import annotations
 
-from core.screen_capture import capture_all_screens
+import argparse
+import hashlib
+import json
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, IO, Iterator, Optional, Set
+
+from PIL import Image
+
+from core.config import CAPTURE_TARGET, LLM_MAX_CONCURRENCY
+from core.image_pipeline import prepare_image
+from core.logger import get_logger
 from core.router import AssistantRouter
+from core.screen_capture import CAPTURE_TARGETS
+
+_logger = get_logger(__name__)
+
 
+@dataclass
+class BatchItem:
+    id: str
+    question: str
+    image: Optional[Path] = None
 
-def run_assistant() -> None:
+
+def run_assistant(target: str = CAPTURE_TARGET) -> None:
     router = AssistantRouter()
-    shots = capture_all_screens()
-    if not shots:
-        raise RuntimeError("Kein Monitor gefunden")
-    _, image = shots[0]
-    answer = router.handle_vision("Beschreibe den Screenshot.", image)
+    answer = router.handle_vision("Beschreibe den Screenshot.", target=target)
     print("\n===== KI ANTWORT =====\n")
     print(answer)
     print("\n======================\n")
 
 
+def _default_id(question: str, image: Optional[str]) -> str:
+    return hashlib.sha1(f"{question}\0{image or ''}".encode("utf-8")).hexdigest()[:12]
+
+
+def read_batch(stream: IO[str], base_dir: Path) -> Iterator[BatchItem]:
+    """Liest Batch-Einträge zeilenweise; leere Zeilen und ``#``-Kommentare werden übersprungen."""
+    seen: Dict[str, int] = {}
+    for line_number, raw in enumerate(stream, start=1):
+        line = raw.rstrip("\n")
+        if not line.strip() or line.lstrip().startswith("#"):
+            continue
+        if line.lstrip().startswith("{"):
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as exc:
+                _logger.warning("Batch-Zeile %d ist kein gültiges JSON (%s), übersprungen", line_number, exc)
+                continue
+            question = str(record.get("question", "")).strip()
+            image = record.get("image") or None
+            item_id = str(record["id"]) if record.get("id") is not None else None
+        else:
+            question, _, image = line.partition("\t")
+            question = question.strip()
+            image = image.strip() or None
+            item_id = None
+        if not question:
+            _logger.warning("Batch-Zeile %d ohne Frage übersprungen", line_number)
+            continue
+        if item_id is None:
+            item_id = _default_id(question, image)
+            # Gleiche Frage mehrfach in einer Datei: jede Wiederholung bekommt eine eigene ID.
+            seen[item_id] = seen.get(item_id, 0) + 1
+            if seen[item_id] > 1:
+                item_id = f"{item_id}#{seen[item_id]}"
+        image_path = None
+        if image:
+            image_path = Path(image)
+            if not image_path.is_absolute():
+                image_path = base_dir / image_path
+        yield BatchItem(item_id, question, image_path)
+
+
+def completed_ids(path: Path) -> Set[str]:
+    """IDs, die in einer früheren Ausgabe bereits ohne Fehler beantwortet wurden."""
+    done: Set[str] = set()
+    if not path.exists():
+        return done
+    with path.open(encoding="utf-8") as handle:
+        for line in handle:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # Abgebrochene letzte Zeile nach einem harten Abbruch.
+                continue
+            if record.get("error") is None and "id" in record:
+                done.add(str(record["id"]))
+    return done
+
+
+def _answer(router: AssistantRouter, item: BatchItem, fresh: bool) -> dict:
+    started = time.perf_counter()
+    record = {"id": item.id, "question": item.question, "image": str(item.image) if item.image else None}
+    # Eigener Kanal pro Frage: parallele Fragen ersetzen sich nicht, lassen sich aber gesammelt abbrechen.
+    # Batch-Fragen sind unabhängig: kein Verlauf im Prompt, nichts im Gesprächsgedächtnis.
+    channel = f"batch:{item.id}"
+    try:
+        if item.image is not None:
+            with Image.open(item.image) as image:
+                encoded = prepare_image(image)
+            answer = router.handle_vision(
+                item.question, encoded, fresh=fresh, channel=channel, speak_answer=False, record=False
+            )
+        else:
+            answer = router.handle_text(
+                item.question, fresh=fresh, channel=channel, speak_answer=False, record=False
+            )
+        record.update(answer=answer, error=None)
+    except Exception as exc:
+        _logger.exception("Batch-Frage %s fehlgeschlagen", item.id)
+        record.update(answer=None, error=f"{type(exc).__name__}: {exc}")
+    record["latency_s"] = round(time.perf_counter() - started, 3)
+    record["completed_at"] = datetime.now().isoformat(timespec="seconds")
+    return record
+
+
+def run_batch(
+    router: AssistantRouter,
+    items: Iterator[BatchItem],
+    output: IO[str],
+    *,
+    concurrency: int = LLM_MAX_CONCURRENCY,
+    skip: Optional[Set[str]] = None,
+    fresh: bool = False,
+) -> Dict[str, int]:
+    """Beantwortet ``items`` mit höchstens ``concurrency`` gleichzeitigen Anfragen.
+
+    Die Eingabe wird erst gelesen, wenn ein Platz frei wird; jede Antwort wird
+    sofort geschrieben und geflusht, damit ``--resume`` nach einem Abbruch greift.
+    """
+    counts = {"ok": 0, "failed": 0, "skipped": 0}
+    skip = skip or set()
+    pending: Set[Future] = set()
+
+    def drain(block_until: int) -> None:
+        nonlocal pending
+        while len(pending) > block_until:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                record = future.result()
+                output.write(json.dumps(record, ensure_ascii=False) + "\n")
+                output.flush()
+                counts["failed" if record["error"] else "ok"] += 1
+
+    executor = ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="Batch")
+    try:
+        for item in items:
+            if item.id in skip:
+                counts["skipped"] += 1
+                continue
+            drain(max(1, concurrency) - 1)
+            pending.add(executor.submit(_answer, router, item, fresh))
+        drain(0)
+    except KeyboardInterrupt:
+        _logger.warning("Batch abgebrochen, %d laufende Anfragen werden verworfen", len(pending))
+        for future in pending:
+            future.cancel()
+        router.llm.cancel()
+        raise
+    except Exception:
+        _logger.exception("Batch-Eingabe fehlgeschlagen, %d laufende Anfragen werden noch abgeschlossen", len(pending))
+        drain(0)
+        raise
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+    return counts
+
+
+def main(argv: Optional[list] = None) -> int:
+    parser = argparse.ArgumentParser(description="KI-Kumpel Kommandozeile")
+    parser.add_argument("--batch", metavar="DATEI", help="Fragen aus Datei (JSONL oder Text/TSV), '-' für stdin")
+    parser.add_argument("--output", "-o", metavar="DATEI", help="Ziel-JSONL (Standard: stdout)")
+    parser.add_argument("--concurrency", "-j", type=int, default=LLM_MAX_CONCURRENCY, help="gleichzeitige Anfragen")
+    parser.add_argument("--resume", action="store_true", help="bereits beantwortete IDs in --output überspringen")
+    parser.add_argument("--fresh", action="store_true", help="Antwort-Cache umgehen")
+    parser.add_argument(
+        "--target",
+        choices=[target for target in CAPTURE_TARGETS if target != "region"],
+        default=CAPTURE_TARGET if CAPTURE_TARGET != "region" else "cursor",
+        help="Aufnahmeziel ohne --batch",
+    )
+    args = parser.parse_args(argv)
+
+    if not args.batch:
+        run_assistant(args.target)
+        return 0
+    if args.resume and not args.output:
+        parser.error("--resume benötigt --output")
+
+    router = AssistantRouter()
+    output_path = Path(args.output) if args.output else None
+    skip = completed_ids(output_path) if args.resume and output_path else set()
+    if args.batch == "-":
+        source, base_dir = sys.stdin, Path.cwd()
+    else:
+        source, base_dir = open(args.batch, encoding="utf-8"), Path(args.batch).resolve().parent
+    output = output_path.open("a" if args.resume else "w", encoding="utf-8") if output_path else sys.stdout
+    started = time.perf_counter()
+    try:
+        counts = run_batch(
+            router,
+            read_batch(source, base_dir),
+            output,
+            concurrency=args.concurrency,
+            skip=skip,
+            fresh=args.fresh,
+        )
+    except KeyboardInterrupt:
+        return 130
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if output is not sys.stdout:
+            output.close()
+        router.cleanup()
+    print(
+        "Batch fertig in {:.1f} s: {} beantwortet, {} fehlgeschlagen, {} übersprungen".format(
+            time.perf_counter() - started, counts["ok"], counts["failed"], counts["skipped"]
+        ),
+        file=sys.stderr,
+    )
+    return 1 if counts["failed"] else 0
+
+
 if __name__ == "__main__":  # pragma: no cover - CLI Einstieg
-    run_assistant()
+    sys.exit(main())
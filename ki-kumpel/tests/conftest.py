@@ -0,0 +1,31 @@
+"""Gemeinsame Test-Einstellungen: Fake-LLM ohne Netzwerk und ohne Wartezeit."""
+import os
+import sys
+from pathlib import Path
+
+# Muss vor dem ersten Import von core.config gesetzt sein.
+os.environ.setdefault("KI_KUMPEL_LLM_BACKEND", "fake")
+os.environ.setdefault("KI_KUMPEL_FAKE_LLM_LATENCY_S", "0")
+os.environ.setdefault("KI_KUMPEL_FAKE_LLM_TOKEN_DELAY_S", "0")
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import pytest  # noqa: E402
+
+from core.screenshot_store import ScreenshotStore  # noqa: E402
+
+
+@pytest.fixture
+def router(tmp_path, monkeypatch):
+    """AssistantRouter mit Fake-LLM, dessen Datenbanken im Testverzeichnis liegen."""
+    from core.router import AssistantRouter
+
+    monkeypatch.setattr("memory.memory_db.MEMORY_DB_PATH", tmp_path / "memory.sqlite")
+    monkeypatch.setattr("core.response_cache.LLM_CACHE_PATH", tmp_path / "llm_cache.sqlite")
+    monkeypatch.setattr(
+        "core.screenshot_store._store", ScreenshotStore(tmp_path / "screenshots.sqlite", tmp_path / "screenshots")
+    )
+    monkeypatch.setattr("core.screenshot_writer._writer", None)
+    assistant = AssistantRouter()
+    yield assistant
+    assistant.cleanup()
@@ -0,0 +1,85 @@
+import io
+import json
+import re
+
+from src.assistant_core import completed_ids, read_batch, run_batch
+
+
+def _read(text, tmp_path):
+    return list(read_batch(io.StringIO(text), tmp_path))
+
+
+def test_read_batch_accepts_json_text_and_tsv(tmp_path):
+    items = _read(
+        '{"id": "a", "question": "Was ist CAD?"}\n'
+        "# Kommentar\n"
+        "\n"
+        "Was steht im Ticket?\tbild.png\n"
+        "Was steht im Ticket?\tbild.png\n",
+        tmp_path,
+    )
+    assert [item.question for item in items] == ["Was ist CAD?", "Was steht im Ticket?", "Was steht im Ticket?"]
+    assert items[0].id == "a"
+    assert items[1].image == tmp_path / "bild.png"
+    # Wiederholte Fragen ohne ID bekommen eigene IDs.
+    assert items[2].id == items[1].id + "#2"
+
+
+def test_read_batch_skips_malformed_lines_and_continues(tmp_path, caplog):
+    items = _read(
+        '{"id": "a", "question": "Erste Frage"}\n'
+        '{"id": "b", "question": \n'
+        '{"id": "c"}\n'
+        '{"id": "d", "question": "Letzte Frage"}\n',
+        tmp_path,
+    )
+    assert [item.id for item in items] == ["a", "d"]
+    assert "Batch-Zeile 2" in caplog.text
+    assert "Batch-Zeile 3" in caplog.text
+
+
+def test_run_batch_answers_without_shared_context(router, tmp_path):
+    output = io.StringIO()
+    items = _read(
+        '{"id": "1", "question": "Wie setze ich ein Passwort zurück?"}\n'
+        '{"id": "2", "question": "Wer ist für Backups zuständig?"}\n'
+        '{"id": "3", "question": "Und warum?"}\n',
+        tmp_path,
+    )
+    counts = run_batch(router, iter(items), output, concurrency=2)
+    records = [json.loads(line) for line in output.getvalue().splitlines()]
+
+    assert counts == {"ok": 3, "failed": 0, "skipped": 0}
+    assert sorted(record["id"] for record in records) == ["1", "2", "3"]
+    assert all(record["error"] is None and record["answer"] for record in records)
+    # Ohne Verlauf besteht jeder Prompt aus gleich vielen Nachrichten.
+    sizes = {re.search(r"aus (\d+) Nachrichten", record["answer"]).group(1) for record in records}
+    assert len(sizes) == 1
+    # Batch-Fragen landen weder im Gedächtnis noch im Gesprächskontext.
+    router.memory.flush()
+    assert router.memory.get_recent_interactions() == []
+    assert router._context_snapshot() == []
+
+
+def test_run_batch_skips_completed_ids(router, tmp_path):
+    previous = tmp_path / "antworten.jsonl"
+    previous.write_text(
+        json.dumps({"id": "1", "error": None}) + "\n" + json.dumps({"id": "2", "error": "Timeout"}) + "\n{abgebrochen",
+        encoding="utf-8",
+    )
+    skip = completed_ids(previous)
+    assert skip == {"1"}
+    output = io.StringIO()
+    items = _read('{"id": "1", "question": "A?"}\n{"id": "2", "question": "B?"}\n', tmp_path)
+    counts = run_batch(router, iter(items), output, skip=skip)
+    assert counts == {"ok": 1, "failed": 0, "skipped": 1}
+    assert json.loads(output.getvalue())["id"] == "2"
+
+
+def test_run_batch_records_failures_per_item(router, tmp_path):
+    output = io.StringIO()
+    items = _read("Was zeigt das Bild?\tfehlt.png\n", tmp_path)
+    counts = run_batch(router, iter(items), output)
+    record = json.loads(output.getvalue())
+    assert counts["failed"] == 1
+    assert record["answer"] is None and record["error"].startswith("FileNotFoundError")
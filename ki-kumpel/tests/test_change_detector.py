@@ -0,0 +1,66 @@
+from types import SimpleNamespace
+
+from PIL import Image, ImageDraw
+
+from core.capture_scheduler import ChangeDetector
+
+WIDTH, HEIGHT = 1280, 720
+
+
+def _screen(lines, cursor=False):
+    image = Image.new("RGB", (WIDTH, HEIGHT), "white")
+    draw = ImageDraw.Draw(image)
+    for row, text in enumerate(lines):
+        draw.text((40, 40 + row * 18), text, fill="black")
+    if cursor:
+        draw.line((40, 400, 40, 414), fill="black")
+    return SimpleNamespace(bgra=image.convert("RGBA").tobytes("raw", "BGRA"), width=WIDTH, height=HEIGHT)
+
+
+BASE = [f"Ticket {number}: Drucker im 2. OG meldet Papierstau" for number in range(20)]
+
+
+def test_first_frame_counts_as_change():
+    assert ChangeDetector().changed(1, _screen(BASE))
+
+
+def test_identical_frame_is_unchanged():
+    detector = ChangeDetector()
+    detector.changed(1, _screen(BASE))
+    assert not detector.changed(1, _screen(BASE))
+
+
+def test_one_typed_line_is_detected():
+    detector = ChangeDetector()
+    detector.changed(1, _screen(BASE))
+    assert detector.changed(1, _screen(BASE + ["Rückruf bis 10 Uhr zugesagt"]))
+
+
+def test_edited_word_in_existing_line_is_detected():
+    detector = ChangeDetector()
+    detector.changed(1, _screen(BASE))
+    edited = list(BASE)
+    edited[7] = edited[7].replace("Papierstau", "Tonerfehler")
+    assert detector.changed(1, _screen(edited))
+
+
+def test_blinking_cursor_alone_is_ignored():
+    detector = ChangeDetector()
+    detector.changed(1, _screen(BASE))
+    assert not detector.changed(1, _screen(BASE, cursor=True))
+
+
+def test_reference_only_moves_on_change():
+    detector = ChangeDetector()
+    detector.changed(1, _screen(BASE))
+    detector.changed(1, _screen(BASE, cursor=True))
+    # Der Cursor war zu klein für eine Änderung; mit einer neuen Zeile zählt er nicht doppelt.
+    assert detector.changed(1, _screen(BASE + ["Neue Zeile"], cursor=True))
+    assert not detector.changed(1, _screen(BASE + ["Neue Zeile"], cursor=True))
+
+
+def test_monitors_are_tracked_separately():
+    detector = ChangeDetector()
+    detector.changed(1, _screen(BASE))
+    assert detector.changed(2, _screen(BASE))
+    assert not detector.changed(1, _screen(BASE))
@@ -0,0 +1,65 @@
+from memory.fact_index import FactIndex
+from memory.memory_db import Fact
+
+
+def _fact(fact_id, text, importance=1, source="manual"):
+    return Fact("2024-01-01T00:00:00", source, text, importance, fact_id)
+
+
+def _index(*facts):
+    index = FactIndex()
+    index.add_many(facts)
+    return index
+
+
+def test_matching_fact_ranks_first():
+    index = _index(
+        _fact(1, "Backups laufen jede Nacht um zwei Uhr."),
+        _fact(2, "CAD-Fälle müssen vor 10 Uhr gemeldet werden."),
+        _fact(3, "Dispatch antwortet innerhalb einer Stunde."),
+    )
+    results = index.search("Wann werden CAD-Fälle gemeldet?", limit=2)
+    assert results[0][1].id == 2
+
+
+def test_rare_token_outweighs_common_token():
+    index = _index(
+        _fact(1, "Uhr Uhr Drucker"),
+        _fact(2, "Uhr Server"),
+        _fact(3, "Uhr Netzwerk"),
+    )
+    results = index.search("Uhr Drucker", limit=3)
+    assert [fact.id for _score, fact in results][0] == 1
+    assert index.document_frequency("uhr") == 3
+
+
+def test_without_token_match_falls_back_to_importance():
+    index = _index(
+        _fact(1, "Alpha", importance=1),
+        _fact(2, "Beta", importance=4),
+        _fact(3, "Gamma", importance=2, source="interaction:2024"),  # +1 für Interaktionen
+    )
+    results = index.search("unbekannt", limit=3)
+    assert [fact.id for _score, fact in results] == [2, 3, 1]
+
+
+def test_remove_drops_postings_and_lengths():
+    index = _index(_fact(1, "Backups sind Pflicht"), _fact(2, "Backups prüfen"))
+    index.remove(1)
+    assert len(index) == 1
+    assert 1 not in index
+    assert index.document_frequency("pflicht") == 0
+    assert [fact.id for _score, fact in index.search("Backups Pflicht")] == [2]
+
+
+def test_duplicates_and_facts_without_id_are_ignored():
+    index = _index(_fact(1, "Backups"), _fact(1, "Backups doppelt"), _fact(None, "ohne ID"))
+    assert len(index) == 1
+    assert index.get(1).fact == "Backups"
+
+
+def test_limit_and_empty_index():
+    assert FactIndex().search("egal") == []
+    index = _index(*(_fact(i, f"Fakt Nummer {i}") for i in range(1, 11)))
+    assert len(index.search("Fakt", limit=3)) == 3
+    assert index.search("Fakt", limit=0) == []
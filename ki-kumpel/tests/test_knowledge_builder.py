@@ -0,0 +1,41 @@
+import pytest
+
+from memory.knowledge_builder import KnowledgeBuilder
+from memory.memory_db import MemoryDB
+
+
+@pytest.fixture
+def db(tmp_path):
+    database = MemoryDB(tmp_path / "memory.sqlite")
+    yield database
+    database.close()
+
+
+def test_failed_store_is_retried_on_next_refresh(db, monkeypatch):
+    db.add_interaction("user", "Berichte müssen immer bis Freitag raus.", durable=True)
+    builder = KnowledgeBuilder(db)
+    original = db.add_facts
+
+    def broken(records):
+        raise RuntimeError("Platte voll")
+
+    monkeypatch.setattr(db, "add_facts", broken)
+    with pytest.raises(RuntimeError):
+        builder.refresh_facts()
+    monkeypatch.setattr(db, "add_facts", original)
+
+    stored = builder.refresh_facts()
+    assert "Berichte müssen immer bis Freitag raus." in [fact.fact for fact in stored]
+    assert builder.watermark > 0
+
+
+def test_facts_are_loaded_once_for_seen_set_and_index(db, monkeypatch):
+    db.add_fact("manual", "Backups laufen nachts.")
+    calls = []
+    original = db.get_facts
+    monkeypatch.setattr(db, "get_facts", lambda *args: calls.append(1) or original(*args))
+
+    builder = KnowledgeBuilder(db)
+    builder.refresh_facts()
+    builder.get_relevant_facts("Backups")
+    assert len(calls) == 1
@@ -0,0 +1,110 @@
+import sqlite3
+import threading
+
+import pytest
+
+from memory.memory_db import MemoryDB
+
+
+@pytest.fixture
+def db(tmp_path):
+    database = MemoryDB(tmp_path / "memory.sqlite")
+    yield database
+    database.close()
+
+
+def _block_writer(db):
+    """Hält den Writer in einer Operation fest, bis das Event gesetzt wird."""
+    release = threading.Event()
+    started = threading.Event()
+
+    def op(conn):
+        started.set()
+        release.wait(5)
+
+    db._submit(op)
+    started.wait(5)
+    return release
+
+
+def test_queued_writes_are_committed_as_one_group(db, monkeypatch):
+    batches = []
+    commit = db._commit_batch
+    monkeypatch.setattr(db, "_commit_batch", lambda batch: batches.append(len(batch)) or commit(batch))
+
+    release = _block_writer(db)
+    turns = [db.add_interaction("user", f"Frage {number}") for number in range(10)]
+    release.set()
+    db.flush()
+
+    assert 11 in batches  # zehn Interaktionen plus der Flush-Marker
+    assert [turn.id for turn in turns] == sorted(turn.id for turn in turns)
+    assert all(turn.id for turn in turns)
+
+
+def test_failing_operation_does_not_discard_its_group(db):
+    release = _block_writer(db)
+
+    def broken(conn):
+        conn.execute("INSERT INTO nicht_vorhanden VALUES (1)")
+
+    failed = db._submit(broken)
+    turn = db.add_interaction("user", "bleibt erhalten")
+    release.set()
+    db.flush()
+
+    assert failed.exception() is not None
+    assert [interaction.content for interaction in db.get_recent_interactions()] == ["bleibt erhalten"]
+    assert turn.id is not None
+
+
+def test_durable_write_raises_write_errors(db):
+    db._submit(lambda conn: conn.execute("DROP TABLE interactions")).result()
+    with pytest.raises(sqlite3.OperationalError):
+        db.add_interaction("user", "geht verloren", durable=True)
+
+
+def test_writes_after_close_fail_without_blocking(tmp_path):
+    db = MemoryDB(tmp_path / "memory.sqlite")
+    db.add_interaction("user", "vor dem Schließen")
+    db.close()
+
+    with pytest.raises(RuntimeError):
+        db.add_interaction("user", "nach dem Schließen", durable=True)
+    assert db._submit(lambda conn: None).exception(timeout=1) is not None
+
+    reopened = MemoryDB(tmp_path / "memory.sqlite")
+    assert [turn.content for turn in reopened.get_recent_interactions()] == ["vor dem Schließen"]
+    reopened.close()
+
+
+def test_concurrent_writes_during_close_never_hang(tmp_path):
+    db = MemoryDB(tmp_path / "memory.sqlite")
+    futures = []
+    stop = threading.Event()
+
+    def spam():
+        while not stop.is_set():
+            futures.append(db._submit(lambda conn: None))
+
+    threads = [threading.Thread(target=spam) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    db.close()
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    for future in futures:
+        future.exception(timeout=1)  # wirft TimeoutError, falls ein Future hängen bleibt
+
+
+def test_iter_interactions_pages_through_all_rows(db, monkeypatch):
+    monkeypatch.setattr("memory.memory_db._ITER_PAGE_SIZE", 3)
+    for number in range(8):
+        db.add_interaction("user", f"Eintrag {number}")
+    db.flush()
+
+    contents = [turn.content for turn in db.iter_interactions()]
+    assert contents == [f"Eintrag {number}" for number in range(8)]
+    assert [turn.content for turn in db.iter_interactions(after_id=6)] == ["Eintrag 6", "Eintrag 7"]
@@ -0,0 +1,74 @@
+from core.prompt_builder import PromptBuilder, count_tokens, estimate_image_tokens
+
+SYSTEM = "Du bist ein hilfreicher Assistent."
+
+
+def test_everything_fits_small_prompt():
+    prompt = PromptBuilder(budget=1000).build(
+        SYSTEM, "Wie spät ist es?", facts=["Backups laufen nachts."], history=["USER: Hallo", "ASSISTANT: Hi"]
+    )
+    assert prompt.messages[0] == {"role": "system", "content": SYSTEM}
+    assert prompt.messages[-1] == {"role": "user", "content": "Wie spät ist es?"}
+    assert prompt.stats.facts_kept == 1
+    assert prompt.stats.history_kept == 2
+    assert prompt.stats.total <= prompt.stats.budget
+
+
+def test_long_question_is_truncated_to_half_the_budget():
+    question = "Wort " * 2000
+    prompt = PromptBuilder(budget=400).build(SYSTEM, question)
+    content = prompt.messages[-1]["content"]
+    assert content.endswith("…")
+    assert count_tokens(content) <= 200
+
+
+def test_image_tokens_are_reserved_before_history():
+    history = [f"USER: Beitrag Nummer {number} mit etwas Text" for number in range(30)]
+    builder = PromptBuilder(budget=1500)
+    without_image = builder.build(SYSTEM, "Was siehst du?", history=history)
+    image_tokens = estimate_image_tokens((1920, 1080))
+    with_image = builder.build(
+        SYSTEM, "Was siehst du?", history=history, image_url="data:image/png;base64,AAAA", image_tokens=image_tokens
+    )
+
+    assert with_image.stats.image == image_tokens
+    assert with_image.stats.history_kept < without_image.stats.history_kept
+    assert with_image.stats.total <= with_image.stats.budget
+    parts = with_image.messages[-1]["content"]
+    assert parts[0] == {"type": "text", "text": "Was siehst du?"}
+    assert parts[1]["type"] == "image_url"
+
+
+def test_image_tokens_follow_tile_scheme():
+    assert estimate_image_tokens((512, 512)) == 85 + 170
+    # 1920x1080 → 1365x768 → 3x2 Kacheln
+    assert estimate_image_tokens((1920, 1080)) == 85 + 170 * 6
+    assert estimate_image_tokens((0, 0)) == 85
+
+
+def test_history_keeps_recent_and_relevant_entries_in_order():
+    history = ["USER: Drucker im 2. OG klemmt"] + [f"USER: Smalltalk {n} über das Wetter heute" for n in range(20)]
+    builder = PromptBuilder(budget=260, fact_share=0, style_share=0)
+    prompt = builder.build(SYSTEM, "Was ist mit dem Drucker?", history=history)
+
+    kept = prompt.history_indices
+    assert 0 in kept  # Wortüberschneidung mit der Frage
+    assert kept[-4:] == [17, 18, 19, 20]  # die jüngsten Beiträge
+    assert kept == sorted(kept)
+    assert prompt.stats.history_dropped == len(history) - len(kept) > 0
+    assert prompt.stats.total <= prompt.stats.budget
+
+
+def test_single_long_history_entry_is_capped():
+    history = ["USER: " + "sehr lang " * 500, "USER: kurz"]
+    prompt = PromptBuilder(budget=800, fact_share=0, style_share=0).build(SYSTEM, "Frage", history=history)
+    assert prompt.stats.history_truncated == 1
+    assert prompt.stats.history_kept == 2
+
+
+def test_facts_are_limited_to_their_share():
+    facts = [f"Fakt Nummer {number} mit einigen zusätzlichen Wörtern" for number in range(50)]
+    prompt = PromptBuilder(budget=1000, fact_share=0.1).build(SYSTEM, "Frage", facts=facts)
+    assert prompt.stats.facts <= 100
+    assert prompt.stats.facts_kept + prompt.stats.facts_dropped == 50
+    assert prompt.stats.facts_dropped > 0
@@ -0,0 +1,147 @@
+import threading
+from concurrent.futures import CancelledError
+
+import pytest
+
+from core.request_scheduler import Priority, RequestScheduler
+
+
+@pytest.fixture
+def make_scheduler():
+    schedulers = []
+
+    def make(**kwargs):
+        scheduler = RequestScheduler(**kwargs)
+        schedulers.append(scheduler)
+        return scheduler
+
+    yield make
+    for scheduler in schedulers:
+        scheduler.shutdown(timeout=2)
+
+
+def _occupy(scheduler, priority=Priority.INTERACTIVE, key=None):
+    """Belegt einen Worker, bis das gelieferte Event gesetzt wird."""
+    started, release = threading.Event(), threading.Event()
+
+    def job():
+        started.set()
+        release.wait(5)
+
+    future = scheduler.submit(job, priority=priority, key=key)
+    assert started.wait(5)
+    return release, future
+
+
+def test_jobs_run_by_priority_then_arrival(make_scheduler):
+    scheduler = make_scheduler(workers=1, reserved=0)
+    release, _ = _occupy(scheduler)
+    order = []
+    futures = [
+        scheduler.submit(order.append, name, priority=priority)
+        for name, priority in [
+            ("wartung", Priority.MAINTENANCE),
+            ("aufnahme", Priority.CAPTURE),
+            ("text-1", Priority.INTERACTIVE),
+            ("vision", Priority.VISION),
+            ("text-2", Priority.INTERACTIVE),
+        ]
+    ]
+    release.set()
+    for future in futures:
+        future.result(timeout=5)
+    assert order == ["text-1", "text-2", "vision", "aufnahme", "wartung"]
+
+
+def test_background_work_leaves_reserved_worker_free(make_scheduler):
+    scheduler = make_scheduler(workers=2, reserved=1)
+    release, _ = _occupy(scheduler, Priority.MAINTENANCE)
+    waiting = scheduler.submit(lambda: "aufnahme", priority=Priority.CAPTURE)
+    # Der zweite Worker ist reserviert: die Nutzerfrage läuft sofort, die Aufnahme wartet.
+    assert scheduler.submit(lambda: "frage").result(timeout=5) == "frage"
+    assert not waiting.done()
+    assert scheduler.queue_depth()["capture"] == 1
+    release.set()
+    assert waiting.result(timeout=5) == "aufnahme"
+
+
+def test_same_key_supersedes_queued_and_reports_running(make_scheduler):
+    superseded = []
+    scheduler = make_scheduler(workers=1, reserved=0, on_supersede=superseded.append)
+    release, running = _occupy(scheduler, key="chat")
+    queued = scheduler.submit(lambda: "alt", key="chat")
+    latest = scheduler.submit(lambda: "neu", key="chat")
+    assert queued.cancelled()
+    assert superseded == ["chat", "chat"]
+    release.set()
+    assert latest.result(timeout=5) == "neu"
+    with pytest.raises(CancelledError):
+        queued.result()
+    assert scheduler.stats()["interactive"].superseded == 1
+
+
+def test_other_keys_are_not_superseded(make_scheduler):
+    scheduler = make_scheduler(workers=1, reserved=0)
+    release, _ = _occupy(scheduler)
+    first = scheduler.submit(lambda: 1, key="batch:1")
+    second = scheduler.submit(lambda: 2, key="batch:2")
+    release.set()
+    assert (first.result(timeout=5), second.result(timeout=5)) == (1, 2)
+
+
+def test_exceptions_reach_the_future(make_scheduler):
+    scheduler = make_scheduler(workers=1, reserved=0)
+
+    def fail():
+        raise ValueError("kaputt")
+
+    with pytest.raises(ValueError):
+        scheduler.submit(fail).result(timeout=5)
+    assert scheduler.stats()["interactive"].failed == 1
+
+
+def test_shutdown_cancels_pending_and_rejects_new_jobs(make_scheduler):
+    scheduler = make_scheduler(workers=1, reserved=0)
+    release, running = _occupy(scheduler)
+    pending = scheduler.submit(lambda: None, priority=Priority.MAINTENANCE)
+    release.set()
+    scheduler.shutdown(timeout=5)
+    assert pending.cancelled()
+    assert running.done()
+    with pytest.raises(RuntimeError):
+        scheduler.submit(lambda: None)
+
+
+def test_running_job_is_flagged_when_superseded(make_scheduler):
+    scheduler = make_scheduler(workers=2, reserved=0)
+    started, release = threading.Event(), threading.Event()
+
+    def job():
+        started.set()
+        release.wait(5)
+        return scheduler.cancelled()
+
+    first = scheduler.submit(job, key="chat")
+    other = scheduler.submit(lambda: scheduler.cancelled(), key="tray")
+    assert started.wait(5)
+    assert other.result(timeout=5) is False
+    scheduler.submit(lambda: None, key="chat")
+    release.set()
+    assert first.result(timeout=5) is True
+    assert scheduler.cancelled() is False  # außerhalb eines Auftrags
+
+
+def test_cancel_flags_running_job(make_scheduler):
+    scheduler = make_scheduler(workers=1, reserved=0)
+    started, release = threading.Event(), threading.Event()
+
+    def job():
+        started.set()
+        release.wait(5)
+        return scheduler.cancelled()
+
+    future = scheduler.submit(job, key="chat")
+    assert started.wait(5)
+    scheduler.cancel("chat")
+    release.set()
+    assert future.result(timeout=5) is True
@@ -0,0 +1,160 @@
+import asyncio
+
+import pytest
+
+from core.fake_llm import FakeLLMBackend, InjectedError
+from core.resilience import CircuitBreaker, CircuitOpenError, ResilientBackend, TransientError, is_retryable
+
+MODEL = "gpt-4o-mini"
+MESSAGES = [{"role": "user", "content": "Hallo"}]
+
+
+class ScriptedBackend:
+    """Backend, das pro Aufruf ein vorgegebenes Verhalten abspielt."""
+
+    def __init__(self, *steps):
+        # Schritt: Exception-Instanz oder (Verzögerung, Antwort)
+        self.steps = list(steps)
+        self.calls = 0
+        self.closed_streams = 0
+
+    def _next(self):
+        step = self.steps[min(self.calls, len(self.steps) - 1)]
+        self.calls += 1
+        return step
+
+    async def complete(self, model, messages, temperature, timeout=None):
+        step = self._next()
+        if isinstance(step, BaseException):
+            raise step
+        delay, answer = step
+        await asyncio.sleep(delay)
+        return answer
+
+    async def stream(self, model, messages, temperature):
+        step = self._next()
+        try:
+            if isinstance(step, BaseException):
+                raise step
+            delay, answer = step
+            await asyncio.sleep(delay)
+            for word in answer.split():
+                yield word
+        finally:
+            self.closed_streams += 1
+
+    async def aclose(self):
+        return None
+
+
+def _resilient(inner, **kwargs):
+    kwargs.setdefault("retries", 3)
+    kwargs.setdefault("base_delay", 0)
+    kwargs.setdefault("hedge", False)
+    kwargs.setdefault("breaker", CircuitBreaker(failure_threshold=2, reset_after=60))
+    return ResilientBackend(inner, **kwargs)
+
+
+async def _collect(stream):
+    return [delta async for delta in stream]
+
+
+def test_fake_errors_are_retryable_without_special_casing():
+    assert issubclass(InjectedError, TransientError)
+    assert is_retryable(InjectedError("x"))
+    assert not is_retryable(ValueError("x"))
+
+
+def test_transient_errors_are_retried_until_success():
+    inner = ScriptedBackend(TransientError("1"), TransientError("2"), (0, "Antwort"))
+    backend = _resilient(inner)
+    assert asyncio.run(backend.complete(MODEL, MESSAGES, 0.3)) == "Antwort"
+    assert inner.calls == 3
+    assert backend.counters["retries"] == 2
+    assert backend.breaker.state == "closed"
+
+
+def test_other_errors_are_not_retried():
+    inner = ScriptedBackend(ValueError("kaputt"))
+    backend = _resilient(inner)
+    with pytest.raises(ValueError):
+        asyncio.run(backend.complete(MODEL, MESSAGES, 0.3))
+    assert inner.calls == 1
+
+
+def test_breaker_counts_one_failure_per_request():
+    inner = ScriptedBackend(TransientError("down"))
+    backend = _resilient(inner)
+
+    with pytest.raises(TransientError):
+        asyncio.run(backend.complete(MODEL, MESSAGES, 0.3))
+    assert inner.calls == 4
+    assert backend.breaker.state == "closed"
+
+    with pytest.raises(TransientError):
+        asyncio.run(backend.complete(MODEL, MESSAGES, 0.3))
+    assert backend.breaker.state == "open"
+
+    with pytest.raises(CircuitOpenError):
+        asyncio.run(backend.complete(MODEL, MESSAGES, 0.3))
+    assert inner.calls == 8
+    assert backend.counters["rejected"] == 1
+
+
+def test_probe_keeps_retrying_and_closes_breaker():
+    breaker = CircuitBreaker(failure_threshold=1, reset_after=0.01)
+    inner = ScriptedBackend(TransientError("down"), TransientError("down"), TransientError("still"), (0, "ok"))
+    backend = _resilient(inner, retries=1, breaker=breaker)
+
+    with pytest.raises(TransientError):
+        asyncio.run(backend.complete(MODEL, MESSAGES, 0.3))
+    assert breaker.state == "open"
+
+    asyncio.run(asyncio.sleep(0.02))
+    # Die Probe darf ihre eigenen Wiederholungen ausschöpfen.
+    assert asyncio.run(backend.complete(MODEL, MESSAGES, 0.3)) == "ok"
+    assert breaker.state == "closed"
+
+
+def test_stream_is_retried_before_the_first_chunk():
+    inner = ScriptedBackend(TransientError("1"), (0, "eins zwei drei"))
+    backend = _resilient(inner)
+    assert asyncio.run(_collect(backend.stream(MODEL, MESSAGES, 0.3))) == ["eins", "zwei", "drei"]
+    assert backend.counters["retries"] == 1
+    assert inner.closed_streams == 2
+
+
+def test_slow_completion_is_hedged():
+    inner = ScriptedBackend((1.0, "langsam"), (0, "schnell"))
+    backend = _resilient(inner, hedge=True, hedge_min_delay=0.01)
+    for _ in range(20):
+        backend.latency.record(0.01)
+    assert asyncio.run(backend.complete(MODEL, MESSAGES, 0.3)) == "schnell"
+    assert backend.counters["hedges"] == 1
+    assert backend.counters["hedge_wins"] == 1
+
+
+def test_slow_stream_is_hedged_on_first_chunk():
+    inner = ScriptedBackend((1.0, "langsam"), (0, "schnell und fertig"))
+    backend = _resilient(inner, hedge=True, hedge_min_delay=0.01)
+    for _ in range(20):
+        backend.first_token.record(0.01)
+    assert asyncio.run(_collect(backend.stream(MODEL, MESSAGES, 0.3))) == ["schnell", "und", "fertig"]
+    assert backend.counters["hedges"] == 1
+    assert backend.counters["hedge_wins"] == 1
+    assert inner.closed_streams == 2
+
+
+def test_stream_without_hedge_history_is_not_hedged():
+    inner = ScriptedBackend((0.05, "eins zwei"))
+    backend = _resilient(inner, hedge=True, hedge_min_delay=0.01)
+    assert asyncio.run(_collect(backend.stream(MODEL, MESSAGES, 0.3))) == ["eins", "zwei"]
+    assert backend.counters["hedges"] == 0
+    assert len(backend.first_token) == 1
+
+
+def test_fake_backend_with_errors_still_answers():
+    backend = _resilient(FakeLLMBackend(latency=0, token_delay=0, error_rate=0.5, seed=1), retries=10)
+    answers = [asyncio.run(backend.complete(MODEL, MESSAGES, 0.3)) for _ in range(5)]
+    assert len(set(answers)) == 1
+    assert backend.counters["retries"] > 0
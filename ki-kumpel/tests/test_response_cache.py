@@ -0,0 +1,133 @@
+import time
+
+import pytest
+from PIL import Image, ImageDraw
+
+import core.llm_client as llm_client
+from core.llm_client import LLMClient
+from core.response_cache import _EVICT_INTERVAL, ResponseCache
+
+MODEL = "gpt-4o-mini"
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setattr("core.response_cache.LLM_CACHE_PATH", tmp_path / "llm_cache.sqlite")
+    instance = LLMClient()
+    yield instance
+    instance.close()
+
+
+def _messages(*history):
+    return (
+        [{"role": "system", "content": "System"}]
+        + [{"role": "system", "content": entry} for entry in history]
+        + [{"role": "user", "content": "Und warum?"}]
+    )
+
+
+def test_key_ignores_whitespace_and_case():
+    plain = [{"role": "user", "content": "Wie  spät ist es?"}]
+    shouted = [{"role": "user", "content": " wie spät IST es? "}]
+    assert ResponseCache.make_key(MODEL, 0.3, plain) == ResponseCache.make_key(MODEL, 0.3, shouted)
+
+
+def test_key_depends_on_history_model_temperature_and_image():
+    base = ResponseCache.make_key(MODEL, 0.3, _messages("USER: Drucker kaputt"))
+    assert base != ResponseCache.make_key(MODEL, 0.3, _messages("USER: VPN geht nicht"))
+    assert base != ResponseCache.make_key("gpt-4o", 0.3, _messages("USER: Drucker kaputt"))
+    assert base != ResponseCache.make_key(MODEL, 0.7, _messages("USER: Drucker kaputt"))
+    assert base != ResponseCache.make_key(MODEL, 0.3, _messages("USER: Drucker kaputt"), "abc")
+
+
+def test_follow_up_with_other_history_is_not_served_from_cache(client):
+    first = client.ask_text("Und warum?", context_messages=["USER: Der Drucker ist offline"])
+    second = client.ask_text("Und warum?", context_messages=["USER: Das VPN bricht ab"])
+    again = client.ask_text("Und warum?", context_messages=["USER: Der Drucker ist offline"])
+    assert first != second
+    assert again == first
+    stats = client.cache.stats()
+    assert stats.hits == 1 and stats.misses == 2
+
+
+def test_repeated_question_hits_despite_timestamps_and_older_history(client):
+    older = ["USER (2024-05-01T09:00:00): Hallo", "ASSISTANT (2024-05-01T09:00:01): Hallo zurück"]
+    tail = ["USER ({ts}): Der Drucker ist offline", "ASSISTANT ({ts}): Bitte neu starten"]
+
+    first = client.ask_text("Und warum?", context_messages=[entry.format(ts="2024-05-01T10:00:00") for entry in tail])
+    again = client.ask_text(
+        "Und warum?", context_messages=older + [entry.format(ts="2024-05-02T08:15:00") for entry in tail]
+    )
+    other = client.ask_text(
+        "Und warum?", context_messages=[entry.format(ts="2024-05-02T08:15:00") for entry in tail[:1]]
+    )
+    assert again == first
+    assert other != first
+    stats = client.cache.stats()
+    assert stats.hits == 1 and stats.misses == 2
+
+
+def test_history_is_never_dropped_from_the_key(client, monkeypatch):
+    monkeypatch.setattr(llm_client, "LLM_CACHE_INCLUDE_HISTORY", False)
+    with_history = client._text_request("Und warum?", 0.3, context_messages=["USER: x"], facts=None, style_examples=None)
+    without = client._text_request("Und warum?", 0.3, context_messages=None, facts=None, style_examples=None)
+    assert with_history.cache_key is None
+    assert without.cache_key is not None
+
+
+def test_vision_answer_reused_only_for_identical_image(client):
+    screen = Image.new("RGB", (640, 360), "white")
+    ImageDraw.Draw(screen).text((20, 20), "Ticket 4711: Drucker offline", fill="black")
+    other = screen.copy()
+    ImageDraw.Draw(other).text((20, 40), "Ticket 4712: VPN bricht ab", fill="black")
+
+    first = client.ask_vision("Was steht da?", screen, facts=["Alter Fakt"])
+    reused = client.ask_vision("Was steht da?", screen, facts=["Neuer Fakt"])
+    fresh = client.ask_vision("Was steht da?", other, facts=["Neuer Fakt"])
+    assert reused == first
+    assert fresh != first
+    assert client.cache.stats().similar_hits == 1
+
+
+def test_least_recently_used_entry_is_evicted(tmp_path):
+    cache = ResponseCache(tmp_path / "cache.sqlite", max_entries=2, ttl_seconds=0)
+    cache.put("a", MODEL, "A")
+    cache.put("b", MODEL, "B")
+    assert cache.get("a") == "A"
+    cache.put("c", MODEL, "C")
+    assert cache.get("b") is None
+    assert cache.get("a") == "A" and cache.get("c") == "C"
+    cache.close()
+
+
+def test_expired_entry_is_a_miss(tmp_path):
+    cache = ResponseCache(tmp_path / "cache.sqlite", ttl_seconds=0.05)
+    cache.put("a", MODEL, "A")
+    time.sleep(0.1)
+    assert cache.get("a") is None
+    assert cache.stats().expired >= 1
+    cache.close()
+
+
+def test_cleanup_runs_only_periodically_below_the_limit(tmp_path):
+    cache = ResponseCache(tmp_path / "cache.sqlite", max_entries=1000, ttl_seconds=3600)
+    statements = []
+    cache._conn.set_trace_callback(statements.append)
+    for number in range(_EVICT_INTERVAL - 1):
+        cache.put(f"k{number}", MODEL, "A")
+    assert not [sql for sql in statements if "COUNT(*)" in sql or "DELETE" in sql]
+    cache.put("last", MODEL, "A")
+    assert len([sql for sql in statements if "COUNT(*)" in sql]) == 1
+    cache.close()
+
+
+def test_eviction_leaves_headroom_and_drops_orphaned_image_rows(tmp_path):
+    cache = ResponseCache(tmp_path / "cache.sqlite", max_entries=20, ttl_seconds=0)
+    for number in range(21):
+        cache.put(f"k{number}", MODEL, "A", question_key="q", image_hash=f"h{number}")
+    stats = cache.stats()
+    assert stats.entries == 20 - 20 // 10
+    assert cache.find_same_image("q", "h0") is None
+    rows = cache._conn.execute("SELECT COUNT(*) FROM llm_cache_image").fetchone()[0]
+    assert rows == stats.entries
+    cache.close()
@@ -0,0 +1,54 @@
+import threading
+
+import pytest
+
+from core.llm_client import RequestCancelledError
+
+
+def test_job_superseded_before_its_llm_call_never_reaches_the_llm(router, monkeypatch):
+    gathering, release = threading.Event(), threading.Event()
+    gather_facts = router._gather_facts
+
+    def slow_gather(query):
+        if query == "erste Frage":
+            gathering.set()
+            release.wait(5)
+        return gather_facts(query)
+
+    asked = []
+    ask_text = router.llm.ask_text
+    monkeypatch.setattr(router, "_gather_facts", slow_gather)
+    monkeypatch.setattr(router.llm, "ask_text", lambda question, **kwargs: asked.append(question) or ask_text(question, **kwargs))
+
+    first = router.submit_text("erste Frage", speak_answer=False)
+    assert gathering.wait(5)
+    second = router.submit_text("zweite Frage", speak_answer=False)
+    assert "zweite Frage" in second.result(timeout=5)
+    release.set()
+
+    with pytest.raises(RequestCancelledError):
+        first.result(timeout=5)
+    assert asked == ["zweite Frage"]
+    router.memory.flush()
+    assert [turn.content for turn in router.memory.get_recent_interactions() if turn.role == "user"] == ["zweite Frage"]
+
+
+def test_answer_finished_after_supersede_is_not_delivered(router, monkeypatch):
+    answering, release = threading.Event(), threading.Event()
+    ask_text = router.llm.ask_text
+
+    def slow_ask(question, **kwargs):
+        answer = ask_text(question, **kwargs)
+        if question == "erste Frage":
+            answering.set()
+            release.wait(5)
+        return answer
+
+    monkeypatch.setattr(router.llm, "ask_text", slow_ask)
+    first = router.submit_text("erste Frage", speak_answer=False)
+    assert answering.wait(5)
+    router.submit_text("zweite Frage", speak_answer=False).result(timeout=5)
+    release.set()
+
+    with pytest.raises(RequestCancelledError):
+        first.result(timeout=5)
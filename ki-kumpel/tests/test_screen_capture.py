@@ -0,0 +1,17 @@
+import threading
+
+from core import screen_capture
+
+
+def test_each_thread_gets_its_own_mss_instance(monkeypatch):
+    monkeypatch.setattr(screen_capture, "_sct_local", threading.local())
+    monkeypatch.setattr(screen_capture.mss, "mss", object)
+
+    main = screen_capture._grabber()
+    other = []
+    thread = threading.Thread(target=lambda: other.append(screen_capture._grabber()))
+    thread.start()
+    thread.join()
+
+    assert screen_capture._grabber() is main
+    assert other[0] is not main
@@ -0,0 +1,37 @@
+import os
+
+from memory.style_profile import StyleProfileCache
+
+
+def _write(path, text, mtime_ns):
+    path.write_text(text, encoding="utf-8")
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def test_cache_reloads_when_a_sample_is_overwritten_in_place(tmp_path, monkeypatch):
+    monkeypatch.setattr("memory.style_profile.STYLE_SAMPLE_DIR", tmp_path)
+    sample = tmp_path / "mail.txt"
+    _write(sample, "Hallo Team,\nbitte Ticket A prüfen.\nViele Grüße\nEren", 1_000_000_000)
+    directory_mtime = tmp_path.stat().st_mtime_ns
+
+    cache = StyleProfileCache()
+    first = cache.get()
+    assert cache.get() is first
+    assert first.examples == ["bitte Ticket A prüfen."]
+
+    _write(sample, "Hallo Team,\nbitte Ticket B prüfen.\nViele Grüße\nEren", 2_000_000_000)
+    assert tmp_path.stat().st_mtime_ns == directory_mtime
+    assert cache.get().examples == ["bitte Ticket B prüfen."]
+
+
+def test_cache_notices_new_and_removed_samples(tmp_path, monkeypatch):
+    monkeypatch.setattr("memory.style_profile.STYLE_SAMPLE_DIR", tmp_path)
+    cache = StyleProfileCache()
+    assert cache.get().examples == []
+
+    extra = tmp_path / "neu.txt"
+    _write(extra, "Hallo,\nneues Beispiel.\nGrüße\nEren", 1_000_000_000)
+    assert cache.get().examples == ["neues Beispiel."]
+
+    extra.unlink()
+    assert cache.get().examples == []
@@ -0,0 +1,72 @@
+import pytest
+
+from memory.vector_store import KIND_FACT, KIND_INTERACTION, VectorStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    vectors = VectorStore(tmp_path / "memory", dim=256, initial_capacity=4)
+    yield vectors
+    vectors.close()
+
+
+def _fill(store):
+    store.add_many(
+        [
+            (KIND_FACT, 1, "Backups laufen jede Nacht"),
+            (KIND_FACT, 2, "Backup-Bänder werden freitags getauscht"),
+            (KIND_FACT, 3, "Backups prüft der Dispatch"),
+            (KIND_INTERACTION, 7, "Wie laufen die Backups?"),
+        ]
+    )
+
+
+def test_discarded_rows_are_masked_before_top_k(store):
+    _fill(store)
+    store.discard([(KIND_FACT, 1)])
+    hits = store.search("Backups", limit=2, kind=KIND_FACT, min_score=0)
+    assert len(hits) == 2
+    assert {key for _score, _kind, key in hits} == {2, 3}
+    assert store.stale == 1
+    assert (KIND_FACT, 1) not in store
+
+
+def test_kind_filter_excludes_other_kinds(store):
+    _fill(store)
+    hits = store.search("Backups", limit=10, kind=KIND_INTERACTION, min_score=0)
+    assert [(kind, key) for _score, kind, key in hits] == [(KIND_INTERACTION, 7)]
+
+
+def test_compact_removes_stale_rows_and_keeps_search_results(store):
+    _fill(store)
+    before = store.search("Backups prüft der Dispatch", limit=1, kind=KIND_FACT)
+    assert store.discard([(KIND_FACT, 1), (KIND_INTERACTION, 7)]) == 2
+    assert store.compact() == 2
+    assert store.stale == 0
+    assert len(store) == 2
+    assert sorted(store.keys(KIND_FACT)) == [2, 3]
+    assert store.search("Backups prüft der Dispatch", limit=1, kind=KIND_FACT)[0][2] == before[0][2]
+    assert store.compact() == 0
+
+
+def test_stale_rows_survive_reopen_until_compacted(tmp_path):
+    store = VectorStore(tmp_path / "memory", dim=256, initial_capacity=4)
+    _fill(store)
+    store.discard([(KIND_FACT, 2)])
+    store.close()
+
+    reopened = VectorStore(tmp_path / "memory", dim=256)
+    assert len(reopened) == 3
+    assert reopened.stale == 1
+    assert 2 not in {key for _score, _kind, key in reopened.search("Backup", limit=10, min_score=0)}
+    # Neue Einträge landen hinter den veralteten Zeilen, nicht darauf.
+    reopened.add_many([(KIND_FACT, 9, "Neuer Fakt")])
+    assert (KIND_FACT, 9) in reopened and (KIND_FACT, 3) in reopened
+    reopened.close()
+
+
+def test_growth_keeps_existing_rows(store):
+    store.add_many((KIND_FACT, key, f"Fakt {key}") for key in range(1, 11))
+    assert len(store) == 10
+    assert store.max_key(KIND_FACT) == 10
+    assert store.search("Fakt 7", limit=1, kind=KIND_FACT)[0][2] == 7
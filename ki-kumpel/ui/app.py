@@ -1,18 +1,31 @@
 """Hauptanwendung für den KI-Kumpel."""
 from __future__ import annotations
 
-import threading
 import tkinter as tk
+from concurrent.futures import Future
+from functools import partial
 from tkinter import ttk
 
-from core.config import AUTO_SCREENSHOT_INTERVAL_MS
+from core.capture_scheduler import AutoCaptureScheduler
+from core.config import CAPTURE_TARGET, STREAM_RESPONSES
 from core.logger import get_logger
+from core.llm_client import RequestCancelledError
+from core.request_scheduler import Priority
 from core.router import AssistantRouter
-from core.screen_capture import capture_all_screens, cleanup_screenshots
+from core.screen_capture import cleanup_screenshots
 from ui.chat_window import ChatWindow
+from ui.dispatcher import UIDispatcher
+from ui.region_select import select_region
 
 _logger = get_logger(__name__)
 
+_TARGET_LABELS = {
+    "cursor": "Monitor unter Maus",
+    "window": "Aktives Fenster",
+    "region": "Bereich wählen",
+    "mosaic": "Alle Monitore",
+}
+
 
 class KIKumpelApp:
     def __init__(self, root: tk.Tk) -> None:
@@ -23,6 +36,8 @@ class KIKumpelApp:
         self.root.protocol("WM_DELETE_WINDOW", self.on_close)
 
         self.router = AssistantRouter()
+        # Einziger Weg, auf dem Worker-Threads die Oberfläche ändern.
+        self.ui = UIDispatcher(root)
 
         container = ttk.Frame(root, padding=12)
         container.pack(fill="both", expand=True)
@@ -33,7 +48,14 @@ class KIKumpelApp:
         toolbar.grid(row=0, column=0, sticky="we", pady=(0, 8))
         toolbar.columnconfigure(0, weight=1)
 
-        self.chat_window = ChatWindow(container, on_send=self._on_user_text)
+        # Verlauf aus früheren Sitzungen wird beim Hochscrollen seitenweise nachgeladen.
+        latest = self.router.memory.get_recent_interactions(limit=1)
+        self.chat_window = ChatWindow(
+            container,
+            on_send=self._on_user_text,
+            load_history=self.router.memory.get_interactions_before,
+            history_before=latest[0].id + 1 if latest else None,
+        )
         self.chat_window.grid(row=1, column=0, sticky="nsew")
 
         button_frame = ttk.Frame(container)
@@ -46,6 +68,16 @@ class KIKumpelApp:
         )
         self.btn_ask_screen.pack(side="left")
 
+        self.target_var = tk.StringVar(value=_TARGET_LABELS.get(CAPTURE_TARGET, _TARGET_LABELS["cursor"]))
+        self.cmb_target = ttk.Combobox(
+            button_frame,
+            textvariable=self.target_var,
+            values=list(_TARGET_LABELS.values()),
+            state="readonly",
+            width=18,
+        )
+        self.cmb_target.pack(side="left", padx=(8, 0))
+
         self.btn_ask_text = ttk.Button(
             button_frame,
             text="❓ Nur Frage",
@@ -60,6 +92,10 @@ class KIKumpelApp:
         )
         self.btn_cleanup.pack(side="left", padx=(8, 0))
 
+        self.fresh_var = tk.BooleanVar(value=False)
+        self.chk_fresh = ttk.Checkbutton(button_frame, text="Ohne Cache", variable=self.fresh_var)
+        self.chk_fresh.pack(side="left", padx=(8, 0))
+
         self.btn_quit = ttk.Button(button_frame, text="Beenden", command=self.on_close)
         self.btn_quit.pack(side="right")
 
@@ -68,15 +104,17 @@ class KIKumpelApp:
             "KI-Kumpel bereit. Stelle eine Frage oder verwende die Buttons für Screenshots.",
         )
 
-        self.root.after(2000, self._auto_loop)
-
-    def _set_buttons_state(self, state: str) -> None:
-        for button in (self.btn_ask_screen, self.btn_ask_text, self.btn_cleanup, self.btn_quit):
-            button.configure(state=state)
+        self.auto_capture = AutoCaptureScheduler(
+            on_stored=self._on_auto_stored,
+            submit=partial(self.router.scheduler.submit, priority=Priority.CAPTURE, key="auto-capture"),
+        )
+        self.root.bind("<Unmap>", self._on_visibility, add="+")
+        self.root.bind("<Map>", self._on_visibility, add="+")
+        self.root.after(2000, self.auto_capture.start)
 
     def _on_user_text(self, text: str) -> None:
         self.chat_window.append_message("user", text)
-        self._start_worker(self.router.handle_text, text)
+        self._start_request(self.router.submit_text, text)
 
     def _on_request_text(self) -> None:
         text = self.chat_window.input.get("1.0", "end").strip()
@@ -85,72 +123,108 @@ class KIKumpelApp:
             return
         self.chat_window.input.delete("1.0", "end")
         self.chat_window.append_message("user", text)
-        self._start_worker(self.router.handle_text, text)
+        self._start_request(self.router.submit_text, text)
 
     def _on_request_screen(self) -> None:
         question = self.chat_window.input.get("1.0", "end").strip()
         if not question:
             self.chat_window.append_message("system", "Bitte beschreibe deine Frage, bevor ein Screenshot erstellt wird.")
             return
+        target = next(key for key, label in _TARGET_LABELS.items() if label == self.target_var.get())
+        region = None
+        if target == "region":
+            # Das halbtransparente Overlay darf nicht in Auto-Bildern landen.
+            with self.auto_capture.suspended():
+                region = select_region(self.root)
+            if region is None:
+                self.chat_window.append_message("system", "Bereichsauswahl abgebrochen.")
+                return
         self.chat_window.input.delete("1.0", "end")
         self.chat_window.append_message("user", question)
-
-        def worker() -> None:
-            try:
-                shots = capture_all_screens()
-                if not shots:
-                    raise RuntimeError("Kein Monitor erkannt")
-                _, image = shots[0]
-                answer = self.router.handle_vision(question, image)
-            except Exception as exc:
-                _logger.exception("Fehler bei Vision-Anfrage")
-                answer = f"Fehler bei der Analyse: {exc}"
-            self._post_answer(answer)
-
-        self._set_buttons_state("disabled")
-        threading.Thread(target=worker, daemon=True).start()
+        self._start_request(
+            self.router.submit_vision, question, target=target, region=region, error_text="Fehler bei der Analyse"
+        )
 
     def _on_cleanup(self) -> None:
-        removed = cleanup_screenshots()
-        self.chat_window.append_message("system", f"Screenshots entfernt ({removed} Dateien).")
+        # Dateisystem und Datenbank nicht im Tk-Thread anfassen; ein zweiter
+        # Klick ersetzt einen noch wartenden Auftrag.
+        future = self.router.scheduler.submit(
+            cleanup_screenshots, priority=Priority.MAINTENANCE, key="screenshot-cleanup"
+        )
+        future.add_done_callback(self._on_cleanup_done)
 
-    def _start_worker(self, func, *args) -> None:
-        self._set_buttons_state("disabled")
+    def _on_cleanup_done(self, future: Future) -> None:
+        if future.cancelled():
+            return
+        exc = future.exception()
+        if exc is None:
+            text = f"Screenshots entfernt ({future.result()} Dateien)."
+        else:
+            _logger.error("Screenshots konnten nicht entfernt werden", exc_info=exc)
+            text = f"Screenshots konnten nicht entfernt werden: {exc}"
+        self.ui.post(partial(self.chat_window.append_message, "system", text))
+
+    def _begin_answer(self):
+        """Legt bei aktivem Streaming die Antwortblase an und liefert den Delta-Callback."""
+        if not STREAM_RESPONSES:
+            return None, None
+        bubble = self.chat_window.begin_message("assistant")
+
+        def on_delta(delta: str) -> None:
+            # Mehrere Stücke zwischen zwei Frames werden zu einem Update verkettet.
+            self.ui.post_accumulated(("delta", bubble), delta, partial(self.chat_window.append_to_message, bubble))
+
+        return bubble, on_delta
+
+    def _start_request(self, submit, question: str, *, error_text: str = "Fehler bei der Anfrage", **kwargs) -> None:
+        """Reicht die Frage beim Scheduler des Routers ein.
+
+        Eine neue Frage ersetzt eine noch laufende oder wartende im Chat; deren
+        Blase zeigt dann „Anfrage abgebrochen.“.
+        """
+        bubble, on_delta = self._begin_answer()
+        future = submit(question, on_delta=on_delta, fresh=self.fresh_var.get(), **kwargs)
+        future.add_done_callback(partial(self._on_request_done, bubble, error_text))
+
+    def _on_request_done(self, bubble, error_text: str, future: Future) -> None:
+        if future.cancelled():
+            answer = "Anfrage abgebrochen."
+        else:
+            exc = future.exception()
+            if exc is None:
+                answer = future.result()
+            elif isinstance(exc, RequestCancelledError):
+                answer = "Anfrage abgebrochen."
+            else:
+                _logger.error("%s", error_text, exc_info=exc)
+                answer = f"{error_text}: {exc}"
+        self._post_answer(answer, bubble)
+
+    def _post_answer(self, answer: str, bubble=None) -> None:
+        def _update() -> None:
+            if bubble is not None:
+                self.chat_window.set_message_text(bubble, answer)
+            else:
+                self.chat_window.append_message("assistant", answer)
 
-        def worker() -> None:
-            try:
-                answer = func(*args)
-            except Exception as exc:
-                _logger.exception("Fehler bei Anfrage")
-                answer = f"Fehler bei der Anfrage: {exc}"
-            self._post_answer(answer)
+        self.ui.post(_update)
 
-        threading.Thread(target=worker, daemon=True).start()
+    def _on_visibility(self, event: tk.Event) -> None:
+        # <Map>/<Unmap> kommen auch von Kind-Widgets; nur das Hauptfenster zählt.
+        if event.widget is self.root:
+            self.auto_capture.set_visible(str(event.type) == "Map")
 
-    def _post_answer(self, answer: str) -> None:
-        def _update() -> None:
-            self.chat_window.append_message("assistant", answer)
-            self._set_buttons_state("normal")
-
-        self.root.after(0, _update)
-
-    def _auto_loop(self) -> None:
-        def worker() -> None:
-            try:
-                shots = capture_all_screens()
-                if shots:
-                    self.chat_window.append_message(
-                        "system",
-                        f"Auto-Screenshot gespeichert ({len(shots)} Monitor(e)).",
-                    )
-            except Exception as exc:
-                _logger.error("Auto-Screenshot fehlgeschlagen: %s", exc)
-
-        threading.Thread(target=worker, daemon=True).start()
-        self.root.after(AUTO_SCREENSHOT_INTERVAL_MS, self._auto_loop)
+    def _on_auto_stored(self, shots) -> None:
+        # Meldungen, die vor dem nächsten Frame eintreffen, erscheinen als eine Blase.
+        self.ui.post_accumulated("auto-capture", len(shots), self._show_auto_notice)
+
+    def _show_auto_notice(self, count: int) -> None:
+        self.chat_window.append_message("system", f"Auto-Screenshot gespeichert ({count} Monitor(e)).")
 
     def on_close(self) -> None:
         try:
+            self.auto_capture.stop()
+            self.ui.close()
             self.router.cleanup()
         finally:
             self.root.destroy()
@@ -1,8 +1,13 @@
 """Modernes Chat-Fenster mit Dark-Theme."""
 from __future__ import annotations
 
+import bisect
 import tkinter as tk
+from dataclasses import dataclass
 from tkinter import ttk
+from typing import Callable, Dict, List, Optional, Sequence
+
+from memory.memory_db import Interaction
 
 _BG = "#1E1E1E"
 _BG_USER = "#2E7D32"
@@ -11,12 +16,56 @@ _BG_SYSTEM = "#424242"
 _TEXT_COLOR = "#FFFFFF"
 _FONT = ("Segoe UI", 11)
 
+_WRAP = 600
+_PAD_X = 8
+_PAD_Y = 4
+# Verlauf wird nachgeladen, wenn weniger als so viele Pixel über dem sichtbaren Bereich liegen
+_PAGE_THRESHOLD = 200
+_PAGE_SIZE = 50
+
+_STYLES = {
+    "user": "ChatBubbleUser.TLabel",
+    "assistant": "ChatBubbleAssistant.TLabel",
+}
+
+HistoryLoader = Callable[[Optional[int], int], Sequence[Interaction]]
+
+
+@dataclass(eq=False)
+class ChatMessage:
+    """Eine Blase im Verlauf; dient zugleich als Handle für :meth:`ChatWindow.append_to_message`."""
+
+    role: str
+    text: str
+    height: int = 0
+
 
 class ChatWindow(ttk.Frame):
-    def __init__(self, master: tk.Misc, *, on_send) -> None:
+    """Chatverlauf mit virtualisierter Darstellung.
+
+    Nachrichten liegen nur als :class:`ChatMessage` mit zwischengespeicherter
+    Höhe vor. Label-Widgets gibt es nur für die sichtbaren Blasen; beim
+    Scrollen werden sie aus einem Pool wiederverwendet. Die Scrollregion
+    ergibt sich aus aufsummierten Höhen statt aus ``bbox("all")``, sodass
+    Anhängen und Scrollen unabhängig von der Verlaufslänge bleiben. Mit
+    ``load_history`` wird beim Hochscrollen seitenweise älterer Verlauf
+    (vor der ID ``history_before``) vorangestellt.
+    """
+
+    def __init__(
+        self,
+        master: tk.Misc,
+        *,
+        on_send,
+        load_history: Optional[HistoryLoader] = None,
+        history_before: Optional[int] = None,
+    ) -> None:
         super().__init__(master, padding=12)
         self.configure(style="Chat.TFrame")
         self._on_send = on_send
+        self._load_history = load_history
+        self._history_before = history_before
+        self._history_done = load_history is None or history_before is None
 
         style = ttk.Style()
         style.theme_use("clam")
@@ -35,17 +84,24 @@ class ChatWindow(ttk.Frame):
         status_label.grid(row=0, column=0, sticky="we", pady=(0, 8))
 
         self.canvas = tk.Canvas(self, background=_BG, highlightthickness=0)
-        self.scrollbar = ttk.Scrollbar(self, orient="vertical", command=self.canvas.yview)
+        self.scrollbar = ttk.Scrollbar(self, orient="vertical", command=self._on_scrollbar)
         self.canvas.configure(yscrollcommand=self.scrollbar.set)
         self.canvas.grid(row=1, column=0, sticky="nsew")
         self.scrollbar.grid(row=1, column=1, sticky="ns")
 
-        self.messages_frame = ttk.Frame(self.canvas, style="Chat.TFrame")
-        self.messages_frame.columnconfigure(0, weight=1)
-        self.canvas_window = self.canvas.create_window((0, 0), window=self.messages_frame, anchor="nw")
+        self._messages: List[ChatMessage] = []
+        # _offsets[i] = obere Kante von Nachricht i; letzter Eintrag = Gesamthöhe
+        self._offsets: List[int] = [0]
+        self._pool: List[tuple] = []
+        self._shown: Dict[int, tuple] = {}
+        self._render_pending = False
+        # Nie angezeigtes Label, nur zum Messen der Blasenhöhe
+        self._probe = ttk.Label(self.canvas, wraplength=_WRAP, justify="left")
 
-        self.messages_frame.bind("<Configure>", self._on_frame_configure)
         self.canvas.bind("<Configure>", self._on_canvas_configure)
+        self.canvas.bind("<MouseWheel>", self._on_mousewheel)
+        self.canvas.bind("<Button-4>", self._on_mousewheel)
+        self.canvas.bind("<Button-5>", self._on_mousewheel)
 
         input_frame = ttk.Frame(self, style="ChatInput.TFrame")
         input_frame.grid(row=2, column=0, columnspan=2, sticky="we", pady=(12, 0))
@@ -59,17 +115,169 @@ class ChatWindow(ttk.Frame):
         send_button = ttk.Button(input_frame, text="Senden", command=self._trigger_send)
         send_button.grid(row=0, column=1, padx=(8, 0), sticky="e")
 
-    def _on_frame_configure(self, event) -> None:
-        self.canvas.configure(scrollregion=self.canvas.bbox("all"))
-        self.after_idle(self._scroll_to_end)
+    # ------------------------------------------------------------------
+    # Geometrie
+    # ------------------------------------------------------------------
+    @staticmethod
+    def _style_for(role: str) -> str:
+        return _STYLES.get(role, "ChatBubbleSystem.TLabel")
+
+    def _measure(self, message: ChatMessage) -> int:
+        self._probe.configure(text=message.text, style=self._style_for(message.role))
+        return self._probe.winfo_reqheight() + 2 * _PAD_Y
+
+    def _total_height(self) -> int:
+        return self._offsets[-1]
+
+    def _update_scrollregion(self) -> None:
+        self.canvas.configure(scrollregion=(0, 0, self.canvas.winfo_width(), self._total_height()))
+
+    def _at_end(self) -> bool:
+        return self.canvas.yview()[1] >= 0.999
 
     def _on_canvas_configure(self, event) -> None:
-        width = event.width
-        self.canvas.itemconfig(self.canvas_window, width=width)
+        self._update_scrollregion()
+        # Rechtsbündige Blasen hängen von der Breite ab.
+        for index, (label, item) in self._shown.items():
+            self._place(index, label, item)
+        self._schedule_render()
+
+    def _on_scrollbar(self, *args) -> None:
+        self.canvas.yview(*args)
+        self._schedule_render()
+
+    def _on_mousewheel(self, event) -> str:
+        if event.num == 4:
+            step = -1
+        elif event.num == 5:
+            step = 1
+        else:
+            step = -1 if event.delta > 0 else 1
+        self.canvas.yview_scroll(step * 3, "units")
+        self._schedule_render()
+        return "break"
 
     def _scroll_to_end(self) -> None:
         self.canvas.yview_moveto(1.0)
+        self._schedule_render()
+
+    # ------------------------------------------------------------------
+    # Virtualisierte Darstellung
+    # ------------------------------------------------------------------
+    def _schedule_render(self) -> None:
+        if not self._render_pending:
+            self._render_pending = True
+            self.after_idle(self._render)
+
+    def _acquire(self) -> tuple:
+        if self._pool:
+            label, item = self._pool.pop()
+            self.canvas.itemconfigure(item, state="normal")
+            return label, item
+        label = ttk.Label(self.canvas, wraplength=_WRAP, justify="left")
+        for sequence in ("<MouseWheel>", "<Button-4>", "<Button-5>"):
+            label.bind(sequence, self._on_mousewheel)
+        item = self.canvas.create_window(0, 0, window=label)
+        return label, item
+
+    def _release(self, index: int) -> None:
+        label, item = self._shown.pop(index)
+        self.canvas.itemconfigure(item, state="hidden")
+        self._pool.append((label, item))
+
+    def _release_all(self) -> None:
+        for index in list(self._shown):
+            self._release(index)
+
+    def _place(self, index: int, label: ttk.Label, item: int) -> None:
+        message = self._messages[index]
+        label.configure(text=message.text, style=self._style_for(message.role))
+        y = self._offsets[index] + _PAD_Y
+        if message.role == "user":
+            self.canvas.coords(item, max(self.canvas.winfo_width() - _PAD_X, _PAD_X), y)
+            self.canvas.itemconfigure(item, anchor="ne")
+        else:
+            self.canvas.coords(item, _PAD_X, y)
+            self.canvas.itemconfigure(item, anchor="nw")
+
+    def _visible_range(self) -> range:
+        total = self._total_height()
+        if not self._messages or total <= 0:
+            return range(0)
+        first, last = self.canvas.yview()
+        top, bottom = first * total, last * total
+        start = max(0, bisect.bisect_right(self._offsets, top) - 1)
+        end = min(len(self._messages), bisect.bisect_left(self._offsets, bottom) + 1)
+        return range(start, end)
 
+    def _render(self) -> None:
+        self._render_pending = False
+        if self._maybe_load_history():
+            return
+        visible = self._visible_range()
+        for index in [index for index in self._shown if index not in visible]:
+            self._release(index)
+        for index in visible:
+            if index not in self._shown:
+                label, item = self._acquire()
+                self._shown[index] = (label, item)
+                self._place(index, label, item)
+
+    def _maybe_load_history(self) -> bool:
+        """Stellt die nächste ältere Seite voran, wenn der Blick nahe am Anfang ist."""
+        if self._history_done:
+            return False
+        top = self.canvas.yview()[0] * self._total_height()
+        if self._messages and top > _PAGE_THRESHOLD:
+            return False
+        page = self._load_history(self._history_before, _PAGE_SIZE)
+        if len(page) < _PAGE_SIZE:
+            self._history_done = True
+        if not page:
+            return False
+        self._history_before = min(interaction.id for interaction in page)
+        older = [ChatMessage(interaction.role, interaction.content) for interaction in reversed(page)]
+        for message in older:
+            message.height = self._measure(message)
+        self._release_all()
+        self._messages[:0] = older
+        added = sum(message.height for message in older)
+        offsets = [0]
+        for message in self._messages:
+            offsets.append(offsets[-1] + message.height)
+        self._offsets = offsets
+        self._update_scrollregion()
+        # Sichtbaren Inhalt an derselben Stelle halten.
+        self.canvas.yview_moveto((top + added) / max(1, self._total_height()))
+        self._schedule_render()
+        return True
+
+    def _resize(self, message: ChatMessage) -> None:
+        index = self._index_of(message)
+        height = self._measure(message)
+        delta = height - message.height
+        if delta:
+            message.height = height
+            for position in range(index + 1, len(self._offsets)):
+                self._offsets[position] += delta
+            self._update_scrollregion()
+            for shown, (label, item) in self._shown.items():
+                if shown > index:
+                    self._place(shown, label, item)
+        shown = self._shown.get(index)
+        if shown is not None:
+            shown[0].configure(text=message.text)
+
+    def _index_of(self, message: ChatMessage) -> int:
+        # Aktualisierte Blasen sind fast immer die letzten.
+        for index in range(len(self._messages) - 1, -1, -1):
+            if self._messages[index] is message:
+                return index
+        raise ValueError("Nachricht gehört nicht zu diesem Chatfenster")
+
+    # ------------------------------------------------------------------
+    # Eingabe
+    # ------------------------------------------------------------------
     def _on_return(self, event) -> str:
         if event.state & 0x0001:  # Shift
             return "break"
@@ -87,22 +295,38 @@ class ChatWindow(ttk.Frame):
         self.input.delete("1.0", "end")
         self._on_send(text)
 
-    def append_message(self, role: str, message: str) -> None:
-        role = role.lower()
-        if role == "user":
-            style = "ChatBubbleUser.TLabel"
-            anchor = "e"
-        elif role == "assistant":
-            style = "ChatBubbleAssistant.TLabel"
-            anchor = "w"
+    # ------------------------------------------------------------------
+    # Öffentliche Schnittstelle
+    # ------------------------------------------------------------------
+    def append_message(self, role: str, message: str) -> ChatMessage:
+        follow = self._at_end()
+        entry = ChatMessage(role.lower(), message)
+        entry.height = self._measure(entry)
+        self._messages.append(entry)
+        self._offsets.append(self._offsets[-1] + entry.height)
+        self._update_scrollregion()
+        if follow:
+            self._scroll_to_end()
         else:
-            style = "ChatBubbleSystem.TLabel"
-            anchor = "w"
+            self._schedule_render()
+        return entry
+
+    def begin_message(self, role: str) -> ChatMessage:
+        """Legt eine leere Blase an, die per :meth:`append_to_message` wächst."""
+        return self.append_message(role, "…")
+
+    def append_to_message(self, bubble: ChatMessage, delta: str) -> None:
+        text = bubble.text
+        if text == "…":
+            text = ""
+        self.set_message_text(bubble, text + delta)
 
-        bubble = ttk.Label(self.messages_frame, text=message, style=style, wraplength=600, justify="left")
-        bubble.grid(sticky=anchor, padx=8, pady=4)
-        self.messages_frame.update_idletasks()
-        self._scroll_to_end()
+    def set_message_text(self, bubble: ChatMessage, message: str) -> None:
+        follow = self._at_end()
+        bubble.text = message
+        self._resize(bubble)
+        if follow:
+            self._scroll_to_end()
 
     def set_status(self, text: str) -> None:
         self.status_var.set(text)
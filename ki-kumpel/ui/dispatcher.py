@@ -0,0 +1,165 @@
+"""Thread-sichere Übergabe von UI-Aktualisierungen an den Tk-Hauptthread."""
+from __future__ import annotations
+
+import operator
+import threading
+import time
+import tkinter as tk
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Callable, Deque, Dict, Hashable, Optional, Tuple
+
+from core.config import UI_FRAME_BUDGET_MS, UI_FRAME_INTERVAL_MS, UI_IDLE_INTERVAL_MS
+from core.logger import get_logger
+
+_logger = get_logger(__name__)
+
+
+@dataclass
+class _Event:
+    callback: Callable[..., Any]
+    args: Tuple[Any, ...] = ()
+    key: Optional[Hashable] = None
+    combine: Optional[Callable[[Any, Any], Any]] = None
+    value: Any = None
+    posted: float = field(default_factory=time.perf_counter)
+
+
+@dataclass
+class DispatcherStats:
+    posted: int = 0
+    coalesced: int = 0
+    executed: int = 0
+    frames: int = 0
+    over_budget: int = 0
+    pending: int = 0
+    max_delay_ms: float = 0.0
+
+
+class UIDispatcher:
+    """Sammelt Aufträge aus beliebigen Threads und führt sie im Tk-Thread aus.
+
+    Hintergrund-Threads rufen nur :meth:`post`, :meth:`post_latest` oder
+    :meth:`post_accumulated` auf und berühren Tk nie selbst. Der Tk-Thread
+    leert die Warteschlange alle ``interval_ms`` (ohne Arbeit seltener, alle
+    ``idle_interval_ms``) und hört nach ``budget_ms`` auf; der Rest folgt im
+    nächsten Frame. Aufträge mit demselben Schlüssel, die noch nicht
+    ausgeführt wurden, werden zusammengefasst und behalten ihren Platz in
+    der Reihenfolge.
+    """
+
+    def __init__(
+        self,
+        root: tk.Misc,
+        *,
+        budget_ms: float = UI_FRAME_BUDGET_MS,
+        interval_ms: int = UI_FRAME_INTERVAL_MS,
+        idle_interval_ms: int = UI_IDLE_INTERVAL_MS,
+    ) -> None:
+        self.root = root
+        self.budget_s = max(1.0, budget_ms) / 1000
+        self.interval_ms = max(1, interval_ms)
+        self.idle_interval_ms = max(self.interval_ms, idle_interval_ms)
+        self._lock = threading.Lock()
+        self._queue: Deque[_Event] = deque()
+        self._open: Dict[Hashable, _Event] = {}
+        self._stats = DispatcherStats()
+        self._closed = False
+        self._after_id = self.root.after(self.interval_ms, self._drain)
+
+    def post(self, callback: Callable[..., Any], *args: Any) -> None:
+        """Führt ``callback(*args)`` im Tk-Thread aus."""
+        self._enqueue(_Event(callback, args))
+
+    def post_latest(self, key: Hashable, callback: Callable[..., Any], *args: Any) -> None:
+        """Wie :meth:`post`, aber von noch wartenden Aufträgen mit ``key`` zählt nur der letzte."""
+        self._enqueue(_Event(callback, args, key=key))
+
+    def post_accumulated(
+        self,
+        key: Hashable,
+        value: Any,
+        callback: Callable[[Any], Any],
+        combine: Callable[[Any, Any], Any] = operator.add,
+    ) -> None:
+        """Fasst ``value`` mit noch wartenden Werten zu ``key`` zusammen; ``callback`` erhält das Ergebnis einmal.
+
+        Typisch für Stream-Stücke (Texte werden verkettet) oder Zähler.
+        """
+        self._enqueue(_Event(callback, key=key, combine=combine, value=value))
+
+    def _enqueue(self, event: _Event) -> None:
+        with self._lock:
+            if self._closed:
+                return
+            if event.key is not None:
+                existing = self._open.get(event.key)
+                if existing is not None:
+                    if existing.combine is not None:
+                        existing.value = existing.combine(existing.value, event.value)
+                    else:
+                        existing.callback, existing.args = event.callback, event.args
+                    self._stats.coalesced += 1
+                    return
+                self._open[event.key] = event
+            self._queue.append(event)
+            self._stats.posted += 1
+
+    def _pop(self) -> Optional[_Event]:
+        with self._lock:
+            if not self._queue:
+                return None
+            event = self._queue.popleft()
+            if event.key is not None:
+                self._open.pop(event.key, None)
+            return event
+
+    def _drain(self) -> None:
+        started = time.perf_counter()
+        deadline = started + self.budget_s
+        executed = 0
+        while True:
+            event = self._pop()
+            if event is None:
+                break
+            delay_ms = (started - event.posted) * 1000
+            try:
+                if event.combine is not None:
+                    event.callback(event.value)
+                else:
+                    event.callback(*event.args)
+            except Exception:
+                _logger.exception("UI-Aktualisierung fehlgeschlagen")
+            executed += 1
+            with self._lock:
+                self._stats.max_delay_ms = max(self._stats.max_delay_ms, delay_ms)
+            if time.perf_counter() >= deadline:
+                break
+        with self._lock:
+            self._stats.executed += executed
+            if executed:
+                self._stats.frames += 1
+            backlog = bool(self._queue)
+            if backlog:
+                self._stats.over_budget += 1
+            if self._closed:
+                return
+        self._after_id = self.root.after(
+            self.interval_ms if executed or backlog else self.idle_interval_ms, self._drain
+        )
+
+    def stats(self) -> DispatcherStats:
+        with self._lock:
+            stats = DispatcherStats(**vars(self._stats))
+            stats.pending = len(self._queue)
+            return stats
+
+    def close(self) -> None:
+        """Beendet das Abarbeiten; noch wartende Aufträge werden verworfen (nur im Tk-Thread aufrufen)."""
+        with self._lock:
+            self._closed = True
+            self._queue.clear()
+            self._open.clear()
+        if self._after_id is not None:
+            self.root.after_cancel(self._after_id)
+            self._after_id = None
@@ -0,0 +1,57 @@
+"""Bereichsauswahl per Maus für gezielte Screenshots."""
+from __future__ import annotations
+
+import tkinter as tk
+from typing import Optional
+
+from core.screen_capture import Region, virtual_desktop
+
+_MIN_SIZE = 8
+
+
+def select_region(master: tk.Misc) -> Optional[Region]:
+    """Legt ein halbtransparentes Fenster über alle Monitore und lässt einen Bereich aufziehen.
+
+    Gibt ``(links, oben, Breite, Höhe)`` in Bildschirmkoordinaten zurück oder
+    ``None``, wenn mit Escape abgebrochen oder nur geklickt wurde.
+    """
+    left, top, width, height = virtual_desktop()
+    overlay = tk.Toplevel(master)
+    overlay.overrideredirect(True)
+    overlay.geometry(f"{width}x{height}+{left}+{top}")
+    overlay.attributes("-alpha", 0.3)
+    overlay.attributes("-topmost", True)
+    overlay.configure(cursor="crosshair")
+
+    canvas = tk.Canvas(overlay, bg="black", highlightthickness=0)
+    canvas.pack(fill="both", expand=True)
+
+    state: dict = {"start": None, "rect": None, "result": None}
+
+    def on_press(event: tk.Event) -> None:
+        state["start"] = (event.x_root, event.y_root)
+        state["rect"] = canvas.create_rectangle(event.x, event.y, event.x, event.y, outline="#4FC3F7", width=2)
+
+    def on_drag(event: tk.Event) -> None:
+        if state["start"] is None:
+            return
+        x0, y0 = state["start"]
+        canvas.coords(state["rect"], x0 - left, y0 - top, event.x, event.y)
+
+    def on_release(event: tk.Event) -> None:
+        if state["start"] is not None:
+            x0, y0 = state["start"]
+            x1, y1 = event.x_root, event.y_root
+            box = (min(x0, x1), min(y0, y1), abs(x1 - x0), abs(y1 - y0))
+            if box[2] >= _MIN_SIZE and box[3] >= _MIN_SIZE:
+                state["result"] = box
+        overlay.destroy()
+
+    canvas.bind("<ButtonPress-1>", on_press)
+    canvas.bind("<B1-Motion>", on_drag)
+    canvas.bind("<ButtonRelease-1>", on_release)
+    overlay.bind("<Escape>", lambda _event: overlay.destroy())
+    overlay.focus_force()
+    overlay.grab_set()
+    master.wait_window(overlay)
+    return state["result"]
@@ -4,6 +4,8 @@ from __future__ import annotations
 import os
 import sys
 import threading
+from concurrent.futures import CancelledError, Future
+from typing import Callable
 
 import pystray
 from PIL import Image
@@ -12,8 +14,8 @@ import tkinter as tk
 from tkinter import messagebox, simpledialog
 
 from core.logger import get_logger
+from core.llm_client import RequestCancelledError
 from core.router import AssistantRouter
-from core.screen_capture import capture_all_screens
 
 _logger = get_logger(__name__)
 
@@ -24,6 +26,29 @@ def _resource_path(relative: str) -> str:
     return os.path.join(os.path.abspath("."), relative)
 
 
+def _show_answer(root: tk.Tk, error_label: str, future: Future) -> None:
+    """Wartet auf die Antwort und zeigt sie an; nur im Thread aufrufen, der ``root`` erzeugt hat."""
+    try:
+        messagebox.showinfo("KI-Antwort", future.result())
+    except (CancelledError, RequestCancelledError):
+        _logger.info("Tray-Anfrage abgebrochen")
+    except Exception as exc:
+        _logger.error("%s", error_label, exc_info=exc)
+        messagebox.showerror("Fehler", str(exc))
+    finally:
+        root.destroy()
+
+
+def _in_dialog_thread(dialog: Callable[[AssistantRouter], None], router: AssistantRouter) -> None:
+    """Startet einen Tray-Dialog in einem eigenen Thread.
+
+    Der Dialog besitzt sein eigenes Tk und wartet dort auf die Antwort, so
+    blockieren weder das Tray-Menü noch ein Worker des RequestScheduler,
+    solange ein Meldungsfenster offen ist.
+    """
+    threading.Thread(target=dialog, args=(router,), name="TrayDialog", daemon=True).start()
+
+
 def _ask_text(router: AssistantRouter) -> None:
     root = tk.Tk()
     root.withdraw()
@@ -31,18 +56,7 @@ def _ask_text(router: AssistantRouter) -> None:
     if not text:
         root.destroy()
         return
-
-    def worker() -> None:
-        try:
-            answer = router.handle_text(text)
-            messagebox.showinfo("KI-Antwort", answer)
-        except Exception as exc:
-            _logger.exception("Tray-Textanfrage fehlgeschlagen")
-            messagebox.showerror("Fehler", str(exc))
-        finally:
-            root.destroy()
-
-    threading.Thread(target=worker, daemon=True).start()
+    _show_answer(root, "Tray-Textanfrage fehlgeschlagen", router.submit_text(text, channel="tray"))
 
 
 def _send_screenshot(router: AssistantRouter) -> None:
@@ -52,22 +66,7 @@ def _send_screenshot(router: AssistantRouter) -> None:
     if not question:
         root.destroy()
         return
-
-    def worker() -> None:
-        try:
-            shots = capture_all_screens()
-            if not shots:
-                raise RuntimeError("Kein Monitor gefunden")
-            _, image = shots[0]
-            answer = router.handle_vision(question, image)
-            messagebox.showinfo("KI-Antwort", answer)
-        except Exception as exc:
-            _logger.exception("Tray-Vision-Anfrage fehlgeschlagen")
-            messagebox.showerror("Fehler", str(exc))
-        finally:
-            root.destroy()
-
-    threading.Thread(target=worker, daemon=True).start()
+    _show_answer(root, "Tray-Vision-Anfrage fehlgeschlagen", router.submit_vision(question, channel="tray"))
 
 
 def create_tray() -> None:
@@ -85,8 +84,8 @@ def create_tray() -> None:
         router.cleanup()
 
     menu = (
-        item("Screenshot an KI senden", lambda: _send_screenshot(router)),
-        item("Text an KI senden", lambda: _ask_text(router)),
+        item("Screenshot an KI senden", lambda: _in_dialog_thread(_send_screenshot, router)),
+        item("Text an KI senden", lambda: _in_dialog_thread(_ask_text, router)),
         item("Beenden", on_quit),
     )
 